@@ -0,0 +1,379 @@
+"""
+analytics.py — Columnar cohort snapshot and dashboard aggregations
+
+The exporter copies the fields the admin dashboards need into a single local
+NumPy ``.npz`` file (one array per column), so ``POST /admin/analytics`` can
+answer with vectorized operations over local columns instead of scanning
+Firestore:
+
+    students     uid, branch, year, attendance, cgpa, doubts
+    enrollments  key (uid/course), uid, course_id
+    doubts       id, course_id, student_id, created_s, open
+    courses      course_id, title, department
+
+Exports are incremental: after a full export, the next runs only read users
+with ``updated_at``, doubts with ``created_at`` / ``resolved_at`` and
+enrollments with ``enrolled_at`` newer than the previous watermark (minus a
+small overlap), and upsert them by key. Courses are small and always re-read.
+A full export runs every ``ANALYTICS_FULL_EXPORT_EVERY`` seconds to pick up
+deletions and documents without timestamps.
+
+Configuration (environment):
+    ANALYTICS_SNAPSHOT              snapshot file (default .analytics/snapshot.npz)
+    ANALYTICS_EXPORT_INTERVAL       seconds between exports inside the API
+                                    process; 0 disables (default 0)
+    ANALYTICS_FULL_EXPORT_EVERY     seconds between full exports (default 86400)
+
+Run as a sidecar (recommended with several API workers):
+    python analytics.py --every 900
+    python analytics.py --full
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import risk_engine
+
+SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), ".analytics", "snapshot.npz"))
+EXPORT_INTERVAL = float(os.getenv("ANALYTICS_EXPORT_INTERVAL", "0"))
+FULL_EXPORT_EVERY = float(os.getenv("ANALYTICS_FULL_EXPORT_EVERY", "86400"))
+
+# Re-read this much before the previous watermark so documents committed
+# while the last export was running are not missed (upserts make it harmless).
+OVERLAP_S = 120
+
+WEEK_S = 7 * 24 * 3600
+
+KEYS = {"students": "uid", "enrollments": "key", "doubts": "id", "courses": "course_id"}
+
+DOUBT_FIELDS = ["course_id", "student_id", "status", "created_at"]
+STUDENT_FIELDS = ["role", "profile.branch", "profile.year",
+                  "academic_stats.attendance_percent", "academic_stats.cgpa"]
+
+
+def _epoch(value):
+    return value.timestamp() if hasattr(value, "timestamp") else 0.0
+
+
+def _columns(rows, spec):
+    """Rows of tuples → dict of arrays, one per (name, dtype) in ``spec``."""
+    cols = list(zip(*rows)) if rows else [()] * len(spec)
+    return {name: np.asarray(col, dtype=dtype) for (name, dtype), col in zip(spec, cols)}
+
+
+def _upsert(old, new, key):
+    """Rows of ``new`` replace rows of ``old`` with the same key."""
+    if old is None or not len(old[key]):
+        return new
+    if not len(new[key]):
+        return old
+    merged = {c: np.concatenate([old[c], new[c]]) for c in new}
+    # Keep the last occurrence of every key.
+    _, first_from_end = np.unique(merged[key][::-1], return_index=True)
+    keep = np.sort(len(merged[key]) - 1 - first_from_end)
+    return {c: v[keep] for c, v in merged.items()}
+
+
+def _index_of(ids, values):
+    """Position of each value in ``ids`` (unsorted) or -1."""
+    if not len(ids):
+        return np.full(len(values), -1)
+    order = np.argsort(ids)
+    pos = np.clip(np.searchsorted(ids, values, sorter=order), 0, len(ids) - 1)
+    idx = order[pos]
+    return np.where(ids[idx] == values, idx, -1)
+
+
+# ─── Snapshot ─────────────────────────────────────────────────────────────────
+
+class Snapshot:
+    def __init__(self, tables, meta):
+        self.tables = tables
+        self.meta = meta
+
+    def save(self, path=SNAPSHOT_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {f"{t}__{c}": v for t, cols in self.tables.items() for c, v in cols.items()}
+        arrays["meta"] = np.asarray(json.dumps(self.meta))
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=SNAPSHOT_PATH):
+        with np.load(path) as data:
+            tables = {}
+            for name in data.files:
+                if name != "meta":
+                    table, col = name.split("__", 1)
+                    tables.setdefault(table, {})[col] = data[name]
+            return cls(tables, json.loads(str(data["meta"])))
+
+
+_loaded = {"mtime": None, "snapshot": None}
+_loaded_lock = threading.Lock()
+
+
+def current(path=SNAPSHOT_PATH):
+    """The snapshot on disk, re-read only when the file changes; None if missing."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        if _loaded["mtime"] != mtime:
+            _loaded["snapshot"], _loaded["mtime"] = Snapshot.load(path), mtime
+        return _loaded["snapshot"]
+
+
+# ─── Exporter ─────────────────────────────────────────────────────────────────
+
+class Exporter:
+    def __init__(self, db, path=SNAPSHOT_PATH, full_every=FULL_EXPORT_EVERY):
+        self.db = db
+        self.path = path
+        self.full_every = full_every
+
+    def _students(self, since):
+        query = self.db.collection("users")
+        query = (query.where("updated_at", ">", since) if since else
+                 query.where("role", "==", "student"))
+        rows = []
+        for doc in query.select(STUDENT_FIELDS).stream():
+            d = doc.to_dict()
+            if d.get("role") != "student":
+                continue
+            profile, stats = d.get("profile") or {}, d.get("academic_stats") or {}
+            rows.append((doc.id, profile.get("branch") or "Unknown", int(profile.get("year") or 0),
+                         float(stats.get("attendance_percent") or 0.0), float(stats.get("cgpa") or 0.0)))
+        return _columns(rows, [("uid", str), ("branch", str), ("year", np.int16),
+                               ("attendance", np.float32), ("cgpa", np.float32)])
+
+    def _doubts(self, since):
+        if since:
+            queries = [self.db.collection("doubts").where("created_at", ">", since),
+                       self.db.collection("doubts").where("resolved_at", ">", since)]
+        else:
+            queries = [self.db.collection("doubts")]
+        rows = []
+        for query in queries:
+            for doc in query.select(DOUBT_FIELDS).stream():
+                d = doc.to_dict()
+                rows.append((doc.id, d.get("course_id") or "", d.get("student_id") or "",
+                             _epoch(d.get("created_at")), d.get("status") == "open"))
+        return _columns(rows, [("id", str), ("course_id", str), ("student_id", str),
+                               ("created_s", np.float64), ("open", bool)])
+
+    def _enrollments(self, since):
+        query = self.db.collection_group("enrolled_courses")
+        if since:
+            query = query.where("enrolled_at", ">", since)
+        rows = []
+        for doc in query.select(["course_id"]).stream():
+            uid = doc.reference.parent.parent.id
+            rows.append((f"{uid}/{doc.id}", uid, doc.id))
+        return _columns(rows, [("key", str), ("uid", str), ("course_id", str)])
+
+    def _courses(self):
+        rows = [(doc.id, (d := doc.to_dict()).get("title", ""), d.get("department", ""))
+                for doc in self.db.collection("courses").select(["title", "department"]).stream()]
+        return _columns(rows, [("course_id", str), ("title", str), ("department", str)])
+
+    def export(self, full=False):
+        started = time.time()
+        previous = None if full else current(self.path)
+        if previous is not None and started - previous.meta.get("last_full", 0) >= self.full_every:
+            previous = None
+        since = (datetime.fromtimestamp(previous.meta["watermark"] - OVERLAP_S, timezone.utc)
+                 if previous is not None else None)
+
+        fresh = {"students": self._students(since), "doubts": self._doubts(since),
+                 "enrollments": self._enrollments(since), "courses": self._courses()}
+        tables = {}
+        for name, cols in fresh.items():
+            old = previous.tables.get(name) if previous is not None and name != "courses" else None
+            tables[name] = _upsert(old, cols, KEYS[name])
+
+        # Integer row references (-1 when unknown) so queries never compare strings,
+        # and per-student doubt counts aligned with the students table.
+        students, doubts, enrollments = tables["students"], tables["doubts"], tables["enrollments"]
+        course_ids = tables["courses"]["course_id"]
+        for table, uid_col in ((doubts, "student_id"), (enrollments, "uid")):
+            table["course_idx"] = _index_of(course_ids, table["course_id"]).astype(np.int32)
+            table["student_idx"] = _index_of(students["uid"], table[uid_col]).astype(np.int32)
+        idx = doubts["student_idx"]
+        students["doubts"] = np.bincount(idx[idx >= 0], minlength=len(students["uid"])).astype(np.int32)
+
+        mode = "incremental" if previous is not None else "full"
+        meta = {
+            "mode": mode,
+            "watermark": started,
+            "last_full": previous.meta["last_full"] if previous is not None else started,
+            "exported_at": time.time(),
+            "export_s": round(time.time() - started, 3),
+            "read": {name: int(len(cols[KEYS[name]])) for name, cols in fresh.items()},
+            "rows": {name: int(len(cols[KEYS[name]])) for name, cols in tables.items()},
+        }
+        snapshot = Snapshot(tables, meta)
+        snapshot.save(self.path)
+        print(f"📊 Analytics {mode} export: {meta['rows']['students']:,} students, "
+              f"{meta['rows']['doubts']:,} doubts in {meta['export_s']:.1f}s")
+        return snapshot
+
+
+_exporter_lock = threading.Lock()
+
+
+def _export_locked(db, full, path):
+    try:
+        return Exporter(db, path).export(full=full)
+    except Exception as e:
+        print(f"⚠️  Analytics export failed: {e}")
+        return None
+    finally:
+        _exporter_lock.release()
+
+
+def export_once(db, full=False, path=SNAPSHOT_PATH):
+    """Run one export unless another is already running in this process."""
+    if not _exporter_lock.acquire(blocking=False):
+        return None
+    return _export_locked(db, full, path)
+
+
+def export_in_background(db, full=False, path=SNAPSHOT_PATH):
+    """``export_once`` on a new thread; None (and no thread) if an export is already running."""
+    if not _exporter_lock.acquire(blocking=False):
+        return None
+    thread = threading.Thread(target=_export_locked, args=(db, full, path), name="analytics-export", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_exporter(db, interval, stop):
+    """Export now and then every ``interval`` seconds until ``stop`` is set."""
+    def loop():
+        while not stop.is_set():
+            export_once(db)
+            stop.wait(interval)
+    thread = threading.Thread(target=loop, name="analytics-exporter", daemon=True)
+    thread.start()
+    return thread
+
+
+# ─── Aggregations ─────────────────────────────────────────────────────────────
+
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def _summary(values):
+    if not len(values):
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 2),
+        "percentiles": {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+    }
+
+
+def _histogram(values, edges):
+    counts, _ = np.histogram(values, bins=edges)
+    return {"edges": [float(e) for e in edges], "counts": counts.tolist()}
+
+
+def _breakdown(keys, at_risk):
+    labels, inverse = np.unique(keys, return_inverse=True)
+    total = np.bincount(inverse, minlength=len(labels))
+    risky = np.bincount(inverse, weights=at_risk, minlength=len(labels)).astype(int)
+    return [{"key": label.item(), "students": int(t), "at_risk": int(r), "risk_rate": round(r / t, 4) if t else 0.0}
+            for label, t, r in zip(labels, total, risky)]
+
+
+def compute(snapshot, attendance_threshold, cgpa_threshold, branch=None, year=None, weeks=8, now=None):
+    """Dashboard aggregates over ``snapshot``, optionally for one branch / year."""
+    now = now or time.time()
+    s, e, d, c = (snapshot.tables[t] for t in ("students", "enrollments", "doubts", "courses"))
+    mask = np.ones(len(s["uid"]), dtype=bool)
+    if branch:
+        mask &= s["branch"] == branch
+    if year:
+        mask &= s["year"] == year
+    att, cgpa = s["attendance"][mask], s["cgpa"][mask]
+    at_risk = risk_engine.classify(att, cgpa, attendance_threshold, cgpa_threshold)
+
+    # Restrict enrollments and doubts to the selected students
+    if (branch or year) and not len(mask):  # no students: mask[student_idx] would be out of range
+        e_rows, d_rows = np.zeros(len(e["student_idx"]), dtype=bool), np.zeros(len(d["student_idx"]), dtype=bool)
+    elif branch or year:
+        e_rows = (e["student_idx"] >= 0) & mask[e["student_idx"]]
+        d_rows = (d["student_idx"] >= 0) & mask[d["student_idx"]]
+    else:
+        e_rows, d_rows = slice(None), slice(None)
+
+    n_courses = len(c["course_id"])
+    e_course, d_course = e["course_idx"][e_rows], d["course_idx"][d_rows]
+    d_open, d_age = d["open"][d_rows], now - d["created_s"][d_rows]
+    known = d_course >= 0
+    enrolled = np.bincount(e_course[e_course >= 0], minlength=n_courses)
+    doubts_total = np.bincount(d_course[known], minlength=n_courses)
+    doubts_open = np.bincount(d_course[known & d_open], minlength=n_courses)
+    week = (d_age // WEEK_S).astype(np.int64)
+    recent = known & (week >= 0) & (week < weeks)
+    trend = np.bincount(d_course[recent] * weeks + (weeks - 1 - week[recent]),
+                        minlength=n_courses * weeks).reshape(n_courses, weeks)
+
+    courses = [{
+        "course_id": c["course_id"][i].item(),
+        "title": c["title"][i].item(),
+        "department": c["department"][i].item(),
+        "enrolled": int(enrolled[i]),
+        "doubts": int(doubts_total[i]),
+        "open_doubts": int(doubts_open[i]),
+        "doubts_per_student": round(doubts_total[i] / enrolled[i], 3) if enrolled[i] else 0.0,
+        "weekly_doubts": trend[i].tolist(),  # oldest → current week
+    } for i in np.argsort(-doubts_total, kind="stable")]
+
+    return {
+        "students": int(mask.sum()),
+        "at_risk": int(at_risk.sum()),
+        "thresholds": {"attendance": attendance_threshold, "cgpa": cgpa_threshold},
+        "attendance": {**_summary(att), "histogram": _histogram(att, np.arange(0, 101, 10))},
+        "cgpa": {**_summary(cgpa), "histogram": _histogram(cgpa, np.arange(0, 11, 1))},
+        "doubts_per_student": _summary(s["doubts"][mask].astype(float)),
+        "risk_by_branch": _breakdown(s["branch"][mask], at_risk),
+        "risk_by_year": _breakdown(s["year"][mask], at_risk),
+        "courses": courses,
+    }
+
+
+def main(argv=None):
+    from seed_db import init_db
+
+    parser = argparse.ArgumentParser(description="Export the analytics snapshot")
+    parser.add_argument("--full", action="store_true", help="ignore the previous snapshot")
+    parser.add_argument("--every", type=float, default=0, help="repeat every N seconds")
+    parser.add_argument("--path", default=SNAPSHOT_PATH)
+    parser.add_argument("--emulator", action="store_true", help="use FIRESTORE_EMULATOR_HOST")
+    args = parser.parse_args(argv)
+
+    exporter = Exporter(init_db(emulator=args.emulator), args.path)
+    exporter.export(full=args.full)
+    while args.every:
+        time.sleep(args.every)
+        try:
+            exporter.export()
+        except Exception as e:
+            print(f"⚠️  Analytics export failed: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
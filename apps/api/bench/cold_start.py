@@ -0,0 +1,82 @@
+"""
+Cold-start benchmark: process start → first successful request.
+
+Launches ``uvicorn main:app`` repeatedly, polls ``GET /`` until it answers,
+and reports the spread, plus the server's own phase timings from
+``GET /debug/startup``.
+
+Run from apps/api:
+    python -m bench.cold_start --runs 5
+    STARTUP_PREWARM=1 python -m bench.cold_start
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url, timeout=1.0):
+    with urllib.request.urlopen(url, timeout=timeout) as res:
+        return res.status, json.loads(res.read().decode())
+
+
+def measure_once(timeout=60.0):
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR, env={**os.environ, "STARTUP_REPORT": "1"},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            try:
+                status, _ = _get(f"{base}/", timeout=0.5)
+                if status == 200:
+                    first_request = time.perf_counter() - start
+                    _, report = _get(f"{base}/debug/startup")
+                    return first_request, report.get("startup", {})
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.01)
+        raise TimeoutError(f"no response within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    times = []
+    for i in range(args.runs):
+        first_request, startup = measure_once()
+        times.append(first_request)
+        phases = ", ".join(f"{k}={v:.3f}s" for k, v in startup.items() if isinstance(v, float))
+        print(f"run {i + 1}: first request after {first_request:.3f}s  ({phases})")
+
+    print(f"\nprocess start → first request: median {statistics.median(times):.3f}s, "
+          f"min {min(times):.3f}s, max {max(times):.3f}s over {len(times)} runs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Stubbed ``google.genai`` client for benchmarks and offline tests.
+
+Mimics ``genai.Client(api_key=...).models.generate_content(...)`` with a
+configurable latency and a deterministic answer, and reports token usage the
+same way the real SDK does (``response.usage_metadata``).
+"""
+
+import time
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class _Response:
+    def __init__(self, text, usage):
+        self.text = text
+        self.usage_metadata = usage
+
+
+def _approx_tokens(contents):
+    if isinstance(contents, (list, tuple)):
+        return sum(_approx_tokens(c) for c in contents)
+    return max(1, len(str(contents)) // 4)
+
+
+class _Models:
+    def __init__(self, latency):
+        self._latency = latency
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        if self._latency:
+            time.sleep(self._latency)
+        prompt_tokens = _approx_tokens(contents)
+        text = f"[stub:{model}] Here is a short explanation of your question."
+        return _Response(text, _Usage(prompt_tokens, len(text) // 4))
+
+
+class StubGeminiClient:
+    """Drop-in for ``genai.Client``; set ``StubGeminiClient.latency`` to tune."""
+
+    latency = 0.05
+
+    def __init__(self, api_key=None, **kwargs):
+        self.models = _Models(self.latency)
@@ -0,0 +1,103 @@
+"""
+In-memory stand-in for the redis-py client used by cache.py.
+
+Implements ``get``, ``set`` (with ``ex``/``px``/``nx``), ``delete``, ``publish`` and
+``pubsub()`` (``subscribe``, ``get_message``, ``close``) with the same return
+types as redis-py (values come back as bytes). One instance shared between
+several ``TwoLevelCache`` objects behaves like one Redis server shared by
+several workers. ``fail = True`` makes every call raise ConnectionError.
+"""
+
+import queue
+import threading
+import time
+
+
+class PubSub:
+    def __init__(self, server, ignore_subscribe_messages=False):
+        self._server = server
+        self._queue = queue.Queue()
+        self._channels = set()
+        self._ignore = ignore_subscribe_messages
+
+    def subscribe(self, *channels):
+        self._server._check()
+        with self._server._lock:
+            for channel in channels:
+                self._channels.add(channel)
+                self._server._subscribers.setdefault(channel, set()).add(self)
+        if not self._ignore:
+            for channel in channels:
+                self._queue.put({"type": "subscribe", "channel": channel.encode(), "data": 1})
+
+    def get_message(self, timeout=0.0):
+        self._server._check()
+        try:
+            return self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self._server._lock:
+            for channel in self._channels:
+                self._server._subscribers.get(channel, set()).discard(self)
+        self._channels.clear()
+
+
+class MemoryRedis:
+    def __init__(self):
+        self._data = {}  # key → (expires_at or None, bytes)
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.fail = False
+        self.calls = 0
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("memredis: connection refused")
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, name):
+        self._check()
+        with self._lock:
+            self.calls += 1
+            item = self._data.get(name)
+            if item is None:
+                return None
+            if item[0] is not None and item[0] <= time.monotonic():
+                del self._data[name]
+                return None
+            return item[1]
+
+    def set(self, name, value, ex=None, px=None, nx=False):
+        self._check()
+        ttl = px / 1000 if px is not None else ex
+        with self._lock:
+            self.calls += 1
+            if nx:
+                item = self._data.get(name)
+                if item is not None and (item[0] is None or item[0] > time.monotonic()):
+                    return None
+            self._data[name] = (time.monotonic() + ttl if ttl is not None else None, self._bytes(value))
+        return True
+
+    def delete(self, *names):
+        self._check()
+        with self._lock:
+            self.calls += 1
+            return sum(self._data.pop(n, None) is not None for n in names)
+
+    def publish(self, channel, message):
+        self._check()
+        with self._lock:
+            self.calls += 1
+            subscribers = list(self._subscribers.get(channel, ()))
+        for sub in subscribers:
+            sub._queue.put({"type": "message", "channel": channel.encode(), "data": self._bytes(message)})
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return PubSub(self, ignore_subscribe_messages)
@@ -0,0 +1,517 @@
+"""
+In-memory stand-in for the Firestore client used by main.py.
+
+Implements the subset of the google-cloud-firestore API the backend relies
+on (collections, documents, sub-collections, simple queries, batches and
+field transforms) and counts billed reads and writes, both globally and per
+request via a context variable.
+"""
+
+import contextvars
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+
+
+class OpCounter:
+    """Billed Firestore operations (reads = documents returned)."""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+
+    def snapshot(self):
+        return {"reads": self.reads, "writes": self.writes, "deletes": self.deletes}
+
+
+_request_ops = contextvars.ContextVar("memstore_request_ops", default=None)
+
+
+def begin_request():
+    """Start counting operations for the current request context."""
+    counter = OpCounter()
+    _request_ops.set(counter)
+    return counter
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _get_path(data, field_path):
+    cur = data
+    for part in field_path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return None
+        cur = cur[part]
+    return cur
+
+
+def _has_path(data, field_path):
+    cur = data
+    for part in field_path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return False
+        cur = cur[part]
+    return True
+
+
+def _resolve(value, current):
+    """Apply a Firestore field transform / sentinel against ``current``."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, transforms.Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        out = list(current) if isinstance(current, list) else []
+        out.extend(v for v in value.values if v not in out)
+        return out
+    if isinstance(value, transforms.ArrayRemove):
+        return [v for v in (current or []) if v not in value.values]
+    if isinstance(value, dict):
+        return {k: _resolve(v, _get_path(current, k) if isinstance(current, dict) else None)
+                for k, v in value.items() if v is not transforms.DELETE_FIELD}
+    return _copy(value)
+
+
+def _set_path(data, field_path, value):
+    parts = field_path.split(".")
+    cur = data
+    for part in parts[:-1]:
+        nxt = cur.get(part)
+        if not isinstance(nxt, dict):
+            nxt = cur[part] = {}
+        cur = nxt
+    if value is transforms.DELETE_FIELD:
+        cur.pop(parts[-1], None)
+    else:
+        cur[parts[-1]] = _resolve(value, cur.get(parts[-1]))
+
+
+def _merge(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        elif value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        else:
+            target[key] = _resolve(value, target.get(key))
+
+
+def _project(data, field_paths):
+    out = {}
+    for fp in field_paths:
+        if _has_path(data, fp):
+            _set_path(out, fp, _copy(_get_path(data, fp)))
+    return out
+
+
+# ─── Snapshots & References ───────────────────────────────────────────────────
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        return _get_path(self._data or {}, field_path)
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return CollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, **kwargs):
+        store = self._client
+        with store._lock:
+            data = store._collection(self.parent.path).get(self.id)
+            data = _copy(data) if data is not None else None
+        store._count(reads=1)
+        if data is not None and field_paths is not None:
+            data = _project(data, field_paths)
+        return DocumentSnapshot(self, data)
+
+    def set(self, document_data, merge=False, **kwargs):
+        store = self._client
+        with store._lock:
+            docs = store._collection(self.parent.path)
+            if merge and self.id in docs:
+                _merge(docs[self.id], document_data)
+            else:
+                docs[self.id] = _resolve(document_data, {})
+        store._count(writes=1)
+        store._notify(self)
+
+    def create(self, document_data, **kwargs):
+        with self._client._lock:
+            if self.id in self._client._collection(self.parent.path):
+                raise exceptions.AlreadyExists(f"Document already exists: {self.path}")
+        self.set(document_data)
+
+    def update(self, field_updates, **kwargs):
+        store = self._client
+        with store._lock:
+            docs = store._collection(self.parent.path)
+            if self.id not in docs:
+                raise exceptions.NotFound(f"No document to update: {self.path}")
+            for field_path, value in field_updates.items():
+                _set_path(docs[self.id], field_path, value)
+        store._count(writes=1)
+        store._notify(self)
+
+    def delete(self, **kwargs):
+        store = self._client
+        with store._lock:
+            store._collection(self.parent.path).pop(self.id, None)
+        store._count(deletes=1)
+        store._notify(self)
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a is not None and a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a is not None and a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(v in a for v in b),
+}
+
+
+class AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class AggregationQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias or "count"
+
+    def get(self, **kwargs):
+        n = len(self._query._matches())
+        # Count aggregations are billed one read per 1000 index entries.
+        self._query._client._count(reads=max(1, (n + 999) // 1000))
+        return [[AggregationResult(self._alias, n)]]
+
+
+class Query:
+    DESCENDING = "DESCENDING"
+    ASCENDING = "ASCENDING"
+
+    def __init__(self, client, path, filters=(), orders=(), limit=None, fields=None, after=None, group=False):
+        self._client = client
+        self._path = path
+        self._group = group  # collection_group(path): every collection named ``path``
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._fields = fields
+        self._after = after
+
+    def _clone(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders,
+                     limit=self._limit, fields=self._fields, after=self._after, group=self._group)
+        state.update(changes)
+        return Query(self._client, self._path, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._clone(filters=self._filters + ((field_path, _OPS[op_string], value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._clone(orders=self._orders + ((field_path, direction == "DESCENDING"),))
+
+    def limit(self, count):
+        return self._clone(limit=count)
+
+    def select(self, field_paths):
+        return self._clone(fields=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        """Only ``order_by("__name__")`` cursors: a snapshot or {"__name__": doc_id}."""
+        cursor = document_fields_or_snapshot
+        doc_id = cursor.id if isinstance(cursor, DocumentSnapshot) else cursor["__name__"]
+        return self._clone(after=getattr(doc_id, "id", doc_id))
+
+    def count(self, alias=None):
+        return AggregationQuery(self, alias)
+
+    def _docs(self):
+        if not self._group:
+            return self._client._collection(self._path).items()
+        return [(f"{path}/{doc_id}", data) for path, docs in list(self._client._data.items())
+                if path.rsplit("/", 1)[-1] == self._path for doc_id, data in docs.items()]
+
+    def _doc_path(self, doc_id):
+        return doc_id if self._group else f"{self._path}/{doc_id}"
+
+    def _matches(self):
+        with self._client._lock:
+            return [(doc_id, data) for doc_id, data in self._docs()
+                    if all(op(_get_path(data, fp), value) for fp, op, value in self._filters)]
+
+    def stream(self, **kwargs):
+        with self._client._lock:
+            matches = self._matches()
+            for field_path, descending in reversed(self._orders):
+                if field_path == "__name__":
+                    matches.sort(key=lambda m: m[0], reverse=descending)
+                    continue
+                matches = [m for m in matches if _has_path(m[1], field_path)]
+                matches.sort(key=lambda m: _get_path(m[1], field_path), reverse=descending)
+            if self._after is not None:
+                matches = [m for m in matches if m[0] > self._after]
+            if self._limit is not None:
+                matches = matches[:self._limit]
+            matches = [(doc_id, _project(data, self._fields) if self._fields is not None else _copy(data))
+                       for doc_id, data in matches]
+        self._client._count(reads=max(1, len(matches)))
+        for doc_id, data in matches:
+            yield DocumentSnapshot(DocumentReference(self._client, self._doc_path(doc_id)), data)
+
+    def get(self, **kwargs):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._client._listen(self, callback)
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        """The owning document of a sub-collection, None for top-level collections."""
+        return DocumentReference(self._client, self.path.rsplit("/", 1)[0]) if "/" in self.path else None
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, document_data, document_id=None, **kwargs):
+        ref = self.document(document_id)
+        ref.set(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self, **kwargs):
+        with self._client._lock:
+            ids = list(self._client._collection(self._path))
+        return [self.document(i) for i in ids]
+
+
+# ─── Writes ───────────────────────────────────────────────────────────────────
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+        self._creates = []
+
+    def create(self, reference, document_data):
+        self._creates.append(reference)
+        self._ops.append(lambda: reference.create(document_data))
+
+    def set(self, reference, document_data, merge=False):
+        self._ops.append(lambda: reference.set(document_data, merge=merge))
+
+    def update(self, reference, field_updates):
+        self._ops.append(lambda: reference.update(field_updates))
+
+    def delete(self, reference):
+        self._ops.append(lambda: reference.delete())
+
+    def commit(self, **kwargs):
+        # Like Firestore, a create() conflict fails the whole batch.
+        for reference in self._creates:
+            if reference.id in self._client._collection(reference.parent.path):
+                self._ops, self._creates = [], []
+                raise exceptions.AlreadyExists(f"Document already exists: {reference.path}")
+        for op in self._ops:
+            op()
+        results, self._ops, self._creates = self._ops, [], []
+        return results
+
+    def __len__(self):
+        return len(self._ops)
+
+
+class BulkWriter(WriteBatch):
+    """Writes are applied immediately; flush/close are no-ops."""
+
+    def set(self, reference, document_data, merge=False):
+        reference.set(document_data, merge=merge)
+
+    def update(self, reference, field_updates):
+        reference.update(field_updates)
+
+    def delete(self, reference):
+        reference.delete()
+
+    def create(self, reference, document_data):
+        reference.create(document_data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Change:
+    def __init__(self, type_name, document):
+        self.type = type("ChangeType", (), {"name": type_name})()
+        self.document = document
+
+
+class _Watch:
+    def __init__(self, client, query, callback):
+        self._client = client
+        self.query = query
+        self.callback = callback
+        self.members = set()
+
+    def unsubscribe(self):
+        with self._client._lock:
+            if self in self._client._watches:
+                self._client._watches.remove(self)
+
+
+# ─── Client ───────────────────────────────────────────────────────────────────
+
+class MemoryFirestore:
+    """Drop-in replacement for ``firestore.client()`` backed by dicts."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.RLock()
+        self._watches = []
+        self.totals = OpCounter()
+
+    def _collection(self, path):
+        docs = self._data.get(path)
+        if docs is None:
+            docs = self._data[path] = {}
+        return docs
+
+    def _count(self, reads=0, writes=0, deletes=0):
+        with self._lock:
+            self._count_locked(reads, writes, deletes)
+
+    def _count_locked(self, reads, writes, deletes):
+        for counter in (self.totals, _request_ops.get()):
+            if counter is not None:
+                counter.reads += reads
+                counter.writes += writes
+                counter.deletes += deletes
+
+    def _listen(self, query, callback):
+        watch = _Watch(self, query, callback)
+        with self._lock:
+            self._watches.append(watch)
+            docs = [DocumentSnapshot(DocumentReference(self, query._doc_path(i)), _copy(d))
+                    for i, d in query._matches()]
+            watch.members = {d.id for d in docs}
+        callback(docs, [_Change("ADDED", d) for d in docs], datetime.now(timezone.utc))
+        return watch
+
+    def _notify(self, ref):
+        """Deliver a change to listeners on the document's collection.
+
+        Membership of the query result is tracked per watch, so a document
+        that stops matching a filter is reported as REMOVED.
+        """
+        if not self._watches:
+            return
+        parent = ref.parent.path
+        with self._lock:
+            data = self._collection(parent).get(ref.id)
+            snap = DocumentSnapshot(ref, _copy(data) if data is not None else None)
+            watches = [w for w in self._watches if w.query._path == parent]
+        for watch in watches:
+            match = data is not None and all(
+                op(_get_path(data, fp), value) for fp, op, value in watch.query._filters)
+            was_member = ref.id in watch.members
+            if match:
+                watch.members.add(ref.id)
+                kind = "MODIFIED" if was_member else "ADDED"
+            elif was_member:
+                watch.members.discard(ref.id)
+                kind = "REMOVED"
+            else:
+                continue
+            watch.callback([snap] if match else [], [_Change(kind, snap)],
+                           datetime.now(timezone.utc))
+
+    # Public client API
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def document(self, path):
+        return DocumentReference(self, path)
+
+    def collection_group(self, collection_id):
+        return Query(self, collection_id, group=True)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def bulk_writer(self, **kwargs):
+        return BulkWriter(self)
+
+    def get_all(self, references, field_paths=None, **kwargs):
+        for ref in references:
+            yield ref.get(field_paths=field_paths)
+
+    def load(self, records):
+        """Bulk-load ``synthetic_data.Record`` tuples without counting ops."""
+        n = 0
+        with self._lock:
+            for path, data, merge in records:
+                col, doc_id = path.rsplit("/", 1)
+                docs = self._collection(col)
+                if merge and doc_id in docs:
+                    _merge(docs[doc_id], data)
+                else:
+                    docs[doc_id] = _copy(data)
+                n += 1
+        return n
+
+    def count_documents(self, path):
+        with self._lock:
+            return len(self._data.get(path, {}))
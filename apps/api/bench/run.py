@@ -0,0 +1,368 @@
+"""
+Endpoint load test & latency benchmark for the Manan API.
+
+Builds a synthetic campus (see synthetic_data.py), loads it into an in-memory
+Firestore stand-in (or a local Firestore emulator), stubs Gemini and auth,
+and then drives a weighted mix of requests against every route in-process.
+
+Run from apps/api:
+    python -m bench.run --preset small --requests 3000 --concurrency 16
+    python -m bench.run --preset small --save-baseline
+    python -m bench.run --preset small --compare          # exit 1 on regression
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m bench.run --emulator
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic_data as sd  # noqa: E402
+from bench import memstore  # noqa: E402
+from bench.gemini_stub import StubGeminiClient  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+# ─── Harness ──────────────────────────────────────────────────────────────────
+
+def _fake_verify_id_token(token, *args, **kwargs):
+    """Bench tokens are the caller's UID."""
+    return {"uid": token, "email": f"{token}@manan.ai"}
+
+
+def _emulator_client():
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import firestore as gcf
+    project = os.getenv("GCLOUD_PROJECT", "manan-bench")
+    return gcf.Client(project=project, credentials=AnonymousCredentials())
+
+
+def _seed_emulator(client, spec):
+    batch, n = client.batch(), 0
+    for path, data, merge in sd.iter_campus(spec):
+        batch.set(client.document(path), data, merge=merge)
+        n += 1
+        if n % 500 == 0:
+            batch.commit()
+            batch = client.batch()
+    batch.commit()
+    return n
+
+
+def build_app(spec, emulator=False, gemini_latency=0.05):
+    """Patch Firebase/Gemini, seed the store and import ``main``."""
+    from firebase_admin import auth, firestore
+    from google import genai
+
+    store = _emulator_client() if emulator else memstore.MemoryFirestore()
+    t0 = time.perf_counter()
+    n = _seed_emulator(store, spec) if emulator else store.load(sd.iter_campus(spec))
+    print(f"Seeded {n:,} documents in {time.perf_counter() - t0:.1f}s")
+
+    firestore.client = lambda app=None: store
+    auth.verify_id_token = _fake_verify_id_token
+    StubGeminiClient.latency = gemini_latency
+    genai.Client = StubGeminiClient
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    # Background tasks go to a throwaway queue file, not the working directory
+    os.environ.setdefault("TASKS_DB", os.path.join(tempfile.mkdtemp(prefix="manan-bench-"), "tasks.sqlite3"))
+
+    import main
+    return main.app, store
+
+
+# ─── Traffic Mix ──────────────────────────────────────────────────────────────
+# Each scenario returns (route label, method, url, request kwargs). Weights
+# approximate a weekday: mostly student reads, some AI traffic, a little admin.
+
+class Ctx:
+    def __init__(self, spec):
+        self.spec = spec
+        self.created_courses = []
+
+    def student(self, r):
+        return sd.student_id(r.randrange(self.spec.students))
+
+    def teacher(self, r):
+        return sd.teacher_id(r.randrange(self.spec.teacher_count))
+
+    def course(self, r):
+        return sd.course_id(r.randrange(self.spec.courses))
+
+    def doubt(self, r):
+        return sd.doubt_id(r.randrange(self.spec.doubts))
+
+
+def _delete_course(r, ctx):
+    if ctx.created_courses:
+        teacher, cid = ctx.created_courses.pop()
+    else:
+        teacher, cid = ctx.teacher(r), "missing-course"
+    return "DELETE /courses/{id}", "DELETE", f"/courses/{cid}", {"params": {"token": teacher}}
+
+
+SCENARIOS = [
+    (2, lambda r, c: ("GET /", "GET", "/", {})),
+    (0.5, lambda r, c: ("GET /metrics", "GET", "/metrics", {})),
+    (10, lambda r, c: ("POST /solve-doubt", "POST", "/solve-doubt", {"json": (
+        lambda s: {"student_id": s, "token": s, "question_text": r.choice(sd.QUESTION_TEMPLATES).format(
+            a="paging", b="segmentation")})(c.student(r))})),
+    (2, lambda r, c: ("POST /predict", "POST", "/predict", {"json": {
+        "attendance": r.uniform(40, 100), "marks": r.uniform(20, 100)}})),
+    (0.2, lambda r, c: ("POST /analyze-resume", "POST", "/analyze-resume", {
+        "files": {"file": ("resume.pdf", b"%PDF-1.4 bench", "application/pdf")}})),
+    (12, lambda r, c: ("GET /student/profile", "GET", "/student/profile", {
+        "params": {"uid": c.student(r)}})),
+    (2, lambda r, c: ("PUT /student/profile", "PUT", "/student/profile", {"json": (
+        lambda s: {"uid": s, "email": f"{s}@manan.ai", "name": "Bench Student",
+                   "cgpa": round(r.uniform(3, 10), 2), "attendance": round(r.uniform(40, 100), 1)}
+    )(c.student(r))})),
+    (4, lambda r, c: ("POST /auth/sync", "POST", "/auth/sync", {"json": {
+        "token": c.student(r), "role": "student"}})),
+    (12, lambda r, c: ("GET /courses", "GET", "/courses", {})),
+    (6, lambda r, c: ("GET /courses/{id}", "GET", f"/courses/{c.course(r)}", {})),
+    (0.5, None),  # POST /courses — built in _create_course to track IDs
+    (0.3, _delete_course),
+    (2, lambda r, c: ("POST /courses/enroll", "POST", "/courses/enroll", {"json": (
+        lambda s: {"student_id": s, "course_id": c.course(r), "token": s})(c.student(r))})),
+    (2, lambda r, c: ("POST /teacher/students", "POST", "/teacher/students", {"json": (
+        lambda t: {"teacher_id": t, "token": t})(c.teacher(r))})),
+    (0.5, lambda r, c: ("POST /courses/{id}/syllabus", "POST", f"/courses/{c.course(r)}/syllabus",
+                        {"json": {"token": c.teacher(r)}})),
+    (6, lambda r, c: ("POST /courses/doubts", "POST", "/courses/doubts", {"json": (
+        lambda s: {"course_id": c.course(r), "student_id": s, "token": s,
+                   "question": "Can you explain deadlock avoidance?"})(c.student(r))})),
+    (8, lambda r, c: ("GET /courses/{id}/doubts", "GET", f"/courses/{c.course(r)}/doubts", {
+        "params": {"student_id": c.student(r)} if r.random() < 0.5 else {}})),
+    (2, lambda r, c: ("PUT /doubts/{id}/resolve", "PUT", f"/doubts/{c.doubt(r)}/resolve", {"json": {
+        "token": c.teacher(r), "answer": "Covered in lecture 7."}})),
+    (3, lambda r, c: ("POST /admin/doubts", "POST", "/admin/doubts", {"json": (
+        lambda t: {"teacher_id": t, "token": t})(c.teacher(r))})),
+    (1, lambda r, c: ("POST /admin/students", "POST", "/admin/students", {"json": {
+        "token": c.teacher(r)}})),
+    (0.5, lambda r, c: ("POST /admin/notify/batch", "POST", "/admin/notify/batch", {"json": {
+        "token": c.teacher(r), "title": "Assignment due Friday",
+        "student_ids": [c.student(r) for _ in range(30)]}})),
+    (2, lambda r, c: ("POST /generate-quiz", "POST", "/generate-quiz", {"json": {
+        "subject": "DSA", "topic": "Trees"}})),
+    (3, lambda r, c: ("POST /admin/stats", "POST", "/admin/stats", {"json": (
+        lambda t: {"teacher_id": t, "token": t})(c.teacher(r))})),
+    (0.5, lambda r, c: ("POST /notifications", "POST", "/notifications", {"json": {
+        "token": c.teacher(r), "title": "Campus closed on Monday", "type": "info"}})),
+    (12, lambda r, c: ("GET /notifications", "GET", "/notifications", {})),
+    (3, lambda r, c: ("GET /placement-drives", "GET", "/placement-drives", {})),
+    (4, lambda r, c: ("POST /placement-progress", "POST", "/placement-progress", {"json": (
+        {"student_id": c.student(r)} if r.random() < 0.5 else {
+            "student_id": c.student(r), "topic_progress": {"arrays": r.random() < 0.5},
+            "daily_goals": {"solve_3": True}, "company_checks": {}, "streak": r.randint(0, 9)})})),
+    (3, lambda r, c: ("GET /admin/settings", "GET", "/admin/settings", {})),
+    (0.1, lambda r, c: ("POST /admin/settings", "POST", "/admin/settings", {"json": {
+        "token": c.teacher(r), "maintenance_mode": False, "exam_mode": False,
+        "attendance_threshold": 75, "cgpa_threshold": 5.0}})),
+]
+
+
+def _create_course(r, ctx):
+    t = ctx.teacher(r)
+    return "POST /courses", "POST", "/courses", {"json": {
+        "title": "Bench Elective", "description": "Created by the benchmark",
+        "teacher_id": t, "teacher_name": "Bench Teacher", "token": t}}
+
+
+def _pick(r, ctx):
+    weights = [w for w, _ in SCENARIOS]
+    _, fn = r.choices(SCENARIOS, weights=weights)[0]
+    return (fn or _create_course)(r, ctx)
+
+
+def _is_error(status, body):
+    if status >= 400:
+        return True
+    return isinstance(body, dict) and body.get("status") == "error"
+
+
+# ─── Runner ───────────────────────────────────────────────────────────────────
+
+async def drive(app, spec, total, concurrency, seed):
+    import httpx
+
+    ctx = Ctx(spec)
+    samples = []
+    first_errors = {}
+    issued = 0
+
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker(w):
+            nonlocal issued
+            r = random.Random(f"{seed}:worker:{w}")
+            while issued < total:
+                issued += 1
+                label, method, url, kwargs = _pick(r, ctx)
+                ops = memstore.begin_request()
+                t0 = time.perf_counter()
+                res = await client.request(method, url, **kwargs)
+                elapsed = time.perf_counter() - t0
+                try:
+                    body = res.json()
+                except ValueError:
+                    body = None
+                if label == "POST /courses" and isinstance(body, dict) and body.get("course_id"):
+                    ctx.created_courses.append((kwargs["json"]["teacher_id"], body["course_id"]))
+                err = _is_error(res.status_code, body)
+                if err and label not in first_errors:
+                    first_errors[label] = body.get("message") if isinstance(body, dict) else res.status_code
+                samples.append((label, elapsed, err, ops.snapshot()))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(concurrency)))
+        wall = time.perf_counter() - t0
+    for label, message in sorted(first_errors.items()):
+        print(f"  first error on {label}: {message}")
+    return samples, wall
+
+
+def _pct(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def summarize(samples, wall, count_ops=True):
+    by_route = {}
+    for label, elapsed, err, ops in samples:
+        by_route.setdefault(label, []).append((elapsed, err, ops))
+
+    routes = {}
+    for label, rows in sorted(by_route.items()):
+        lat = sorted(r[0] * 1000 for r in rows)
+        routes[label] = {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if r[1]),
+            "p50_ms": round(_pct(lat, 50), 2),
+            "p95_ms": round(_pct(lat, 95), 2),
+            "p99_ms": round(_pct(lat, 99), 2),
+            "mean_ms": round(statistics.fmean(lat), 2),
+            "reads_per_req": round(statistics.fmean(r[2]["reads"] for r in rows), 1) if count_ops else None,
+            "writes_per_req": round(statistics.fmean(r[2]["writes"] + r[2]["deletes"] for r in rows), 1)
+            if count_ops else None,
+        }
+    lat = sorted(s[1] * 1000 for s in samples)
+    return {
+        "requests": len(samples),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(samples) / wall, 1) if wall else 0.0,
+        "p50_ms": round(_pct(lat, 50), 2),
+        "p95_ms": round(_pct(lat, 95), 2),
+        "p99_ms": round(_pct(lat, 99), 2),
+        "routes": routes,
+    }
+
+
+def print_report(report):
+    print(f"\n{'route':<32}{'n':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'reads':>9}{'writes':>8}")
+    for label, r in report["routes"].items():
+        reads = "-" if r["reads_per_req"] is None else f"{r['reads_per_req']:.1f}"
+        writes = "-" if r["writes_per_req"] is None else f"{r['writes_per_req']:.1f}"
+        print(f"{label:<32}{r['count']:>6}{r['errors']:>5}{r['p50_ms']:>9.1f}"
+              f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{reads:>9}{writes:>8}")
+    print(f"\nTotal: {report['requests']} requests in {report['wall_s']}s "
+          f"→ {report['throughput_rps']} req/s  "
+          f"(p50 {report['p50_ms']}ms, p95 {report['p95_ms']}ms, p99 {report['p99_ms']}ms)")
+
+
+def compare(report, baseline, latency_tolerance, ops_tolerance):
+    """Return human-readable regressions of ``report`` against ``baseline``."""
+    problems = []
+    for label, base in baseline.get("routes", {}).items():
+        cur = report["routes"].get(label)
+        if not cur:
+            continue
+        # Per-route tails are dominated by queueing behind heavy routes, so
+        # gate on the median there and on the tails only for the whole mix.
+        limit = max(base["p50_ms"] * (1 + latency_tolerance), base["p50_ms"] + 5.0)
+        if cur["count"] >= 20 and cur["p50_ms"] > limit:
+            problems.append(f"{label}: p50 {cur['p50_ms']}ms > {limit:.1f}ms (baseline {base['p50_ms']}ms)")
+        for key in ("reads_per_req", "writes_per_req"):
+            if cur.get(key) is None or base.get(key) is None:
+                continue
+            allowed = base[key] * (1 + ops_tolerance) + 0.5
+            if cur[key] > allowed:
+                problems.append(f"{label}: {key} {cur[key]} > {allowed:.1f} (baseline {base[key]})")
+        if cur["errors"] > base.get("errors", 0) and cur["errors"] / cur["count"] > 0.01:
+            problems.append(f"{label}: {cur['errors']} errors (baseline {base.get('errors', 0)})")
+    for key in ("p95_ms", "p99_ms"):
+        limit = baseline[key] * (1 + latency_tolerance)
+        if report[key] > limit:
+            problems.append(f"overall {key} {report[key]} > {limit:.1f} (baseline {baseline[key]})")
+    base_rps = baseline.get("throughput_rps")
+    if base_rps and report["throughput_rps"] < base_rps / (1 + latency_tolerance):
+        problems.append(f"throughput {report['throughput_rps']} req/s < baseline {base_rps} req/s")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(sd.PRESETS), default="small")
+    parser.add_argument("--students", type=int)
+    parser.add_argument("--courses", type=int)
+    parser.add_argument("--doubts", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="stubbed Gemini latency (s)")
+    parser.add_argument("--emulator", action="store_true", help="use FIRESTORE_EMULATOR_HOST instead of memory")
+    parser.add_argument("--json", dest="json_out", help="write the report as JSON to this path")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--latency-tolerance", type=float, default=0.50)
+    parser.add_argument("--ops-tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.emulator and not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        parser.error("--emulator requires FIRESTORE_EMULATOR_HOST")
+
+    base = sd.PRESETS[args.preset]
+    spec = sd.CampusSpec(**{**base.__dict__, "seed": args.seed, **{
+        k: v for k, v in (("students", args.students), ("courses", args.courses),
+                          ("doubts", args.doubts)) if v is not None}})
+
+    app, _ = build_app(spec, emulator=args.emulator, gemini_latency=args.gemini_latency)
+    samples, wall = asyncio.run(drive(app, spec, args.requests, args.concurrency, args.seed))
+    report = summarize(samples, wall, count_ops=not args.emulator)
+    report["config"] = {"preset": args.preset, "spec": spec.__dict__, "requests": args.requests,
+                        "concurrency": args.concurrency, "gemini_latency": args.gemini_latency}
+    print_report(report)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.latency_tolerance, args.ops_tolerance)
+        if problems:
+            print("\n❌ Regressions vs baseline:")
+            for p in problems:
+                print(f"  - {p}")
+            return 1
+        print("\n✅ No regressions vs baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
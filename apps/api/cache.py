@@ -0,0 +1,277 @@
+"""
+cache.py — Two-level cache shared across workers
+
+Level 1 is an in-process LRU. Level 2 is a shared Redis-protocol store
+(Redis, Valkey, KeyDB, ...), so a value loaded by one worker is a hit for
+every other worker and node. Invalidations delete the shared entry and are
+broadcast over pub/sub, and every process drops its L1 copy.
+
+* ``get_or_load(key, ttl, loader)`` — L1, then L2, then ``loader()``. Only
+  one thread per process runs the loader for a key; the rest wait for it.
+  Loader exceptions propagate and nothing is cached. If the key is
+  invalidated while its loader runs, the loaded value is returned but not
+  cached, since it may predate the write.
+* ``add(key, value, ttl)`` — set-if-absent, for short cross-worker claims.
+* ``invalidate(*keys)`` — delete everywhere and notify the other processes.
+* ``on_invalidate(key, callback)`` — hook for modules with their own hot-path
+  cache (system_settings), called for local and remote invalidations alike.
+
+Without ``REDIS_URL`` (or without the optional ``redis`` package) only the
+L1 is used, and invalidations stay in the process. If the shared store
+errors, the cache fails open: L1 and loader only, retried after
+``REDIS_RETRY_S``. With a shared store, L1 entries never outlive
+``CACHE_L1_MAX_TTL``, which bounds staleness if a pub/sub message is lost
+while reconnecting.
+
+Values must be JSON-serializable (datetimes come back as ISO strings from L2).
+Callers must not mutate returned values; they're shared.
+
+Configuration (environment):
+    REDIS_URL            e.g. redis://localhost:6379/0 (unset = L1 only)
+    CACHE_NAMESPACE      key and channel prefix (default manan)
+    CACHE_L1_SIZE        entries kept per process (default 10000)
+    CACHE_L1_MAX_TTL     longest an L1 entry lives, in seconds (default 30)
+    REDIS_RETRY_S        back-off after a shared-store error (default 5)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+
+import responses
+
+try:
+    import redis
+except ImportError:  # optional: in-process cache only
+    redis = None
+
+REDIS_URL = os.getenv("REDIS_URL", "")
+NAMESPACE = os.getenv("CACHE_NAMESPACE", "manan")
+L1_SIZE = int(os.getenv("CACHE_L1_SIZE", "10000"))
+L1_MAX_TTL = float(os.getenv("CACHE_L1_MAX_TTL", "30"))
+RETRY_S = float(os.getenv("REDIS_RETRY_S", "5"))
+
+MISS = object()
+
+
+class LRU:
+    """Size-bounded mapping of key → (expires_at, value)."""
+
+    def __init__(self, size, clock=time.monotonic):
+        self.size = size
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISS
+            if item[0] <= self._clock():
+                del self._data[key]
+                return MISS
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoLevelCache:
+    def __init__(self, shared=None, l1_size=L1_SIZE, l1_max_ttl=L1_MAX_TTL, namespace=NAMESPACE,
+                 retry_s=RETRY_S, clock=time.monotonic):
+        self.shared = shared
+        self.l1 = LRU(l1_size, clock)
+        self.l1_max_ttl = l1_max_ttl
+        self.namespace = namespace
+        self.channel = f"{namespace}:invalidate"
+        self.retry_s = retry_s
+        self._clock = clock
+        self._down_until = 0.0
+        self._loading = {}  # key → Lock held by the loading thread
+        self._generations = {}  # key → invalidations seen while its loader runs
+        self._loading_lock = threading.Lock()
+        self._hooks = {}
+        self._listener = None
+        self._stop = threading.Event()
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "l2_errors": 0, "remote_invalidations": 0}
+
+    # ── Shared Store ──────────────────────────────────────────────────────────
+
+    def _available(self):
+        return self.shared is not None and self._clock() >= self._down_until
+
+    def _shared_call(self, method, *args, default=None, **kwargs):
+        if not self._available():
+            return default
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except Exception as e:
+            if self._down_until <= self._clock():
+                print(f"⚠️  Shared cache unavailable, using in-process only for {self.retry_s:.0f}s: {e}")
+            self._down_until = self._clock() + self.retry_s
+            self.stats["l2_errors"] += 1
+            return default
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    # ── Reads / Writes ────────────────────────────────────────────────────────
+
+    def get(self, key, l1=True):
+        """``l1=False`` reads the shared copy first, for values any worker may rewrite."""
+        if l1 or not self._available():
+            value = self.l1.get(key)
+            if value is not MISS:
+                self.stats["l1_hits"] += 1
+                return value
+        raw = self._shared_call("get", self._key(key))
+        if raw is None and not l1 and not self._available():
+            return self.get(key)  # the shared store just failed
+        if raw is None:
+            self.stats["misses"] += 1
+            return MISS
+        value = orjson.loads(raw)
+        self.stats["l2_hits"] += 1
+        self.l1.set(key, value, self.l1_max_ttl)
+        return value
+
+    def set(self, key, value, ttl):
+        # With a shared store, L1 copies are capped in case an invalidation is
+        # missed; on its own the L1 is authoritative and keeps the full TTL.
+        self.l1.set(key, value, ttl if self.shared is None else min(ttl, self.l1_max_ttl))
+        self._shared_call("set", self._key(key), responses.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def add(self, key, value, ttl):
+        """Set ``key`` only if it is absent (across workers when shared); True if set."""
+        added = self._shared_call("set", self._key(key), responses.dumps(value),
+                                  px=max(1, int(ttl * 1000)), nx=True, default=MISS)
+        if added is not MISS:
+            return bool(added)
+        with self._loading_lock:  # in-process only
+            if self.l1.get(key) is not MISS:
+                return False
+            self.l1.set(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        """Remove ``key`` without notifying other processes (for keys they never cache)."""
+        self.l1.pop(key)
+        self._shared_call("delete", self._key(key))
+
+    def get_or_load(self, key, ttl, loader):
+        value = self.get(key)
+        if value is not MISS:
+            return value
+        with self._loading_lock:
+            lock = self._loading.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                value = self.l1.get(key)  # loaded while we waited
+                if value is MISS:
+                    with self._loading_lock:
+                        self._generations[key] = 0
+                    try:
+                        value = loader()
+                    finally:
+                        with self._loading_lock:
+                            invalidated = self._generations.pop(key, 0)
+                    if not invalidated:
+                        self.set(key, value, ttl)
+                return value
+            finally:
+                with self._loading_lock:
+                    self._loading.pop(key, None)
+
+    # ── Invalidation ──────────────────────────────────────────────────────────
+
+    def on_invalidate(self, key, callback):
+        self._hooks.setdefault(key, []).append(callback)
+
+    def _drop(self, keys):
+        with self._loading_lock:
+            for key in keys:
+                if key in self._generations:
+                    self._generations[key] += 1
+        for key in keys:
+            self.l1.pop(key)
+            for callback in self._hooks.get(key, ()):
+                callback()
+
+    def invalidate(self, *keys):
+        """Delete ``keys`` here, in the shared store, and in every other process's L1."""
+        if not keys:
+            return
+        self._drop(keys)
+        self._shared_call("delete", *[self._key(k) for k in keys])
+        self._shared_call("publish", self.channel, orjson.dumps(list(keys)))
+
+    def start(self):
+        """Subscribe to invalidations from other processes (call after any fork)."""
+        if self.shared is None or self._listener is not None:
+            return None
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="cache-invalidations", daemon=True)
+        self._listener.start()
+        return self._listener
+
+    def _listen(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.shared.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while we were disconnected is lost.
+                self.l1.clear()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self.stats["remote_invalidations"] += 1
+                        self._drop(orjson.loads(message["data"]))
+            except Exception as e:
+                print(f"⚠️  Cache invalidation listener: {e}")
+                self._stop.wait(self.retry_s)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def close(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+
+
+def _connect():
+    if not REDIS_URL:
+        return None
+    if redis is None:
+        print("⚠️  REDIS_URL is set but the redis package is not installed; cache is per-process")
+        return None
+    return redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+
+# Process-wide cache; the client connects lazily on first use.
+shared = TwoLevelCache(_connect())
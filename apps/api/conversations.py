@@ -0,0 +1,153 @@
+"""
+conversations.py — Multi-turn Ask Manan conversations
+
+Each answered ``/solve-doubt`` returns a ``conversation_id``. A follow-up that
+sends it back is answered with the earlier turns as context, and the student
+doesn't have to paste them again. History is held on the server, and each
+follow-up's prompt stays under a token budget:
+
+* The prompt is the running summary, then the most recent turns verbatim,
+  then the new question.
+* When that would exceed ``CONVERSATION_TOKEN_BUDGET``, the oldest turns are
+  folded into the summary with one small Gemini call. Enough turns are folded
+  to bring the window down to half the room left, so this happens every few
+  turns, not on every one. If the summary call fails, a short extract of
+  the folded questions is kept instead.
+* Answer sizes come from Gemini's token counts. Questions and summaries are
+  estimated at ~4 characters per token.
+
+State is one small JSON value per conversation: short keys, the summary, and
+turns with their token counts. It lives in the Shared Cache store
+(``REDIS_URL``), so any worker can continue a conversation, and expires
+``CONVERSATION_TTL_S`` after the last turn. Without a shared store,
+conversations are held per process, in an LRU of ``CONVERSATIONS_MAX``.
+
+Configuration (environment):
+    CONVERSATION_TOKEN_BUDGET    prompt tokens per follow-up (default 3000)
+    CONVERSATION_SUMMARY_TOKENS  longest running summary (default 300)
+    CONVERSATION_TTL_S           idle conversations expire after this (default 3600)
+    CONVERSATIONS_MAX            conversations kept per process without a shared store (default 20000)
+"""
+
+import os
+import secrets
+
+import cache
+
+TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "3000"))
+SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "300"))
+TTL_S = float(os.getenv("CONVERSATION_TTL_S", "3600"))
+MAX_CONVERSATIONS = int(os.getenv("CONVERSATIONS_MAX", "20000"))
+
+SUMMARY_MODEL = "gemini-2.0-flash-lite"
+CHARS_PER_TOKEN = 4
+# Characters of each folded question kept when the summary call fails
+EXTRACT_CHARS = 160
+
+INSTRUCTION = ("You are Manan, an academic assistant answering a student's follow-up questions. "
+               "Summary of the conversation so far:\n")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def summary_prompt(summary, turns, max_tokens=SUMMARY_TOKENS):
+    """Prompt asking Gemini to fold ``turns`` ([question, answer, tokens]) into ``summary``."""
+    exchanges = "\n\n".join(f"Student: {q}\nManan: {a}" for q, a, _ in turns)
+    return ("Update the running summary of a tutoring conversation between a student and Manan. "
+            "Keep the topics covered, what the student understood or struggled with, and any facts "
+            f"or notation later answers must stay consistent with. Reply with the summary only, "
+            f"at most {max_tokens * 3 // 4} words.\n\n"
+            f"Summary so far:\n{summary or '(none)'}\n\nNew exchanges:\n{exchanges}")
+
+
+def _extract(summary, turns, max_tokens):
+    """Fallback summary: the folded questions, newest kept when it's too long."""
+    asked = " ".join(f"Asked: {q[:EXTRACT_CHARS]}" for q, _, _ in turns)
+    text = f"{summary} {asked}".strip()
+    return text[-max_tokens * CHARS_PER_TOKEN:]
+
+
+class Conversations:
+    def __init__(self, store=None, budget=TOKEN_BUDGET, summary_tokens=SUMMARY_TOKENS, ttl=TTL_S,
+                 max_conversations=MAX_CONVERSATIONS):
+        # Own L1 so conversations never push settings or courses out of the main cache
+        self.store = store if store is not None else cache.TwoLevelCache(cache.shared.shared,
+                                                                         l1_size=max_conversations)
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self.ttl = ttl
+        self.stats = {"started": 0, "continued": 0, "expired": 0, "summaries": 0, "summary_failures": 0}
+
+    @staticmethod
+    def _key(conversation_id):
+        return f"conversation:{conversation_id}"
+
+    # ── State ─────────────────────────────────────────────────────────────────
+
+    def start(self, student_id, course_id=None):
+        """A new, empty conversation: (conversation_id, state). Saved by ``record``."""
+        self.stats["started"] += 1
+        # u: student, c: course, s: summary, st: summary tokens, t: [question, answer, tokens], n: turns
+        return secrets.token_urlsafe(12), {"u": student_id, "c": course_id, "s": "", "st": 0, "t": [], "n": 0}
+
+    def load(self, conversation_id, student_id):
+        """The conversation's state, or None if it expired or isn't this student's."""
+        state = self.store.get(self._key(conversation_id), l1=False)
+        if state is cache.MISS or state.get("u") != student_id:
+            self.stats["expired"] += 1
+            return None
+        self.stats["continued"] += 1
+        return state
+
+    def record(self, conversation_id, state, question, answer, answer_tokens=None):
+        """Append a turn and save the conversation, restarting its TTL."""
+        tokens = estimate_tokens(question) + (answer_tokens or estimate_tokens(answer))
+        state = {**state, "t": state["t"] + [[question, answer, tokens]], "n": state["n"] + 1}
+        self.store.set(self._key(conversation_id), state, self.ttl)
+        return state
+
+    # ── Prompts ───────────────────────────────────────────────────────────────
+
+    def prompt(self, state, question, summarize=None):
+        """Gemini (contents, config) for ``question`` in this conversation.
+
+        Folds the oldest turns into the summary first if the prompt would go
+        over budget; ``summarize(summary, turns)`` returns the new summary.
+        Updates ``state`` in place.
+        """
+        question_tokens = estimate_tokens(question)
+        window = sum(t[2] for t in state["t"])
+        if state["t"] and state["st"] + window + question_tokens > self.budget:
+            room = max(0, self.budget - self.summary_tokens - question_tokens) // 2
+            folded = []
+            while state["t"] and window > room:
+                turn = state["t"].pop(0)
+                window -= turn[2]
+                folded.append(turn)
+            self._fold(state, folded, summarize)
+
+        if not state["t"] and not state["s"]:
+            return question, None  # first turn: same prompt as a one-off doubt
+        contents = []
+        for q, a, _ in state["t"]:
+            contents.append({"role": "user", "parts": [{"text": q}]})
+            contents.append({"role": "model", "parts": [{"text": a}]})
+        contents.append({"role": "user", "parts": [{"text": question}]})
+        config = {"system_instruction": INSTRUCTION + state["s"]} if state["s"] else None
+        return contents, config
+
+    def _fold(self, state, turns, summarize):
+        summary = None
+        if summarize is not None:
+            try:
+                summary = (summarize(state["s"], turns) or "").strip() or None
+                self.stats["summaries"] += 1
+            except Exception as e:
+                print(f"⚠️  Conversation summary failed, keeping an extract: {e}")
+                self.stats["summary_failures"] += 1
+        if summary is None:
+            summary = _extract(state["s"], turns, self.summary_tokens)
+        summary = summary[:self.summary_tokens * CHARS_PER_TOKEN]
+        state["s"], state["st"] = summary, estimate_tokens(summary)
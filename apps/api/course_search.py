@@ -0,0 +1,349 @@
+"""
+course_search.py — In-memory full-text search over courses and syllabi
+
+Each API process keeps an inverted index of the course catalog:
+
+* Text from title, code, syllabus_topics, description, teacher_name and
+  department is tokenized. Each field has a weight, and documents are ranked
+  with BM25 over the weighted term frequencies.
+* The last query word also matches as a prefix (search-as-you-type).
+* A word with no exact match in the vocabulary falls back to words within
+  one edit (two for words of 8+ characters), found through a
+  deletion-neighbourhood index rather than a vocabulary scan. Prefix and
+  typo matches score lower than exact ones.
+* Every word must match. If no course matches them all, the best partial
+  matches are returned instead.
+* Facets count department and semester over the matches. Each facet's
+  counts ignore that facet's own filter, so the UI can offer the
+  alternatives.
+
+A snapshot listener on ``courses`` builds the index at startup and then
+applies every change. Write handlers also call ``put``/``patch``/``remove``,
+so a course is searchable in this worker as soon as its write returns.
+
+Configuration (environment):
+    COURSE_SEARCH   1 to build the index at startup (default), 0 to build it
+                    from the cached course list on demand
+"""
+
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+
+ENABLED = os.getenv("COURSE_SEARCH", "1") == "1"
+
+# Field → weight in the term frequency BM25 sees.
+FIELDS = {
+    "title": 3.0,
+    "code": 3.0,
+    "syllabus_topics": 1.5,
+    "department": 1.0,
+    "teacher_name": 1.0,
+    "description": 1.0,
+}
+
+# Returned with each hit (timestamps and counters that change often are left out).
+DISPLAY_FIELDS = ("title", "code", "description", "department", "semester", "teacher_id",
+                  "teacher_name", "syllabus_topics", "syllabus_uploaded")
+
+FACETS = ("department", "semester")
+
+K1 = 1.2
+B = 0.75
+PREFIX_WEIGHT = 0.8
+TYPO_WEIGHT = {1: 0.6, 2: 0.4}
+MAX_EXPANSIONS = 50
+
+STOPWORDS = frozenset("a an and are as at be by for from in into is of on or the to with".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+def _max_typos(term):
+    return 0 if len(term) < 4 else 1 if len(term) < 8 else 2
+
+
+def _deletes(term, depth):
+    """``term`` and every string made by deleting up to ``depth`` characters."""
+    out = {term}
+    frontier = {term}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def edit_distance(a, b, limit):
+    """Optimal-string-alignment distance, or ``limit + 1`` once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class CourseIndex:
+    def __init__(self, db=None):
+        self.db = db
+        self._docs = {}       # course id → display projection
+        self._terms = {}      # course id → {term: weighted tf}
+        self._lengths = {}    # course id → weighted length
+        self._postings = {}   # term → {course id: weighted tf}
+        self._vocab = []      # sorted terms, for prefix ranges
+        self._neighbours = {}  # deletion variant → set of terms
+        self._facets = {f: {} for f in FACETS}  # facet → value → set of course ids
+        self._total_length = 0.0
+        # Derived from the above, dropped on every change
+        self._term_scores = {}  # term → {course id: BM25}
+        self._by_title = None
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._watch = None
+
+    @classmethod
+    def from_courses(cls, courses):
+        """An index over a list of course dicts (each with an ``id``)."""
+        index = cls()
+        for course in courses:
+            index.put(course["id"], course)
+        index._ready.set()
+        return index
+
+    # ── Listener ──────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Open the courses listener; returns once the initial snapshot is in."""
+        if self._watch is None:
+            self._watch = self.db.collection("courses").on_snapshot(self._on_snapshot)
+            self._ready.wait(30)
+
+    def ready(self):
+        return self._ready.is_set()
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self._ready.clear()
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self.remove(change.document.id)
+                else:
+                    self.put(change.document.id, change.document.to_dict())
+        self._ready.set()
+
+    # ── Updates ───────────────────────────────────────────────────────────────
+
+    def _add_term(self, term):
+        bisect.insort(self._vocab, term)
+        for variant in _deletes(term, _max_typos(term)):
+            self._neighbours.setdefault(variant, set()).add(term)
+
+    def _drop_term(self, term):
+        del self._postings[term]
+        i = bisect.bisect_left(self._vocab, term)
+        if i < len(self._vocab) and self._vocab[i] == term:
+            del self._vocab[i]
+        for variant in _deletes(term, _max_typos(term)):
+            terms = self._neighbours.get(variant)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._neighbours[variant]
+
+    def put(self, course_id, data):
+        """Index (or re-index) one course."""
+        doc = {k: data[k] for k in DISPLAY_FIELDS if k in data}
+        doc["id"] = course_id
+        terms = {}
+        for field, weight in FIELDS.items():
+            value = data.get(field)
+            if value is None:
+                continue
+            for text in value if isinstance(value, (list, tuple)) else (value,):
+                for term in tokenize(text):
+                    terms[term] = terms.get(term, 0.0) + weight
+        with self._lock:
+            self.remove(course_id)
+            self._docs[course_id] = doc
+            self._terms[course_id] = terms
+            length = sum(terms.values())
+            self._lengths[course_id] = length
+            self._total_length += length
+            for term, tf in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._add_term(term)
+                postings[course_id] = tf
+            for facet in FACETS:
+                if doc.get(facet) not in (None, ""):
+                    self._facets[facet].setdefault(str(doc[facet]), set()).add(course_id)
+            self._changed()
+
+    def patch(self, course_id, changes):
+        """Merge ``changes`` into an indexed course (no-op if it isn't indexed)."""
+        with self._lock:
+            doc = self._docs.get(course_id)
+            if doc is not None:
+                self.put(course_id, {**doc, **changes})
+
+    def remove(self, course_id):
+        with self._lock:
+            terms = self._terms.pop(course_id, None)
+            if terms is None:
+                return
+            doc = self._docs.pop(course_id)
+            self._total_length -= self._lengths.pop(course_id)
+            for term in terms:
+                postings = self._postings[term]
+                postings.pop(course_id, None)
+                if not postings:
+                    self._drop_term(term)
+            for facet in FACETS:
+                ids = self._facets[facet].get(str(doc.get(facet)))
+                if ids is not None:
+                    ids.discard(course_id)
+                    if not ids:
+                        del self._facets[facet][str(doc.get(facet))]
+            self._changed()
+
+    def _changed(self):
+        # Any change moves N and the average length, so every cached score goes.
+        self._term_scores = {}
+        self._by_title = None
+
+    # ── Query ─────────────────────────────────────────────────────────────────
+
+    def _expand(self, word, prefix):
+        """{term: weight} for the vocabulary terms ``word`` matches."""
+        out = {}
+        if word in self._postings:
+            out[word] = 1.0
+        if prefix and len(word) >= 2:
+            start = bisect.bisect_left(self._vocab, word)
+            for term in self._vocab[start:start + MAX_EXPANSIONS]:
+                if not term.startswith(word):
+                    break
+                out.setdefault(term, PREFIX_WEIGHT)
+        if not out:
+            limit = _max_typos(word)
+            if limit:
+                candidates = set()
+                for variant in _deletes(word, limit):
+                    candidates |= self._neighbours.get(variant, set())
+                for term in candidates:
+                    distance = edit_distance(word, term, limit)
+                    if distance <= limit:
+                        out[term] = max(out.get(term, 0.0), TYPO_WEIGHT[distance])
+        return out
+
+    def _bm25(self, term):
+        """course id → BM25 score of one term (cached until the index changes)."""
+        scores = self._term_scores.get(term)
+        if scores is None:
+            n = len(self._docs)
+            avg_length = (self._total_length / n) or 1.0
+            postings = self._postings[term]
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            lengths = self._lengths
+            scores = self._term_scores[term] = {
+                cid: idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * lengths[cid] / avg_length))
+                for cid, tf in postings.items()}
+        return scores
+
+    def _score_word(self, expansions):
+        """course id → best score of any expansion of one query word."""
+        if len(expansions) == 1:
+            term, weight = next(iter(expansions.items()))
+            scores = self._bm25(term)
+            return scores if weight == 1.0 else {cid: weight * v for cid, v in scores.items()}
+        best = {}
+        for term, weight in expansions.items():
+            for cid, score in self._bm25(term).items():
+                score *= weight
+                if score > best.get(cid, 0.0):
+                    best[cid] = score
+        return best
+
+    def _titles(self):
+        if self._by_title is None:
+            self._by_title = sorted(self._docs, key=lambda cid: str(self._docs[cid].get("title", "")))
+        return self._by_title
+
+    def search(self, query="", department=None, semester=None, limit=20, offset=0):
+        """Ranked hits, total, and facet counts for ``query`` and the facet filters."""
+        words = tokenize(query)
+        filters = {f: str(v) for f, v in (("department", department), ("semester", semester))
+                   if v not in (None, "")}
+        with self._lock:
+            expansions = [self._expand(w, i == len(words) - 1) for i, w in enumerate(words)]
+            if words:
+                per_word = [self._score_word(e) for e in expansions]
+                matched = set(per_word[0]).intersection(*per_word[1:])
+                if not matched:  # nothing matches every word: best partial matches
+                    matched = set().union(*per_word)
+                if len(per_word) == 1:
+                    scores = per_word[0]
+                else:
+                    scores = {cid: sum(s.get(cid, 0.0) for s in per_word) for cid in matched}
+            else:
+                matched = set(self._docs)
+                scores = None
+
+            def narrowed(ids, skip=None):
+                for facet, value in filters.items():
+                    if facet != skip:
+                        ids = ids & self._facets[facet].get(value, set())
+                return ids
+
+            facets = {}
+            for facet in FACETS:
+                base = narrowed(matched, skip=facet)
+                counts = {value: len(base & ids) for value, ids in self._facets[facet].items()}
+                facets[facet] = dict(sorted(((v, c) for v, c in counts.items() if c),
+                                            key=lambda kv: (-kv[1], kv[0])))
+
+            hits = narrowed(matched)
+            want = offset + limit
+            if scores is None:
+                page = [cid for cid in self._titles() if cid in hits][:want] if filters \
+                    else self._titles()[:want]
+            else:
+                page = heapq.nsmallest(want, hits, key=lambda cid: (-scores[cid],
+                                                                     str(self._docs[cid].get("title", ""))))
+            query_terms = set().union(*expansions)
+            results = []
+            for cid in page[offset:]:
+                hit = dict(self._docs[cid])
+                if scores is not None:
+                    hit["score"] = round(scores[cid], 4)
+                if query_terms:
+                    hit["matched_topics"] = [t for t in hit.get("syllabus_topics", ())
+                                             if query_terms.intersection(tokenize(t))]
+                results.append(hit)
+        return {"total": len(hits), "results": results, "facets": facets}
+
+    def stats(self):
+        with self._lock:
+            return {"ready": self.ready(), "courses": len(self._docs), "terms": len(self._postings)}
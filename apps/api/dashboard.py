@@ -0,0 +1,179 @@
+"""
+dashboard.py — Concurrent fan-out for the student dashboard bootstrap
+
+``Dashboard`` runs a set of named section loaders (profile, courses,
+notifications, ...) in parallel on a shared thread pool and merges their
+results into one payload, so a dashboard load costs about as much as its
+slowest read rather than the sum of all of them.
+
+* Each section has its own cache TTL. Fresh cached sections are served
+  without touching Firestore.
+* Sections still loading after the deadline are reported as ``timeout``
+  (or served ``stale`` from an expired cache entry). The load keeps running
+  in the background and fills the cache for the next request.
+* Concurrent requests for the same section and key share one in-flight load.
+
+Loaders signal failure by raising, or by returning the repo's error shape
+(``{"status": "error", ...}`` / ``{"error": ...}``) or an error Response (a 503
+from an open circuit breaker); failures are never cached. Loaders run in a
+copy of the caller's context, so the request's deadline budget applies.
+
+Configuration (environment):
+    DASHBOARD_TIMEOUT_S   deadline for the whole fan-out (default 1.5)
+    DASHBOARD_WORKERS     loader threads per process (default 32)
+    DASHBOARD_TTL_<NAME>  cache TTL in seconds for section <NAME>, e.g.
+                          DASHBOARD_TTL_COURSES=120 (defaults set per section)
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import orjson
+
+TIMEOUT_S = float(os.getenv("DASHBOARD_TIMEOUT_S", "1.5"))
+WORKERS = int(os.getenv("DASHBOARD_WORKERS", "32"))
+
+MAX_ENTRIES = 50_000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="dashboard")
+        return _pool
+
+
+def ttl(name, default):
+    """Cache TTL for a section, overridable with ``DASHBOARD_TTL_<NAME>``."""
+    return float(os.getenv(f"DASHBOARD_TTL_{name.upper()}", default))
+
+
+def _is_error(payload):
+    if getattr(payload, "status_code", 200) >= 400:  # e.g. resilience.unavailable()
+        return True
+    return isinstance(payload, dict) and (payload.get("status") == "error" or "error" in payload)
+
+
+def _error_message(payload):
+    if isinstance(payload, dict):
+        return payload.get("message", payload.get("error"))
+    try:
+        return orjson.loads(payload.body).get("message")
+    except Exception:
+        return f"HTTP {payload.status_code}"
+
+
+class Section:
+    """A named loader. ``shared`` sections are cached once for every user."""
+
+    def __init__(self, name, load, ttl, shared=False):
+        self.name = name
+        self.load = load
+        self.ttl = ttl
+        self.shared = shared
+
+
+class Dashboard:
+    def __init__(self, sections, timeout=TIMEOUT_S, executor=None, clock=time.monotonic):
+        self.sections = {s.name: s for s in sections}
+        self.timeout = timeout
+        self._executor = executor
+        self._clock = clock
+        self._cache = {}     # (section, key) → (loaded_at, payload)
+        self._inflight = {}  # (section, key) → Future
+        self._lock = threading.Lock()
+
+    def _key(self, section, uid):
+        return (section.name, None if section.shared else uid)
+
+    def _run(self, section, key, uid):
+        loaded = False
+        try:
+            payload = section.load(uid)
+            loaded = not _is_error(payload)
+            return payload
+        finally:
+            # Cache before clearing the in-flight entry so no request sees neither.
+            with self._lock:
+                if loaded:
+                    self._cache[key] = (self._clock(), payload)
+                    if len(self._cache) > MAX_ENTRIES:
+                        self._evict()
+                self._inflight.pop(key, None)
+
+    def _evict(self):
+        # Drop expired entries; if that's not enough, drop the oldest half.
+        now = self._clock()
+        for key, (loaded_at, _) in list(self._cache.items()):
+            if now - loaded_at >= self.sections[key[0]].ttl:
+                del self._cache[key]
+        if len(self._cache) > MAX_ENTRIES:
+            oldest = sorted(self._cache, key=lambda k: self._cache[k][0])
+            for key in oldest[:len(oldest) // 2]:
+                del self._cache[key]
+
+    def load(self, uid, only=None):
+        """Merged payload for ``uid``: one key per section plus ``sections`` meta."""
+        started = self._clock()
+        executor = self._executor or _executor()
+        names = [n for n in self.sections if only is None or n in only]
+        meta, result, pending = {}, {}, {}
+
+        with self._lock:
+            for name in names:
+                section = self.sections[name]
+                key = self._key(section, uid)
+                cached = self._cache.get(key)
+                if cached is not None and started - cached[0] < section.ttl:
+                    result[name] = cached[1]
+                    meta[name] = {"status": "ok", "cached": True, "age_s": round(started - cached[0], 3)}
+                    continue
+                future = self._inflight.get(key)
+                if future is None:
+                    future = self._inflight[key] = executor.submit(
+                        contextvars.copy_context().run, self._run, section, key, uid)
+                pending[name] = (key, future)
+
+        wait([f for _, f in pending.values()], timeout=self.timeout)
+
+        for name, (key, future) in pending.items():
+            if future.done():
+                error = future.exception()
+                payload = None if error else future.result()
+                if error is None and not _is_error(payload):
+                    result[name] = payload
+                    meta[name] = {"status": "ok", "cached": False}
+                    continue
+                meta[name] = {"status": "error", "message": str(error) if error else _error_message(payload)}
+            else:
+                meta[name] = {"status": "timeout"}
+            with self._lock:
+                stale = self._cache.get(key)
+            if stale is not None:
+                result[name] = stale[1]
+                meta[name].update(stale=True, age_s=round(self._clock() - stale[0], 3))
+            else:
+                result[name] = None
+
+        complete = all(m["status"] == "ok" for m in meta.values())
+        return {
+            "status": "success" if complete else "partial",
+            **result,
+            "sections": meta,
+            "elapsed_ms": round((self._clock() - started) * 1000, 1),
+        }
+
+    def invalidate(self, section, uid=None):
+        with self._lock:
+            self._cache.pop(self._key(self.sections[section], uid), None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,281 @@
+"""
+doubt_drafter.py — Draft AI answers for open course doubts in bulk
+
+Run:
+    python doubt_drafter.py                                   # every open doubt without a draft
+    python doubt_drafter.py --group-size 10 --concurrency 8 --limit 5000
+    python doubt_drafter.py --emulator
+
+Open doubts are read page by page in document-id order. Each page is split
+into groups of questions from the same course, and each group is answered by
+one Gemini call that returns a JSON list of answers, with at most
+--concurrency calls in flight. Drafts are written to the doubt as
+``ai_answer`` with ``ai_answer_status: "draft"``; faculty approve or replace
+them through ``PUT /doubts/{id}/resolve``.
+
+The last page whose groups have all finished is checkpointed to --checkpoint,
+so re-running the same command resumes where it stopped. Questions whose
+group failed are left without a draft and picked up by the next run.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from dotenv import load_dotenv
+from firebase_admin import firestore
+
+import gemini
+
+load_dotenv()
+
+PROMPT = """You are Manan, an academic assistant for the course "{course}".
+Answer each student question below clearly and correctly in 3-6 sentences, at
+the level of an undergraduate student. Faculty will review your answers before
+students see them.
+
+Reply with only a JSON array containing one object per question, in the same
+order: [{{"id": "<question id>", "answer": "<your answer>"}}]
+
+Questions:
+{questions}"""
+
+
+class DraftReport:
+    """Throughput, token and cost counters, carried across resumed runs."""
+
+    FIELDS = ("pages", "seen", "drafted", "failed", "calls", "prompt_tokens", "output_tokens", "seconds")
+
+    def __init__(self, model, state=None):
+        self.model = model
+        self._lock = threading.Lock()
+        for field in self.FIELDS:
+            setattr(self, field, (state or {}).get(field, 0))
+
+    def add(self, **counts):
+        with self._lock:
+            for field, n in counts.items():
+                setattr(self, field, getattr(self, field) + n)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @property
+    def cost(self):
+        return gemini.estimate_cost(self.model, self.prompt_tokens, self.output_tokens)
+
+    def print_summary(self):
+        rate = self.drafted / self.seconds if self.seconds else 0.0
+        per_call = self.drafted / self.calls if self.calls else 0.0
+        print(f"\n  Drafted {self.drafted:,} of {self.seen:,} open doubts "
+              f"({self.failed:,} failed) in {self.seconds:.1f}s → {rate:,.1f} doubts/s")
+        print(f"  Gemini: {self.calls:,} calls ({per_call:.1f} questions/call), "
+              f"{self.prompt_tokens:,} prompt + {self.output_tokens:,} output tokens, "
+              f"est. ${self.cost:.4f} ({self.model})")
+
+
+class DoubtDrafter:
+    """Reads open doubts, drafts answers in grouped Gemini calls, writes them back."""
+
+    def __init__(self, db, model=gemini.DEFAULT_MODEL, group_size=8, concurrency=4, page_size=None,
+                 limit=None, redraft=False, retries=2, checkpoint_path=None):
+        self.db = db
+        self.model = model
+        self.group_size = group_size
+        self.concurrency = concurrency
+        self.page_size = page_size or group_size * concurrency * 4
+        self.limit = limit
+        self.redraft = redraft
+        self.retries = retries
+        self.checkpoint_path = checkpoint_path
+        self._courses = {}
+        self._state = self._load_checkpoint()
+        self.report = DraftReport(model, self._state.get("report"))
+
+    # Checkpointing
+    def _run_key(self):
+        return json.dumps({"model": self.model, "redraft": self.redraft}, sort_keys=True)
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {"run_key": self._run_key(), "cursor": None}
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        if state.get("run_key") != self._run_key():
+            print(f"  [WARN] Checkpoint {self.checkpoint_path} is for different options; starting over.")
+            return {"run_key": self._run_key(), "cursor": None}
+        print(f"  [RESUME] continuing after doubt {state['cursor']}")
+        return state
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        self._state["report"] = self.report.to_dict()
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    # Reading
+    def _pages(self):
+        cursor = self._state["cursor"]
+        while True:
+            query = (self.db.collection("doubts")
+                     .where("status", "==", "open")
+                     .order_by("__name__")
+                     .select(["course_id", "question", "ai_answer"])
+                     .limit(self.page_size))
+            if cursor:
+                query = query.start_after({"__name__": cursor})
+            docs = list(query.stream())
+            if not docs:
+                return
+            cursor = docs[-1].id
+            yield cursor, docs
+
+    def _course_titles(self, course_ids):
+        missing = [cid for cid in course_ids if cid not in self._courses]
+        if missing:
+            refs = [self.db.collection("courses").document(cid) for cid in missing]
+            for snap in self.db.get_all(refs, field_paths=["title"]):
+                self._courses[snap.id] = (snap.to_dict() or {}).get("title", snap.id) if snap.exists else snap.id
+        return {cid: self._courses.get(cid, cid) for cid in course_ids}
+
+    def _groups(self, docs):
+        """Split a page into same-course groups of at most ``group_size`` questions."""
+        by_course = {}
+        for doc in docs:
+            d = doc.to_dict()
+            if not d.get("question") or (d.get("ai_answer") and not self.redraft):
+                continue
+            by_course.setdefault(d.get("course_id"), []).append((doc.id, d["question"]))
+        titles = self._course_titles([cid for cid in by_course if cid])
+        for course_id, questions in by_course.items():
+            for i in range(0, len(questions), self.group_size):
+                yield titles.get(course_id, "General"), questions[i:i + self.group_size]
+
+    # Drafting
+    def _ask(self, course, questions):
+        prompt = PROMPT.format(course=course, questions=json.dumps(
+            [{"id": qid, "question": q} for qid, q in questions], ensure_ascii=False))
+        config = {"response_mime_type": "application/json"}
+        for attempt in range(self.retries + 1):
+            try:
+                response = gemini.generate_content(prompt, model=self.model, config=config)
+                usage = getattr(response, "usage_metadata", None)
+                self.report.add(calls=1,
+                                prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+                                output_tokens=getattr(usage, "candidates_token_count", 0) or 0)
+                answers = json.loads(response.text)
+                return {a["id"]: a["answer"].strip() for a in answers
+                        if isinstance(a, dict) and isinstance(a.get("answer"), str) and a["answer"].strip()}
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"  [WARN] group of {len(questions)} in {course} failed: {e}")
+                    return {}
+                time.sleep(2 ** attempt)
+
+    def _draft_group(self, course, questions):
+        answers = self._ask(course, questions)
+        if answers:
+            batch = self.db.batch()
+            for qid, _ in questions:
+                if qid in answers:
+                    batch.update(self.db.collection("doubts").document(qid), {
+                        "ai_answer": answers[qid],
+                        "ai_answer_status": "draft",
+                        "ai_model": self.model,
+                        "ai_drafted_at": firestore.SERVER_TIMESTAMP,
+                    })
+            batch.commit()
+        drafted = sum(1 for qid, _ in questions if qid in answers)
+        self.report.add(drafted=drafted, failed=len(questions) - drafted)
+
+    def run(self):
+        t0 = time.perf_counter()
+        seconds_before = self.report.seconds
+        pending = {}      # future → page index
+        remaining = {}    # page index → groups not yet finished
+        cursors = {}      # page index → last doubt id on the page
+        next_page = 0
+        queued = 0
+
+        def drain(block):
+            nonlocal next_page
+            done, _ = wait(pending, return_when=FIRST_COMPLETED) if block else (
+                [f for f in pending if f.done()], None)
+            for fut in done:
+                page = pending.pop(fut)
+                fut.result()
+                remaining[page] -= 1
+            advanced = False
+            while next_page in remaining and remaining[next_page] == 0:
+                self._state["cursor"] = cursors.pop(next_page)
+                del remaining[next_page]
+                next_page += 1
+                advanced = True
+            if advanced:
+                self.report.seconds = seconds_before + time.perf_counter() - t0
+                self._save_checkpoint()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for page, (cursor, docs) in enumerate(self._pages()):
+                # The extra 1 keeps the page open until all its groups are queued.
+                cursors[page], remaining[page] = cursor, 1
+                self.report.add(pages=1, seen=len(docs))
+                for course, questions in self._groups(docs):
+                    while len(pending) >= self.concurrency * 2:
+                        drain(block=True)
+                    remaining[page] += 1
+                    pending[pool.submit(self._draft_group, course, questions)] = page
+                    queued += len(questions)
+                remaining[page] -= 1
+                drain(block=False)
+                if self.limit and queued >= self.limit:
+                    break
+            while pending:
+                drain(block=True)
+            drain(block=False)
+        self.report.seconds = seconds_before + time.perf_counter() - t0
+        self._save_checkpoint()
+        return self.report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Draft AI answers for open course doubts")
+    parser.add_argument("--model", default=gemini.DEFAULT_MODEL)
+    parser.add_argument("--group-size", type=int, default=8, help="questions per Gemini call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Gemini calls in flight")
+    parser.add_argument("--page-size", type=int, help="doubts read per Firestore page")
+    parser.add_argument("--limit", type=int, help="stop after queuing about this many questions")
+    parser.add_argument("--redraft", action="store_true", help="replace existing drafts too")
+    parser.add_argument("--checkpoint", default=".draft_checkpoint.json")
+    parser.add_argument("--emulator", action="store_true", help="use FIRESTORE_EMULATOR_HOST")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from seed_db import init_db
+
+    args = parse_args(argv)
+    if not gemini.get_api_key():
+        print("Error: GOOGLE_API_KEY not found. Please set it in .env")
+        return 1
+
+    drafter = DoubtDrafter(init_db(emulator=args.emulator), model=args.model, group_size=args.group_size,
+                           concurrency=args.concurrency, page_size=args.page_size, limit=args.limit,
+                           redraft=args.redraft, checkpoint_path=args.checkpoint)
+    print("\n--- Drafting answers for open doubts ---")
+    report = drafter.run()
+    report.print_summary()
+    if not args.limit and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
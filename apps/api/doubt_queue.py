@@ -0,0 +1,207 @@
+"""
+doubt_queue.py — Live in-memory index of open doubts per teacher
+
+Faculty reload ``/admin/doubts`` constantly during office hours. Instead of
+querying Firestore on every load, each API process keeps:
+
+* every open doubt (the ``ADMIN_DOUBT_FIELDS`` projection), fed by a snapshot
+  listener on ``doubts where status == "open"``;
+* course → (title, teacher) from a listener on ``courses``;
+* per teacher, a heap ordered by priority (``priority`` field, higher first)
+  then age (oldest first), for the "next doubt" action in O(log n);
+* per teacher, the newest-first listing ``/admin/doubts`` renders, rebuilt
+  only after that teacher's doubts change.
+
+Both listeners are opened once at startup. Their initial snapshots build the
+index, and after that it follows every change. ``remove()`` drops a doubt as
+soon as this process resolves it, without waiting for the listener. Heap
+entries are invalidated lazily and compacted once stale entries outnumber
+live ones.
+
+Configuration (environment):
+    DOUBT_INDEX   1 to build the index at startup (default), 0 to always query
+"""
+
+import heapq
+import os
+import threading
+from datetime import datetime
+
+ENABLED = os.getenv("DOUBT_INDEX", "1") == "1"
+
+
+def _ms(value):
+    if isinstance(value, str):  # the query fallback renders created_at as ISO 8601
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return 0
+    return int(value.timestamp() * 1000) if hasattr(value, "timestamp") else 0
+
+
+def priority_key(doubt):
+    """Sort key for "answer next" order: higher ``priority`` first, then oldest.
+
+    Works on index entries and on rendered doubts (ISO ``created_at``).
+    """
+    return (-int(doubt.get("priority") or 0), _ms(doubt.get("created_at")))
+
+
+class DoubtIndex:
+    def __init__(self, db, fields):
+        self.db = db
+        self.fields = list(fields)
+        self._doubts = {}      # doubt id → projected data
+        self._courses = {}     # course id → {"title", "teacher_id"}
+        self._by_teacher = {}  # teacher id → set of doubt ids
+        self._heaps = {}       # teacher id → [(-priority, created ms, doubt id)]
+        self._listings = {}    # teacher id → rendered newest-first list
+        self._resolved = set()  # removed here; ignore "open" events until the listener agrees
+        self._lock = threading.RLock()
+        self._courses_ready = threading.Event()
+        self._doubts_ready = threading.Event()
+        self._watches = []
+
+    # ── Listeners ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Open both listeners; returns once their initial snapshots are in."""
+        if self._watches:
+            return
+        # Courses first, so doubts from the initial snapshot find their teacher.
+        self._watches.append(self.db.collection("courses").on_snapshot(self._on_courses))
+        self._courses_ready.wait(30)
+        query = self.db.collection("doubts").where("status", "==", "open")
+        self._watches.append(query.on_snapshot(self._on_doubts))
+        self._doubts_ready.wait(30)
+
+    def ready(self):
+        return self._courses_ready.is_set() and self._doubts_ready.is_set()
+
+    def close(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+        self._courses_ready.clear()
+        self._doubts_ready.clear()
+
+    def _on_courses(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                course_id = change.document.id
+                old = self._courses.pop(course_id, None)
+                if change.type.name != "REMOVED":
+                    d = change.document.to_dict()
+                    self._courses[course_id] = {"title": d.get("title", "Unknown"),
+                                                "teacher_id": d.get("teacher_id")}
+                new = self._courses.get(course_id)
+                if old is None and new is None:
+                    continue
+                if old is not None and new is not None and old["teacher_id"] == new["teacher_id"]:
+                    self._listings.pop(new["teacher_id"], None)  # title may have changed
+                    continue
+                # Ownership changed (rare): re-home this course's doubts.
+                for doubt_id, doubt in self._doubts.items():
+                    if doubt.get("course_id") == course_id:
+                        self._unlink(doubt_id, old["teacher_id"] if old else None)
+                        self._link(doubt_id, doubt)
+        self._courses_ready.set()
+
+    def _on_doubts(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doubt_id = change.document.id
+                d = change.document.to_dict() if change.type.name != "REMOVED" else None
+                if d is None or d.get("status", "open") != "open":
+                    self._resolved.discard(doubt_id)
+                    self._drop(doubt_id)
+                elif doubt_id not in self._resolved:
+                    self._add(doubt_id, {k: d[k] for k in self.fields + ["priority"] if k in d})
+        self._doubts_ready.set()
+
+    # ── Mutations ─────────────────────────────────────────────────────────────
+
+    def _teacher_of(self, doubt):
+        course = self._courses.get(doubt.get("course_id"))
+        return course["teacher_id"] if course else None
+
+    def _link(self, doubt_id, doubt):
+        teacher_id = self._teacher_of(doubt)
+        if teacher_id is None:
+            return
+        ids = self._by_teacher.setdefault(teacher_id, set())
+        ids.add(doubt_id)
+        heap = self._heaps.setdefault(teacher_id, [])
+        heapq.heappush(heap, priority_key(doubt) + (doubt_id,))
+        if len(heap) > 2 * len(ids) + 64:
+            # Mostly stale entries: rebuild from the live set.
+            heap[:] = [priority_key(self._doubts[i]) + (i,) for i in ids]
+            heapq.heapify(heap)
+        self._listings.pop(teacher_id, None)
+
+    def _unlink(self, doubt_id, teacher_id):
+        ids = self._by_teacher.get(teacher_id)
+        if ids is not None:
+            ids.discard(doubt_id)
+            self._listings.pop(teacher_id, None)
+
+    def _add(self, doubt_id, doubt):
+        with self._lock:
+            old = self._doubts.get(doubt_id)
+            if old is not None:
+                self._unlink(doubt_id, self._teacher_of(old))
+            self._doubts[doubt_id] = doubt
+            self._link(doubt_id, doubt)
+
+    def _drop(self, doubt_id):
+        # The heap entry goes lazily.
+        doubt = self._doubts.pop(doubt_id, None)
+        if doubt is not None:
+            self._unlink(doubt_id, self._teacher_of(doubt))
+
+    def remove(self, doubt_id):
+        """Drop a doubt this process just resolved, ahead of the listener."""
+        with self._lock:
+            if doubt_id in self._doubts:
+                self._resolved.add(doubt_id)
+            self._drop(doubt_id)
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def _render(self, doubt_id, doubt):
+        d = dict(doubt)  # the projected fields plus priority, as the query fallback returns
+        d["id"] = doubt_id
+        course = self._courses.get(doubt.get("course_id"))
+        d["course_title"] = course["title"] if course else "Unknown"
+        if d.get("created_at"):
+            d["created_at"] = d["created_at"].isoformat()
+        return d
+
+    def open_doubts(self, teacher_id):
+        """Open doubts for a teacher's courses, newest first (cached until they change)."""
+        with self._lock:
+            listing = self._listings.get(teacher_id)
+            if listing is None:
+                ids = self._by_teacher.get(teacher_id, ())
+                listing = [self._render(i, self._doubts[i]) for i in ids]
+                listing.sort(key=lambda x: x.get("created_at") or "", reverse=True)
+                self._listings[teacher_id] = listing
+            return listing
+
+    def next(self, teacher_id):
+        """Highest-priority, oldest open doubt for a teacher, or None."""
+        with self._lock:
+            heap = self._heaps.get(teacher_id)
+            ids = self._by_teacher.get(teacher_id, set())
+            while heap:
+                entry = heap[0]
+                doubt = self._doubts.get(entry[-1])
+                if doubt is not None and entry[-1] in ids and priority_key(doubt) == entry[:-1]:
+                    return self._render(entry[-1], doubt)
+                heapq.heappop(heap)
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {"ready": self.ready(), "open": len(self._doubts), "courses": len(self._courses),
+                    "teachers": len(self._by_teacher)}
@@ -0,0 +1,134 @@
+"""
+enrollment.py — Bulk course enrollment
+
+``bulk_enroll`` puts a whole section into a course in one call. Rows come from
+a list of student IDs or a CSV; the result has one status per row:
+
+    enrolled          both mirrors written
+    already_enrolled  nothing to do (a re-run is safe)
+    not_found         no users/{uid} document
+    not_a_student     the user's role isn't "student"
+    duplicate         the ID appeared on an earlier row
+    invalid           empty row
+    failed            its batch failed to commit (re-run to retry)
+
+Users and existing enrollments are checked with ``get_all`` in parallel
+chunks. Then ``courses/{id}/students/{uid}`` and
+``users/{uid}/enrolled_courses/{id}`` are written together, 250 students
+(500 writes) per batch, with batches committed in parallel. Each batch is
+atomic, so a student is never left half-enrolled. ``student_count`` is
+incremented once, by the number actually enrolled.
+
+Configuration (environment):
+    BULK_ENROLL_WORKERS  batches read / committed at once (default 8)
+    BULK_ENROLL_MAX      most rows per request (default 5000)
+"""
+
+import csv
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_config import firestore
+
+WORKERS = int(os.getenv("BULK_ENROLL_WORKERS", "8"))
+MAX_ROWS = int(os.getenv("BULK_ENROLL_MAX", "5000"))
+
+# Two writes per student; Firestore caps a batch at 500 writes
+BATCH_STUDENTS = 250
+READ_CHUNK = 300
+
+ID_COLUMNS = ("student_id", "uid", "id")
+
+
+def parse_csv(text):
+    """Student IDs from CSV text: the student_id/uid/id column, else the first one."""
+    rows = [row for row in csv.reader(io.StringIO(text.lstrip("\ufeff"))) if any(c.strip() for c in row)]
+    if not rows:
+        return []
+    header = [c.strip().lower() for c in rows[0]]
+    column = next((header.index(name) for name in ID_COLUMNS if name in header), None)
+    if column is None:
+        return [row[0].strip() for row in rows]
+    return [row[column].strip() if column < len(row) else "" for row in rows[1:]]
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def bulk_enroll(db, course_id, student_ids, workers=WORKERS):
+    """Enroll ``student_ids`` in an existing course; returns (summary, per-row results)."""
+    results = [{"row": i + 1, "student_id": uid, "status": None} for i, uid in enumerate(student_ids)]
+    first_row = {}
+    for result in results:
+        uid = result["student_id"]
+        if not uid or "/" in uid:
+            result["status"] = "invalid"
+        elif uid in first_row:
+            result["status"] = "duplicate"
+        else:
+            first_row[uid] = result
+    uids = list(first_row)
+
+    course_ref = db.collection("courses").document(course_id)
+    users = db.collection("users")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # 1. Who exists, and who is already enrolled
+        def check(chunk):
+            profiles = db.get_all([users.document(uid) for uid in chunk], field_paths=["role"])
+            enrolled = db.get_all([course_ref.collection("students").document(uid) for uid in chunk],
+                                  field_paths=["uid"])
+            roles = {doc.id: (doc.to_dict() or {}).get("role") for doc in profiles if doc.exists}
+            return roles, {doc.id for doc in enrolled if doc.exists}
+
+        to_enroll = []
+        read_chunks = _chunks(uids, READ_CHUNK)
+        for chunk, (roles, enrolled) in zip(read_chunks, pool.map(check, read_chunks)):
+            for uid in chunk:
+                result = first_row[uid]
+                if uid not in roles:
+                    result["status"] = "not_found"
+                elif roles[uid] != "student":
+                    result["status"] = "not_a_student"
+                elif uid in enrolled:
+                    result["status"] = "already_enrolled"
+                else:
+                    to_enroll.append(uid)
+
+        # 2. Both mirrors, one atomic batch per 250 students, committed in parallel
+        def commit(chunk):
+            batch = db.batch()
+            for uid in chunk:
+                batch.set(course_ref.collection("students").document(uid),
+                          {"enrolled_at": firestore.SERVER_TIMESTAMP, "uid": uid})
+                batch.set(users.document(uid).collection("enrolled_courses").document(course_id),
+                          {"enrolled_at": firestore.SERVER_TIMESTAMP, "course_id": course_id})
+            batch.commit()
+
+        chunks = _chunks(to_enroll, BATCH_STUDENTS)
+        futures = [pool.submit(commit, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            try:
+                future.result()
+                status, error = "enrolled", None
+            except Exception as e:
+                print(f"⚠️  Bulk enrollment batch for {course_id} failed ({len(chunk)} students): {e}")
+                status, error = "failed", str(e)
+            for uid in chunk:
+                first_row[uid]["status"] = status
+                if error:
+                    first_row[uid]["error"] = error
+
+    # 3. One counter update for the whole request
+    enrolled = sum(1 for uid in to_enroll if first_row[uid]["status"] == "enrolled")
+    if enrolled:
+        try:
+            course_ref.update({"student_count": firestore.Increment(enrolled)})
+        except Exception as e:  # the enrollments stand; only the counter lags
+            print(f"⚠️  student_count for {course_id} not incremented by {enrolled}: {e}")
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary, results
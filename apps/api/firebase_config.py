@@ -1,29 +1,97 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, auth as firebase_auth
+"""
+firebase_config.py — The one Firebase Admin app / Firestore client per process
+
+Nothing here touches the Firebase SDKs at import time. ``firestore`` and
+``auth`` are lazy module proxies, and ``db`` is a proxy that creates the
+(instrumented) Firestore client on first use. main.py's lifespan calls
+``get_db()`` during startup so the first request does not pay for it.
+"""
+
+import importlib
 import os
+import threading
+import time
+
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv()
 
+SERVICE_ACCOUNT_PATH = os.getenv(
+    "FIREBASE_SERVICE_ACCOUNT_PATH",
+    "nova-scholar-f10d5-firebase-adminsdk-fbsvc-9ac6252f8f.json"
+)
+
+
+class _LazyModule:
+    """Imports ``name`` the first time an attribute is read."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+firestore = _LazyModule("firebase_admin.firestore")
+auth = _LazyModule("firebase_admin.auth")
+
+_db = None
+_db_lock = threading.Lock()
+init_seconds = None
+
+
 # Initialize Firebase Admin
 def initialize_firebase():
+    import firebase_admin
+    from firebase_admin import credentials
+
     if not firebase_admin._apps:
         # Check for service account file
-        service_account_path = os.getenv("FIREBASE_SERVICE_ACCOUNT_PATH", "nova-scholar-f10d5-firebase-adminsdk-fbsvc-9ac6252f8f.json")
-        
-        if os.path.exists(service_account_path):
-            cred = credentials.Certificate(service_account_path)
+        if os.path.exists(SERVICE_ACCOUNT_PATH):
+            cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
             firebase_admin.initialize_app(cred)
-            print(f"Firebase Admin initialized with service account: {service_account_path}")
+            print(f"✅ Firebase Admin initialized with: {SERVICE_ACCOUNT_PATH}")
         else:
-            print(f"WARNING: Service account not found at {service_account_path}")
+            print(f"⚠️  Service account not found: {SERVICE_ACCOUNT_PATH}")
             try:
                 firebase_admin.initialize_app()
             except Exception as e:
                 print(f"Failed to initialize Firebase Admin: {e}")
-                pass
-    
-    return firestore.client()
 
-db = initialize_firebase()
-auth = firebase_auth
+    return metrics.instrument_firestore(firestore.client())
+
+
+def get_db():
+    """The process-wide Firestore client, created on first call."""
+    global _db, init_seconds
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                start = time.perf_counter()
+                _db = initialize_firebase()
+                init_seconds = time.perf_counter() - start
+    return _db
+
+
+def reset():
+    """Forget the client (e.g. in a freshly forked worker)."""
+    global _db, init_seconds
+    with _db_lock:
+        _db = None
+        init_seconds = None
+
+
+class _LazyClient:
+    def __getattr__(self, attr):
+        return getattr(get_db(), attr)
+
+    def __repr__(self):
+        return f"<lazy Firestore client {'(ready)' if _db is not None else '(not initialized)'}>"
+
+
+db = _LazyClient()
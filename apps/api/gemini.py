@@ -0,0 +1,83 @@
+"""
+gemini.py — Shared Gemini access for the Manan API
+
+One ``genai.Client`` per API key per process (the SDK client holds an HTTP
+connection pool, so creating it per request throws the pool away), with every
+call timed and its token usage recorded in metrics.py. Calls carry a timeout
+and go through the Gemini circuit breaker (resilience.py).
+"""
+
+import os
+import threading
+import time
+
+import metrics
+import resilience
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# USD per million (prompt, output) tokens, for cost estimates in reports.
+PRICE_PER_MILLION = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_api_key():
+    return os.getenv("GOOGLE_API_KEY")
+
+
+def get_client(api_key=None):
+    api_key = api_key or get_api_key()
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                from google import genai  # heavy import, deferred to first use
+                client = _clients[api_key] = genai.Client(api_key=api_key)
+    return client
+
+
+def estimate_cost(model, prompt_tokens, output_tokens):
+    """Estimated USD cost of a call, or 0.0 for models without a known price."""
+    prompt_price, output_price = PRICE_PER_MILLION.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + output_tokens * output_price) / 1_000_000
+
+
+def _with_timeout(config, seconds):
+    """``config`` with an HTTP timeout (the SDK takes milliseconds)."""
+    timeout_ms = max(1, int(seconds * 1000))
+    if config is None:
+        return {"http_options": {"timeout": timeout_ms}}
+    if isinstance(config, dict):
+        return {**config, "http_options": {**(config.get("http_options") or {}), "timeout": timeout_ms}}
+    if getattr(config, "http_options", None) is None:
+        from google.genai import types
+        return config.model_copy(update={"http_options": types.HttpOptions(timeout=timeout_ms)})
+    return config  # caller set its own http_options
+
+
+def generate_content(contents, model=DEFAULT_MODEL, config=None, api_key=None, timeout=None):
+    """Call ``models.generate_content`` and record latency, tokens and errors.
+
+    The call is bounded by ``timeout`` (default ``GEMINI_TIMEOUT_S``) and the
+    request's remaining budget, and goes through the Gemini circuit breaker.
+    """
+    client = get_client(api_key)
+    seconds = resilience.call_timeout(timeout or resilience.GEMINI_TIMEOUT_S, "gemini")
+    config = _with_timeout(config, seconds)
+    start = time.perf_counter()
+    try:
+        with resilience.gemini.guard():
+            response = client.models.generate_content(model=model, contents=contents, config=config)
+    except resilience.CircuitOpen:
+        raise
+    except Exception as e:
+        metrics.observe_gemini(model, time.perf_counter() - start, error=e)
+        raise
+    metrics.observe_gemini(model, time.perf_counter() - start, getattr(response, "usage_metadata", None))
+    return response
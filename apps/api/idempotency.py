@@ -0,0 +1,126 @@
+"""
+idempotency.py — ``Idempotency-Key`` support for write routes
+
+A client that retries a write after a timeout sends the same
+``Idempotency-Key`` header. The first successful response is stored (in the
+shared cache tier, so any worker can replay it) for ``IDEMPOTENCY_TTL``
+seconds. Replays get the stored body back with ``Idempotent-Replayed: true``
+and never touch Firestore.
+
+* Keys are scoped per route and per caller: the ID token is verified before
+  anything is looked up, and the verified UID is part of the stored key, so
+  one user's key never replays another user's response. Requests without a
+  valid token skip idempotency and get the route's own auth error.
+* The request body minus ``token`` (ID tokens are refreshed between retries)
+  is fingerprinted, and reusing a key with a different body is rejected
+  with 422.
+* While the first request is still running, a concurrent retry gets 409 and
+  ``Retry-After`` instead of executing twice.
+* Only ``{"status": "success", ...}`` results are stored. Errors, which are
+  often transient here, can be retried with the same key.
+* Without the header, routes behave exactly as before.
+
+Configuration (environment):
+    IDEMPOTENCY_TTL   seconds a stored response is replayable (default 86400)
+"""
+
+import hashlib
+import os
+
+import orjson
+
+import cache
+import responses
+from firebase_config import auth
+
+TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+# A claim outlives any sane request; it is released as soon as the request ends.
+CLAIM_TTL = 120
+
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint(req):
+    payload = req.model_dump(exclude={"token"}) if req is not None else {}
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _caller(req):
+    """The verified UID behind ``req.token``, or None."""
+    token = getattr(req, "token", None)
+    if not token:
+        return None
+    try:
+        return auth.verify_id_token(token)["uid"]
+    except Exception:
+        return None
+
+
+def _error(status_code, message, headers=None):
+    return responses.FastJSONResponse({"status": "error", "message": message},
+                                      status_code=status_code, headers=headers)
+
+
+def _replay(stored, digest):
+    if stored["fingerprint"] != digest:
+        return _error(422, "Idempotency-Key was already used with a different request")
+    return responses.FastJSONResponse(stored["response"], headers={"Idempotent-Replayed": "true"})
+
+
+def _begin(key, route, uid, req):
+    """(stored key, digest, early response or None) for a request."""
+    if len(key) > MAX_KEY_LENGTH:
+        return None, None, _error(400, f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters")
+    stored_key = f"idem:{route}:{uid}:{key}"
+    digest = fingerprint(req)
+    stored = cache.shared.get(stored_key)
+    if stored is not cache.MISS:
+        return stored_key, digest, _replay(stored, digest)
+    if not cache.shared.add(stored_key + ":claim", digest, CLAIM_TTL):
+        stored = cache.shared.get(stored_key)  # finished in the meantime
+        if stored is not cache.MISS:
+            return stored_key, digest, _replay(stored, digest)
+        return stored_key, digest, _error(409, "A request with this Idempotency-Key is still in progress",
+                                          headers={"Retry-After": "1"})
+    return stored_key, digest, None
+
+
+def _finish(stored_key, digest, result):
+    try:
+        if isinstance(result, dict) and result.get("status") == "success":
+            cache.shared.set(stored_key, {"fingerprint": digest, "response": result}, TTL)
+    finally:
+        cache.shared.delete(stored_key + ":claim")
+
+
+def run(key, route, req, handler):
+    """``handler()`` at most once per (route, caller, key); replays return the stored result."""
+    uid = _caller(req) if key else None
+    if uid is None:
+        return handler()
+    stored_key, digest, early = _begin(key, route, uid, req)
+    if early is not None:
+        return early
+    result = None
+    try:
+        result = handler()
+        return result
+    finally:
+        _finish(stored_key, digest, result)
+
+
+async def run_async(key, route, req, handler):
+    """``run`` for async handlers (``handler()`` returns an awaitable)."""
+    uid = _caller(req) if key else None
+    if uid is None:
+        return await handler()
+    stored_key, digest, early = _begin(key, route, uid, req)
+    if early is not None:
+        return early
+    result = None
+    try:
+        result = await handler()
+        return result
+    finally:
+        _finish(stored_key, digest, result)
@@ -0,0 +1,307 @@
+"""
+images.py — Images attached to Ask Manan doubts
+
+``ImagePipeline.load(url)`` turns a ``DoubtRequest.image_url`` into one small
+JPEG ready to send to Gemini:
+
+* Fetch: http(s) only, and hosts that resolve to private, loopback or
+  link-local addresses are refused, including after a redirect. The
+  connection goes to the address that was checked (the original host travels
+  in ``Host`` and TLS SNI), so a second DNS answer can't redirect it. The body is
+  streamed and the fetch gives up once it passes ``IMAGE_MAX_BYTES``, whatever
+  ``Content-Length`` claims. The HTTP client is an ``httpx.Client`` that tests
+  can build on ``httpx.MockTransport``.
+* Decode and downscale run in a small thread pool (``IMAGE_WORKERS``), which
+  caps how many large photos are decoded at once. JPEGs are decoded at reduced
+  scale (``draft``), so a 12 MP phone photo never becomes a full-size bitmap.
+  Larger-than-``IMAGE_MAX_PIXELS`` images are refused before decoding. The
+  result is EXIF-rotated and fitted within ``IMAGE_MAX_SIDE`` (768, one Gemini
+  image tile), then re-encoded as JPEG.
+* Results are cached by the SHA-256 of the fetched bytes, so the same
+  screenshot sent from another URL is not processed again. Each URL is also
+  mapped to its hash for ``IMAGE_URL_TTL_S``, so a repeated URL isn't fetched
+  again. The cache has its own small L1 (large values) plus the Shared Cache
+  store when ``REDIS_URL`` is set.
+
+Downscaling needs ``Pillow`` (in requirements.txt). If it isn't installed,
+images within the size limit are sent to Gemini as fetched (JPEG, PNG, WebP,
+HEIC).
+
+Configuration (environment):
+    IMAGE_MAX_BYTES        largest image fetched, in bytes (default 10 MB)
+    IMAGE_MAX_PIXELS       largest image decoded, in pixels (default 40 MP)
+    IMAGE_MAX_SIDE         long side after downscaling (default 768)
+    IMAGE_JPEG_QUALITY     re-encode quality (default 85)
+    IMAGE_WORKERS          concurrent decodes per process (default 2)
+    IMAGE_FETCH_TIMEOUT_S  fetch timeout, capped by the request budget (default 10)
+    IMAGE_CACHE_TTL_S      processed images kept for (default 86400)
+    IMAGE_URL_TTL_S        URL → content hash kept for (default 600)
+    IMAGE_CACHE_SIZE       processed images kept per process (default 256)
+"""
+
+import base64
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+import cache
+import resilience
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # optional: images are sent as fetched
+    Image = ImageOps = UnidentifiedImageError = None
+
+MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "768"))
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+FETCH_TIMEOUT_S = float(os.getenv("IMAGE_FETCH_TIMEOUT_S", "10"))
+CACHE_TTL_S = float(os.getenv("IMAGE_CACHE_TTL_S", "86400"))
+URL_TTL_S = float(os.getenv("IMAGE_URL_TTL_S", "600"))
+CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "256"))
+
+MAX_REDIRECTS = 3
+CHUNK_SIZE = 64 * 1024
+# Larger results (images passed through without Pillow) are not cached
+CACHE_MAX_ITEM = 1024 * 1024
+
+# Leading bytes → MIME type, for images passed through without Pillow
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"RIFF", "image/webp"),  # followed by size and "WEBP"
+    (b"\x00\x00\x00", "image/heic"),  # ISO-BMFF box; checked for "ftypheic" below
+]
+
+
+class ImageError(ValueError):
+    """The image can't be used; the message is safe to show the student."""
+
+
+def sniff(data):
+    """MIME type from the leading bytes, or None if it isn't a supported image."""
+    for signature, mime_type in SIGNATURES:
+        if data.startswith(signature):
+            if mime_type == "image/webp" and data[8:12] != b"WEBP":
+                return None
+            if mime_type == "image/heic" and data[4:12] not in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+                return None
+            return mime_type
+    return None
+
+
+def _check_host(url):
+    """A public address ``url``'s host resolves to; ImageError if any address isn't public."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImageError("Image links must start with http:// or https://")
+    try:
+        addresses = [ipaddress.ip_address(parts.hostname)]
+    except ValueError:
+        try:
+            infos = socket.getaddrinfo(parts.hostname, parts.port or 443, proto=socket.IPPROTO_TCP)
+        except socket.gaierror:
+            raise ImageError("Couldn't find the server hosting that image")
+        addresses = [ipaddress.ip_address(info[4][0]) for info in infos]
+    if any(not a.is_global for a in addresses):
+        raise ImageError("That image link points to a private address")
+    return addresses[0]
+
+
+def _pinned(url, address):
+    """(url, headers, extensions) that connect to ``address`` but still name ``url``'s host."""
+    parts = urlsplit(url)
+    host = f"[{address}]" if address.version == 6 else str(address)
+    netloc = f"{host}:{parts.port}" if parts.port else host
+    headers = {"Host": parts.netloc.rpartition("@")[2]}
+    extensions = {"sni_hostname": parts.hostname} if parts.scheme == "https" else {}
+    return parts._replace(netloc=netloc).geturl(), headers, extensions
+
+
+def attach(contents, image):
+    """Gemini ``contents`` with ``image`` added to the last (current) user turn."""
+    part = {"inline_data": {"mime_type": image["mime_type"], "data": image["data"]}}
+    if isinstance(contents, str):
+        return [{"role": "user", "parts": [part, {"text": contents}]}]
+    last = contents[-1]
+    return contents[:-1] + [{**last, "parts": [part] + last["parts"]}]
+
+
+class ImagePipeline:
+    def __init__(self, client=None, store=None, max_bytes=MAX_BYTES, max_pixels=MAX_PIXELS,
+                 max_side=MAX_SIDE, workers=WORKERS, fetch_timeout=FETCH_TIMEOUT_S, check_host=True):
+        self.client = client
+        self.store = store if store is not None else cache.TwoLevelCache(cache.shared.shared,
+                                                                         l1_size=CACHE_SIZE)
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.max_side = max_side
+        self.fetch_timeout = fetch_timeout
+        self.check_host = check_host
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()  # lazy client / pool creation, _inflight
+        self._inflight = {}  # content hash → Future, so concurrent uploads decode once
+        self.stats = {"fetched": 0, "url_hits": 0, "content_hits": 0, "processed": 0,
+                      "bytes_fetched": 0, "bytes_sent": 0}
+
+    # ── Fetch ─────────────────────────────────────────────────────────────────
+
+    def _http(self):
+        with self._lock:
+            if self.client is None:
+                self.client = httpx.Client(follow_redirects=False, headers={"User-Agent": "Manan/1.0"})
+            return self.client
+
+    def fetch(self, url, timeout=None):
+        """The image's bytes, streamed and capped at ``max_bytes``."""
+        deadline = time.monotonic() + (timeout or self.fetch_timeout)
+        for _ in range(MAX_REDIRECTS + 1):
+            target, headers, extensions = url, None, None
+            if self.check_host:
+                target, headers, extensions = _pinned(url, _check_host(url))
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise ImageError("The image took too long to download")
+            try:
+                with self._http().stream("GET", target, headers=headers, extensions=extensions,
+                                         timeout=left) as response:
+                    if response.is_redirect:
+                        url = urljoin(url, response.headers.get("location", ""))
+                        continue
+                    if response.status_code != 200:
+                        raise ImageError(f"Couldn't download the image (HTTP {response.status_code})")
+                    return self._read(response, deadline)
+            except httpx.TimeoutException:
+                raise ImageError("The image took too long to download")
+            except httpx.HTTPError as e:
+                raise ImageError(f"Couldn't download the image: {type(e).__name__}")
+        raise ImageError("The image link redirects too many times")
+
+    def _read(self, response, deadline):
+        limit = (f"{self.max_bytes // (1024 * 1024)} MB" if self.max_bytes >= 1024 * 1024
+                 else f"{self.max_bytes // 1024} KB")
+        too_large = ImageError(f"Images must be under {limit}")
+        length = response.headers.get("content-length")
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            raise too_large
+        body = bytearray()
+        for chunk in response.iter_bytes(CHUNK_SIZE):
+            body += chunk
+            if len(body) > self.max_bytes:
+                raise too_large
+            if time.monotonic() > deadline:
+                raise ImageError("The image took too long to download")
+        self.stats["fetched"] += 1
+        self.stats["bytes_fetched"] += len(body)
+        return bytes(body)
+
+    # ── Decode / Downscale ────────────────────────────────────────────────────
+
+    def process(self, data):
+        """Fit ``data`` within ``max_side`` as JPEG: {"mime_type", "data", "width", "height"}."""
+        if Image is None:
+            return self._as_fetched(data)
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                if img.width * img.height > self.max_pixels:
+                    raise ImageError("That image has too many pixels")
+                img.draft("RGB", (self.max_side, self.max_side))  # JPEG: decode at reduced scale
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+                if img.mode in ("RGBA", "LA", "P"):
+                    img = img.convert("RGBA")
+                    background = Image.new("RGB", img.size, "white")  # transparent screenshots
+                    background.paste(img, mask=img.getchannel("A"))
+                    img = background
+                elif img.mode != "RGB":
+                    img = img.convert("RGB")
+                out = io.BytesIO()
+                img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+                return {"mime_type": "image/jpeg", "data": out.getvalue(), "width": img.width,
+                        "height": img.height}
+        except UnidentifiedImageError:
+            return self._as_fetched(data)  # e.g. HEIC without a Pillow plugin
+        except ImageError:
+            raise
+        except (OSError, ValueError, Image.DecompressionBombError):
+            raise ImageError("That link isn't an image we can read")
+
+    @staticmethod
+    def _as_fetched(data):
+        mime_type = sniff(data)
+        if mime_type is None:
+            raise ImageError("That link isn't a JPEG, PNG, WebP or HEIC image")
+        return {"mime_type": mime_type, "data": data, "width": None, "height": None}
+
+    # ── Pipeline ──────────────────────────────────────────────────────────────
+
+    def _cached(self, digest):
+        value = self.store.get(f"image:{digest}")
+        if value is cache.MISS:
+            return None
+        return {**value, "data": base64.b64decode(value["data"]), "hash": digest}
+
+    def load(self, url):
+        """The processed image for ``url`` ({"hash", "mime_type", "data", ...})."""
+        url_key = "image-url:" + hashlib.sha256(url.encode()).hexdigest()
+        digest = self.store.get(url_key)
+        if digest is not cache.MISS:
+            image = self._cached(digest)
+            if image is not None:
+                self.stats["url_hits"] += 1
+                return image
+
+        data = self.fetch(url, resilience.call_timeout(self.fetch_timeout, "image"))
+        digest = hashlib.sha256(data).hexdigest()
+        self.store.set(url_key, digest, URL_TTL_S)
+        image = self._cached(digest)
+        if image is not None:
+            self.stats["content_hits"] += 1
+            return image
+
+        with self._lock:
+            future = self._inflight.get(digest)
+            if future is None:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="images")
+                future = self._inflight[digest] = self._pool.submit(self._process_and_cache, digest, data)
+        try:
+            image = future.result(timeout=resilience.call_timeout(self.fetch_timeout, "image"))
+        except FutureTimeout:
+            raise resilience.DeadlineExceeded("image processing did not finish within the request budget")
+        return {**image, "hash": digest}
+
+    def _process_and_cache(self, digest, data):
+        try:
+            image = self.process(data)
+            self.stats["processed"] += 1
+            self.stats["bytes_sent"] += len(image["data"])
+            if len(image["data"]) <= CACHE_MAX_ITEM:
+                self.store.set(f"image:{digest}", {**image, "data": base64.b64encode(image["data"]).decode()},
+                               CACHE_TTL_S)
+            return image
+        finally:
+            with self._lock:
+                self._inflight.pop(digest, None)
+
+    def close(self):
+        """Stop the decode pool and drop idle connections (both restart on next use)."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            if self.client is not None:
+                self.client.close()
+                self.client = None
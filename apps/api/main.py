@@ -1,36 +1,160 @@
 
+import time
+
+_import_started = time.perf_counter()
+
+import hashlib
 import os
 import random
+import threading
+from contextlib import asynccontextmanager
 from typing import Optional, List
-from fastapi import FastAPI, UploadFile, File, Query
+from fastapi import FastAPI, UploadFile, File, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from google import genai
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
+
+import analytics
+import cache
+import conversations
+import course_search
+import dashboard
+import doubt_queue
+import enrollment
+import firebase_config
+import gemini
+import idempotency
+import images
+import metrics
+import notification_hub
+import placement
+import profiler
+import rate_limit
+import resilience
+import responses
+import risk_engine
+import system_settings
+import tasks
+import usage
+# Lazy proxies: the Firebase SDKs load (and the client is created) on first use
+from firebase_config import db, firestore, auth
 
 load_dotenv()
 
-# ─── Initialize Firebase Admin SDK ────────────────────────────────────────────
-_service_account_path = os.getenv(
-    "FIREBASE_SERVICE_ACCOUNT_PATH",
-    "nova-scholar-f10d5-firebase-adminsdk-fbsvc-9ac6252f8f.json"
-)
+# Firestore calls get budgeted timeouts and go through the circuit breaker
+resilience.install()
 
-if not firebase_admin._apps:
-    if os.path.exists(_service_account_path):
-        _cred = credentials.Certificate(_service_account_path)
-        firebase_admin.initialize_app(_cred)
-        print(f"✅ Firebase Admin initialized with: {_service_account_path}")
-    else:
-        print(f"⚠️  Service account not found: {_service_account_path}")
 
-db = firestore.client()
+# ─── Startup ──────────────────────────────────────────────────────────────────
+# Heavy SDK work happens in the lifespan (once per process, after any worker
+# fork) instead of at import time. STARTUP_PREWARM=1 additionally opens the
+# Firestore channel, loads the auth module and creates the Gemini client
+# before the server reports ready. GET /debug/startup answers only with
+# STARTUP_REPORT=1 (it exposes process age and internal timings).
+
+STARTUP = {}
+STARTUP_REPORT = os.getenv("STARTUP_REPORT", "0") == "1"
+
+
+def _process_age():
+    """Seconds since this process started (Linux), else None."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _prewarm():
+    timings = {}
+    start = time.perf_counter()
+    db.collection("system").document("settings").get()
+    timings["firestore_roundtrip_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    auth.verify_id_token  # imports firebase_admin.auth
+    timings["auth_import_s"] = time.perf_counter() - start
+    if gemini.get_api_key():
+        start = time.perf_counter()
+        gemini.get_client()
+        timings["gemini_client_s"] = time.perf_counter() - start
+    return timings
+
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+    try:
+        await run_in_threadpool(firebase_config.get_db)
+        STARTUP["firebase_init_s"] = firebase_config.init_seconds
+    except Exception as e:
+        print(f"⚠️  Firestore client not initialized: {e}")
+    cache.shared.start()
+    if doubt_queue.ENABLED:
+        try:
+            started_index = time.perf_counter()
+            await run_in_threadpool(doubt_index.start)
+            STARTUP["doubt_index_s"] = time.perf_counter() - started_index
+        except Exception as e:
+            print(f"⚠️  Doubt index not built, /admin/doubts will query Firestore: {e}")
+    if course_search.ENABLED:
+        try:
+            started_index = time.perf_counter()
+            await run_in_threadpool(course_index.start)
+            STARTUP["course_index_s"] = time.perf_counter() - started_index
+        except Exception as e:
+            print(f"⚠️  Course search index not built, searches will index the cached course list: {e}")
+    if os.getenv("STARTUP_PREWARM", "0") == "1":
+        try:
+            STARTUP["prewarm"] = await run_in_threadpool(_prewarm)
+        except Exception as e:
+            print(f"⚠️  Prewarm failed: {e}")
+    STARTUP["lifespan_s"] = time.perf_counter() - started
+    STARTUP["process_age_at_ready_s"] = _process_age()
+    print("✅ Ready: " + ", ".join(
+        f"{k}={v:.3f}" for k, v in STARTUP.items() if isinstance(v, float)))
+    stop_exporter = threading.Event()
+    if analytics.EXPORT_INTERVAL > 0:
+        analytics.start_exporter(db, analytics.EXPORT_INTERVAL, stop_exporter)
+    placement_buffer.start()
+    background.start()
+    usage_ledger.start()
+    yield
+    stop_exporter.set()
+    notifications_hub.close()
+    doubt_index.close()
+    course_index.close()
+    cache.shared.close()
+    # Tasks still queued stay in the task file and run after the next start
+    await run_in_threadpool(background.close)
+    # Write-behind placement progress must reach Firestore before exit
+    try:
+        written = await run_in_threadpool(placement_buffer.close)
+        if written:
+            print(f"✅ Flushed placement progress for {written} students")
+    except Exception as e:
+        print(f"⚠️  Placement progress flush failed: {e}")
+    try:
+        written = await run_in_threadpool(usage_ledger.close)
+        if written:
+            print(f"✅ Flushed Gemini usage for {written} students/courses")
+    except Exception as e:
+        print(f"⚠️  Gemini usage flush failed: {e}")
+    image_pipeline.close()
+
 
 # ─── FastAPI App ──────────────────────────────────────────────────────────────
 
-app = FastAPI(title="Manan AI API")
+app = FastAPI(title="Manan AI API", lifespan=lifespan, default_response_class=responses.FastJSONResponse)
+# Render handler results with orjson directly (no jsonable_encoder pass)
+app.router.route_class = responses.FastJSONRoute
+
+# gzip/brotli for large bodies, negotiated per request (innermost)
+app.add_middleware(responses.CompressionMiddleware)
 
 # CORS Configuration
 origins = [
@@ -45,12 +169,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in Firestore call tracing (FIRESTORE_PROFILE=header|all)
+app.add_middleware(profiler.ProfilerMiddleware)
+
+# Per-request deadline budget for downstream calls
+app.add_middleware(resilience.DeadlineMiddleware)
+
+# Per-route latency and Firestore op counts (outermost, so it sees CORS too)
+app.add_middleware(metrics.MetricsMiddleware)
+
 
 @app.get("/")
 def read_root():
     return {"status": "Manan API Active"}
 
 
+# ─── Metrics ──────────────────────────────────────────────────────────────────
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/startup")
+def get_startup_report():
+    """Startup phase timings for this process."""
+    if not STARTUP_REPORT:
+        return {"status": "error", "message": "Startup report disabled – set STARTUP_REPORT=1"}
+    return {"status": "success", "startup": STARTUP}
+
+
+@app.get("/debug/dependencies")
+def get_dependency_report():
+    """Circuit breaker state per downstream dependency in this process."""
+    return {"status": "success", "breakers": resilience.breakers()}
+
+
+@app.get("/debug/firestore-traces")
+def get_firestore_traces(token: str, limit: int = 20, route: Optional[str] = None):
+    """Slowest profiled requests with their Firestore calls and N+1 warnings (admins only: paths hold UIDs)."""
+    try:
+        decoded = auth.verify_id_token(token)
+        if _user_role(decoded["uid"]) != "admin":
+            return {"status": "error", "message": "Unauthorized"}
+        if not profiler.settings.enabled:
+            return {"status": "error", "message": "Profiling disabled – set FIRESTORE_PROFILE=header or all"}
+        return {"status": "success", "traces": profiler.traces.slowest(limit, route)}
+    except Exception as e:
+        return resilience.error_response(e)
+
+
 # ─── Ask Nova (Solve Doubt) ───────────────────────────────────────────────────
 
 OSI_MODEL_RESPONSE = """
@@ -134,49 +303,192 @@ When you open a website:
 (Application → Presentation → Session → Transport → Network → Data Link → Physical)
 """
 
+# Canned answers, serialized and pre-compressed once
+OSI_ANSWER = responses.StaticJSON({
+    "answer": OSI_MODEL_RESPONSE,
+    "citations": ["Networking Standards", "ISO Model"]
+})
+EXAM_MODE_ANSWER = responses.StaticJSON({
+    "answer": "⚠️ Exam Mode is Active. 'Ask Manan' is temporarily disabled.",
+    "citations": []
+})
+
+# Answers are kept to serve again while Gemini is unavailable
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+
+
+def _answer_key(question, image_hash=None):
+    normalized = " ".join(question.lower().split())
+    if image_hash:
+        normalized += f"\nimage:{image_hash}"
+    return "answer:" + hashlib.sha256(normalized.encode()).hexdigest()
+
+
+# Gemini calls per student and course per day, flushed in batches (see usage.py)
+usage_ledger = usage.Ledger(db)
+
+# Server-held history for follow-up questions (see conversations.py)
+doubt_conversations = conversations.Conversations()
+
+# Fetches, downscales and caches images attached to doubts (see images.py)
+image_pipeline = images.ImagePipeline()
+
+
 class DoubtRequest(BaseModel):
     student_id: str
     question_text: str
+    token: Optional[str] = None  # usage and quotas follow the verified UID
     image_url: Optional[str] = None
+    course_id: Optional[str] = None  # attributes usage to the course, if the caller is enrolled
+    conversation_id: Optional[str] = None  # from an earlier answer, to ask a follow-up
 
 
-@app.post("/solve-doubt")
-def solve_doubt(request: DoubtRequest):
-    # Check for hardcoded OSI Model query
+# Enrollment only decides which course is charged for usage; a short lag is fine
+ENROLLMENT_CACHE_TTL = 300
+
+
+def _is_enrolled(uid, course_id):
+    """Whether ``uid`` is enrolled in ``course_id`` (cached across workers)."""
+    def load():
+        ref = db.collection("users").document(uid).collection("enrolled_courses").document(course_id)
+        return ref.get(field_paths=["course_id"]).exists
+    return cache.shared.get_or_load(f"enrolled:{uid}:{course_id}", ENROLLMENT_CACHE_TTL, load)
+
+
+def _usage_subject(request):
+    """(student, course) a /solve-doubt call is charged to; raises if the token is invalid.
+
+    The body's student_id and course_id are never trusted for quotas. Without
+    a token, usage is recorded as the "anonymous" student (which is not held to
+    student quotas), and a course is only charged when the verified caller is
+    enrolled in it.
+    """
+    if not request.token:
+        return "anonymous", None
+    uid = auth.verify_id_token(request.token)["uid"]
+    course_id = request.course_id
+    if not course_id or "/" in course_id:
+        return uid, None
     try:
-        # Check System Settings for Exam Mode
-        settings_doc = db.collection("system").document("settings").get()
-        if settings_doc.exists and settings_doc.to_dict().get("exam_mode", False):
-             return {
-                "answer": "⚠️ Exam Mode is Active. 'Ask Manan' is temporarily disabled.",
-                "citations": []
-            }
-    except:
-        pass # Fail open if DB error, or log it
+        return uid, course_id if _is_enrolled(uid, course_id) else None
+    except Exception as e:
+        print(f"⚠️  Enrollment check for usage failed: {e}")
+        return uid, None
 
-    if "osi" in request.question_text.lower():
-        return {
-            "answer": OSI_MODEL_RESPONSE,
-            "citations": ["Networking Standards", "ISO Model"]
-        }
 
-    api_key = os.getenv("GOOGLE_API_KEY")
+def _generate_answer(subject, contents, model=gemini.DEFAULT_MODEL, config=None):
+    """Call Gemini and record the call in the usage ledger against ``subject`` (student, course)."""
+    started = time.perf_counter()
+    try:
+        response = gemini.generate_content(contents, model=model, config=config)
+    except (resilience.CircuitOpen, resilience.DeadlineExceeded):
+        raise  # never reached Gemini
+    except Exception:
+        usage_ledger.record(*subject, latency_s=time.perf_counter() - started, error=True)
+        raise
+    tokens = getattr(response, "usage_metadata", None)
+    usage_ledger.record(*subject,
+                        prompt_tokens=getattr(tokens, "prompt_token_count", 0) or 0,
+                        output_tokens=getattr(tokens, "candidates_token_count", 0) or 0,
+                        latency_s=time.perf_counter() - started)
+    return response
+
+
+@app.post("/solve-doubt")
+def solve_doubt(request: DoubtRequest, http_request: Request):
+    # Check System Settings for Exam Mode (cached; fails open to defaults)
+    settings = system_settings.get_settings()
+    if settings.get("exam_mode", False):
+        return EXAM_MODE_ANSWER.response(http_request)
+
+    # Check for hardcoded OSI Model query (new questions only)
+    if not request.conversation_id and not request.image_url and "osi" in request.question_text.lower():
+        return OSI_ANSWER.response(http_request)
+
+    # Who is asking: the body's student_id is never trusted for limits or usage
+    try:
+        subject = _usage_subject(request)
+    except Exception:
+        message = "Your session has expired. Please sign in again."
+        return responses.FastJSONResponse({"status": "error", "message": message,
+                                           "answer": f"⚠️ {message}", "citations": []}, status_code=401)
+
+    # Per-caller / per-route token buckets (fast 429 instead of queueing);
+    # canned answers above cost nothing, so they don't spend tokens
+    client = http_request.client.host if http_request.client else "unknown"
+    caller = subject[0] if request.token else f"client:{client}"
+    rejected = rate_limit.check_student("/solve-doubt", caller)
+    if rejected:
+        return rejected
+
+    # Daily Gemini quotas, checked against the usage ledger. Calls without a
+    # token have no verified student or course to hold to a quota
+    student = subject[0] if request.token else None
+    over_quota = usage_ledger.check_quota(settings.get("gemini_quota", {}), student, subject[1])
+    if over_quota:
+        return rate_limit.rejection(*over_quota)
+
+    # Follow-ups carry the conversation; a new question starts one
+    if request.conversation_id:
+        conversation_id = request.conversation_id
+        conversation = doubt_conversations.load(conversation_id, request.student_id)
+        if conversation is None:
+            message = "This conversation has expired. Please ask your question again."
+            return responses.FastJSONResponse({"status": "error", "message": message,
+                                               "answer": f"⚠️ {message}", "citations": []}, status_code=404)
+    else:
+        conversation_id, conversation = doubt_conversations.start(request.student_id, request.course_id)
+    follow_up = conversation["n"] > 0
+
+    api_key = gemini.get_api_key()
     if not api_key:
         return {
             "answer": "Error: GOOGLE_API_KEY not found in environment variables.",
             "citations": []
         }
+    image = None
     try:
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=request.question_text,
-        )
-        return {
+        # Fetched and downscaled before taking a Gemini slot
+        if request.image_url:
+            image = image_pipeline.load(request.image_url)
+        with rate_limit.gemini_slot() as rejected:
+            if rejected:
+                return rejected
+
+            def summarize(summary, turns):
+                prompt = conversations.summary_prompt(summary, turns)
+                config = {"max_output_tokens": doubt_conversations.summary_tokens}
+                return _generate_answer(subject, prompt, conversations.SUMMARY_MODEL, config).text
+
+            contents, config = doubt_conversations.prompt(conversation, request.question_text, summarize)
+            if image:
+                contents = images.attach(contents, image)
+            response = _generate_answer(subject, contents, config=config)
+        result = {
             "answer": response.text,
             "citations": ["General Knowledge", "Gemini Model"]
         }
+        answer_key = _answer_key(request.question_text, image and image["hash"])
+        if not follow_up:  # a follow-up's answer depends on the conversation
+            cache.shared.set(answer_key, result, ANSWER_CACHE_TTL)
+        output_tokens = getattr(getattr(response, "usage_metadata", None), "candidates_token_count", None)
+        doubt_conversations.record(conversation_id, conversation, request.question_text, response.text,
+                                   output_tokens)
+        return {**result, "conversation_id": conversation_id}
+    except images.ImageError as e:
+        return responses.FastJSONResponse({"status": "error", "message": str(e),
+                                           "answer": f"⚠️ {e}", "citations": []}, status_code=400)
     except Exception as e:
+        if resilience.is_unavailable(e):
+            # Degraded: the last answer to the same question, else a 503
+            cached = cache.MISS
+            if not follow_up and (image or not request.image_url):
+                cached = cache.shared.get(_answer_key(request.question_text, image and image["hash"]))
+            if cached is not cache.MISS:
+                return {**cached, "degraded": True}
+            message = "Ask Manan is temporarily unavailable. Please try again shortly."
+            return resilience.unavailable(message, getattr(e, "retry_after", 5),
+                                          answer=f"⚠️ {message}", citations=[])
         return {
             "answer": f"Error processing request: {str(e)}",
             "citations": []
@@ -320,57 +632,67 @@ async def analyze_resume(file: UploadFile = File(...)):
 
 # ─── Student Profile ──────────────────────────────────────────────────────────
 
+# Profiles change through PUT /student/profile, which invalidates this
+PROFILE_CACHE_TTL = 60
+
+
 @app.get("/student/profile")
 def get_student_profile(uid: str = "student_1"):
-    """Fetch a student profile from Firestore by UID."""
+    """Fetch a student profile from Firestore by UID (cached across workers)."""
     try:
-        doc = db.collection("users").document(uid).get()
-        if doc.exists:
-            data = doc.to_dict()
-            profile = data.get("profile", {})
-            stats = data.get("academic_stats", {})
-            return {
-                "uid": data.get("uid", uid),
-                "name": profile.get("name", ""),
-                "email": data.get("email", ""),
-                "phone": data.get("phone", ""),
-                "branch": profile.get("branch", ""),
-                "year": profile.get("year", ""),
-                "semester": data.get("semester", ""),
-                "enrollment_no": data.get("enrollment_no", ""),
-                "role": data.get("role", "student"),
-                "cgpa": stats.get("cgpa", 0),
-                "attendance": stats.get("attendance_percent", stats.get("attendance", 0)),
-                "risk_status": stats.get("risk_status", stats.get("status", "safe")),
-                "courses_enrolled": stats.get("courses_enrolled", []),
-                "github_url": data.get("github_url", ""),
-                "linkedin_url": data.get("linkedin_url", ""),
-                "avatar_url": profile.get("avatar_url", profile.get("avatar", "")),
-            }
-        else:
-            # Return empty profile template if user not found
-            return {
-                "uid": uid,
-                "name": "",
-                "email": "",
-                "phone": "",
-                "branch": "",
-                "year": "",
-                "semester": "",
-                "enrollment_no": "",
-                "role": "student",
-                "cgpa": 0,
-                "attendance": 0,
-                "risk_status": "safe",
-                "courses_enrolled": [],
-                "github_url": "",
-                "linkedin_url": "",
-                "avatar_url": "",
-            }
+        return cache.shared.get_or_load(f"profile:{uid}", PROFILE_CACHE_TTL, lambda: _load_student_profile(uid))
     except Exception as e:
+        if resilience.is_unavailable(e):
+            return resilience.error_response(e)
         return {"error": str(e)}
 
 
+def _load_student_profile(uid):
+    doc = db.collection("users").document(uid).get()
+    if doc.exists:
+        data = doc.to_dict()
+        profile = data.get("profile", {})
+        stats = data.get("academic_stats", {})
+        return {
+            "uid": data.get("uid", uid),
+            "name": profile.get("name", ""),
+            "email": data.get("email", ""),
+            "phone": data.get("phone", ""),
+            "branch": profile.get("branch", ""),
+            "year": profile.get("year", ""),
+            "semester": data.get("semester", ""),
+            "enrollment_no": data.get("enrollment_no", ""),
+            "role": data.get("role", "student"),
+            "cgpa": stats.get("cgpa", 0),
+            "attendance": stats.get("attendance_percent", stats.get("attendance", 0)),
+            "risk_status": stats.get("risk_status", stats.get("status", "safe")),
+            "courses_enrolled": stats.get("courses_enrolled", []),
+            "github_url": data.get("github_url", ""),
+            "linkedin_url": data.get("linkedin_url", ""),
+            "avatar_url": profile.get("avatar_url", profile.get("avatar", "")),
+        }
+    else:
+        # Return empty profile template if user not found
+        return {
+            "uid": uid,
+            "name": "",
+            "email": "",
+            "phone": "",
+            "branch": "",
+            "year": "",
+            "semester": "",
+            "enrollment_no": "",
+            "role": "student",
+            "cgpa": 0,
+            "attendance": 0,
+            "risk_status": "safe",
+            "courses_enrolled": [],
+            "github_url": "",
+            "linkedin_url": "",
+            "avatar_url": "",
+        }
+
+
 class ProfileUpdateRequest(BaseModel):
     uid: str = "student_1"
     name: str = ""
@@ -392,8 +714,10 @@ def update_student_profile(req: ProfileUpdateRequest):
     try:
         doc_ref = db.collection("users").document(req.uid)
         
-        # Determine risk status
-        risk_status = "At Risk" if req.attendance < 75 or req.cgpa < 5.0 else "Safe"
+        # Determine risk status against the admin-configured thresholds
+        settings = system_settings.get_settings()
+        risk_status = risk_engine.risk_status(req.attendance, req.cgpa,
+                                              settings["attendance_threshold"], settings["cgpa_threshold"])
 
         doc_ref.set({
             "uid": req.uid,
@@ -416,15 +740,30 @@ def update_student_profile(req: ProfileUpdateRequest):
                 "risk_status": risk_status,
                 "courses_enrolled": [],
             },
+            "updated_at": firestore.SERVER_TIMESTAMP,
         }, merge=True)
 
+        cache.shared.invalidate(f"profile:{req.uid}", f"role:{req.uid}")
+        student_dashboard.invalidate("profile", req.uid)
         return {"status": "success", "message": "Profile updated successfully", "risk_status": risk_status}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 # ─── Auth Sync ────────────────────────────────────────────────────────────────
 
+# Roles are written by /auth/sync and PUT /student/profile, which invalidate this
+ROLE_CACHE_TTL = 300
+
+
+def _user_role(uid):
+    """The user's role, or None without a user document (cached across workers)."""
+    def load():
+        doc = db.collection("users").document(uid).get(field_paths=["role"])
+        return doc.to_dict().get("role") if doc.exists else None
+    return cache.shared.get_or_load(f"role:{uid}", ROLE_CACHE_TTL, load)
+
+
 class UserSyncRequest(BaseModel):
     token: str
     role: str  # "student" or "admin"
@@ -455,11 +794,12 @@ async def sync_user(request: UserSyncRequest):
                 "created_at": firestore.SERVER_TIMESTAMP,
             }
             user_ref.set(user_data)
+            cache.shared.invalidate(f"role:{uid}", f"profile:{uid}")
 
         return {"status": "success", "role": final_role, "uid": uid}
 
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 # ─── Courses & Enrollment ─────────────────────────────────────────────────────
@@ -473,15 +813,17 @@ class CourseCreateRequest(BaseModel):
 
 
 @app.post("/courses")
-def create_course(req: CourseCreateRequest):
+def create_course(req: CourseCreateRequest, idempotency_key: Optional[str] = Header(default=None)):
+    return idempotency.run(idempotency_key, "/courses", req, lambda: _create_course(req))
+
+
+def _create_course(req: CourseCreateRequest):
     try:
         # verify token (simple check)
         decoded = auth.verify_id_token(req.token)
         if decoded["uid"] != req.teacher_id:
             return {"status": "error", "message": "Unauthorized"}
 
-        from firebase_config import db
-        
         course_data = {
             "title": req.title,
             "description": req.description,
@@ -492,10 +834,13 @@ def create_course(req: CourseCreateRequest):
         }
         
         update_time, course_ref = db.collection("courses").add(course_data)
-        
+        cache.shared.invalidate("courses")
+        course_index.put(course_ref.id, course_data)
+        student_dashboard.invalidate("courses")
+
         return {"status": "success", "course_id": course_ref.id}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 @app.delete("/courses/{course_id}")
@@ -504,7 +849,6 @@ def delete_course(course_id: str, token: str):
         decoded = auth.verify_id_token(token)
         uid = decoded["uid"]
         
-        from firebase_config import db
         course_ref = db.collection("courses").document(course_id)
         course_doc = course_ref.get()
         
@@ -516,44 +860,93 @@ def delete_course(course_id: str, token: str):
              return {"status": "error", "message": "Unauthorized"}
 
         course_ref.delete()
+        cache.shared.invalidate("courses", f"course:{course_id}")
+        course_index.remove(course_id)
+        student_dashboard.invalidate("courses")
         return {"status": "success"}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+# Course writes (create, delete, syllabus) invalidate these; counters such as
+# doubts_count may lag by up to the TTL.
+COURSES_CACHE_TTL = 60
+
+
+def _load_courses():
+    docs = db.collection("courses").stream()
+    courses = []
+    for doc in docs:
+        d = doc.to_dict()
+        d["id"] = doc.id
+        # Convert timestamp to string if present
+        if "created_at" in d and d["created_at"]:
+            d["created_at"] = str(d["created_at"])
+        courses.append(d)
+    return {"courses": courses}
 
 
 @app.get("/courses")
 def get_courses():
     try:
-        from firebase_config import db
-        docs = db.collection("courses").stream()
-        courses = []
-        for doc in docs:
-            d = doc.to_dict()
-            d["id"] = doc.id
-            # Convert timestamp to string if present
-            if "created_at" in d and d["created_at"]:
-                d["created_at"] = str(d["created_at"])
-            courses.append(d)
-        return {"courses": courses}
+        return cache.shared.get_or_load("courses", COURSES_CACHE_TTL, _load_courses)
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+# Inverted index over the catalog, kept current by a courses listener and the
+# course write handlers above (see course_search.py)
+course_index = course_search.CourseIndex(db)
+_fallback_index = {"source": None, "index": None}
+
+
+def _search_index():
+    """The live index, or one built from the cached course list until it is ready."""
+    if course_index.ready():
+        return course_index
+    payload = cache.shared.get_or_load("courses", COURSES_CACHE_TTL, _load_courses)
+    if _fallback_index["source"] is not payload:
+        _fallback_index["index"] = course_search.CourseIndex.from_courses(payload["courses"])
+        _fallback_index["source"] = payload
+    return _fallback_index["index"]
+
+
+@app.get("/courses/search")
+def search_courses(q: str = "", department: Optional[str] = None, semester: Optional[str] = None,
+                   limit: int = Query(default=20, ge=1, le=100), offset: int = Query(default=0, ge=0)):
+    """Ranked course search over titles, codes, descriptions and syllabus topics.
+
+    Tolerates typos and matches the last word as a prefix. Facet counts by
+    department and semester come back with the results.
+    """
+    try:
+        result = _search_index().search(q, department=department, semester=semester,
+                                        limit=limit, offset=offset)
+        return {"status": "success", "query": q, **result}
+    except Exception as e:
+        return resilience.error_response(e)
 
 
 
 @app.get("/courses/{course_id}")
 def get_single_course(course_id: str):
     """Fetch a single course by ID, including syllabus_topics."""
-    try:
+    def load():
         doc = db.collection("courses").document(course_id).get()
         if not doc.exists:
-            return {"status": "error", "message": "Course not found"}
+            return None
         d = doc.to_dict()
         d["id"] = doc.id
         if "created_at" in d and d["created_at"]:
             d["created_at"] = str(d["created_at"])
-        return {"status": "success", "course": d}
+        return d
+    try:
+        course = cache.shared.get_or_load(f"course:{course_id}", COURSES_CACHE_TTL, load)
+        if course is None:
+            return {"status": "error", "message": "Course not found"}
+        return {"status": "success", "course": course}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 class EnrollRequest(BaseModel):
@@ -563,14 +956,16 @@ class EnrollRequest(BaseModel):
 
 
 @app.post("/courses/enroll")
-async def enroll_student(req: EnrollRequest):
+async def enroll_student(req: EnrollRequest, idempotency_key: Optional[str] = Header(default=None)):
+    return await idempotency.run_async(idempotency_key, "/courses/enroll", req, lambda: _enroll_student(req))
+
+
+async def _enroll_student(req: EnrollRequest):
     try:
         decoded = auth.verify_id_token(req.token)
         if decoded["uid"] != req.student_id:
              return {"status": "error", "message": "Unauthorized"}
 
-        from firebase_config import db
-
         # 1. Add student to course subcollection
         course_ref = db.collection("courses").document(req.course_id)
         course_ref.collection("students").document(req.student_id).set({
@@ -588,10 +983,53 @@ async def enroll_student(req: EnrollRequest):
         # 3. Increment student count (optional/atomic)
         # course_ref.update({"student_count": firestore.Increment(1)})
 
+        student_dashboard.invalidate("enrolled", req.student_id)
         return {"status": "success"}
 
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+class BulkEnrollRequest(BaseModel):
+    token: str
+    course_id: str
+    student_ids: Optional[List[str]] = None
+    csv: Optional[str] = None  # CSV text: a student_id/uid/id column, else the first column
+
+
+@app.post("/admin/courses/enroll")
+def bulk_enroll_students(req: BulkEnrollRequest, idempotency_key: Optional[str] = Header(default=None)):
+    """Enroll a whole section in a course, with a status per row."""
+    return idempotency.run(idempotency_key, "/admin/courses/enroll", req, lambda: _bulk_enroll_students(req))
+
+
+def _bulk_enroll_students(req: BulkEnrollRequest):
+    try:
+        decoded = auth.verify_id_token(req.token)
+        if _user_role(decoded["uid"]) != "admin":
+            return {"status": "error", "message": "Unauthorized"}
+
+        student_ids = list(req.student_ids or []) + (enrollment.parse_csv(req.csv) if req.csv else [])
+        if not student_ids:
+            return {"status": "error", "message": "Provide student_ids or csv"}
+        if len(student_ids) > enrollment.MAX_ROWS:
+            return {"status": "error", "message": f"At most {enrollment.MAX_ROWS} students per request"}
+        if not db.collection("courses").document(req.course_id).get(field_paths=["title"]).exists:
+            return {"status": "error", "message": "Course not found"}
+
+        summary, results = enrollment.bulk_enroll(db, req.course_id, student_ids)
+
+        if summary.get("enrolled"):
+            cache.shared.invalidate("courses", f"course:{req.course_id}")  # student_count changed
+            student_dashboard.invalidate("courses")
+            for row in results:
+                if row["status"] == "enrolled":
+                    student_dashboard.invalidate("enrolled", row["student_id"])
+        # "partial" is never stored by idempotency.run, so a retry with the same key re-runs the failed rows
+        status = "partial" if summary.get("failed") else "success"
+        return {"status": status, "course_id": req.course_id, "summary": summary, "results": results}
+    except Exception as e:
+        return resilience.error_response(e)
 
 
 class TeacherRosterRequest(BaseModel):
@@ -605,28 +1043,25 @@ def get_teacher_students(req: TeacherRosterRequest):
         decoded = auth.verify_id_token(req.token)
         # Allow if requester is the teacher
         
-        from firebase_config import db
-        
-        # 1. Get all courses by this teacher
-        courses_query = db.collection("courses").where("teacher_id", "==", req.teacher_id).stream()
+        # 1. Get all courses by this teacher (ids only)
+        courses_query = db.collection("courses").where("teacher_id", "==", req.teacher_id).select([]).stream()
         
         student_uids = set()
         
-        # 2. For each course, get enrolled students
+        # 2. For each course, get enrolled student ids
         for course in courses_query:
-            students_ref = course.reference.collection("students").stream()
+            students_ref = course.reference.collection("students").select([]).stream()
             for s in students_ref:
                 student_uids.add(s.id)
         
         if not student_uids:
             return {"students": []}
 
-        # 3. Fetch user profiles for these students
-        # Firestore 'in' query supports max 10/30 items, so might need chunking or individual fetches
-        # For simplicity, fetching individually for now (ok for small scale)
+        # 3. Fetch the profile fields we show, in one batched read
+        refs = [db.collection("users").document(uid) for uid in student_uids]
         students_data = []
-        for uid in student_uids:
-            u_doc = db.collection("users").document(uid).get()
+        for u_doc in db.get_all(refs, field_paths=["email"]):
+            uid = u_doc.id
             if u_doc.exists:
                 ud = u_doc.to_dict()
                 # Determine display info
@@ -645,7 +1080,45 @@ def get_teacher_students(req: TeacherRosterRequest):
         return {"students": students_data}
 
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+# ─── Background Tasks ─────────────────────────────────────────────────────────
+# Side effects that don't shape a response (course counters, notification
+# fan-out) are queued in a local SQLite file and run by worker threads, with
+# retries and a dead-letter list (see tasks.py).
+
+background = tasks.TaskQueue()
+
+
+@app.get("/debug/tasks")
+def get_task_report(token: str, limit: int = 20):
+    """Queued, running and dead-lettered background tasks (admins only: payloads hold student data)."""
+    try:
+        decoded = auth.verify_id_token(token)
+        if _user_role(decoded["uid"]) != "admin":
+            return {"status": "error", "message": "Unauthorized"}
+        return {"status": "success", "counts": background.counts(), "stats": background.stats,
+                "dead": background.dead(limit)}
+    except Exception as e:
+        return resilience.error_response(e)
+
+
+class RetryTasksRequest(BaseModel):
+    token: str
+    ids: Optional[List[int]] = None  # default: every dead task
+
+
+@app.post("/admin/tasks/retry")
+def retry_dead_tasks(req: RetryTasksRequest):
+    """Put dead-lettered tasks back in the queue."""
+    try:
+        decoded = auth.verify_id_token(req.token)
+        if _user_role(decoded["uid"]) != "admin":
+            return {"status": "error", "message": "Unauthorized"}
+        return {"status": "success", "requeued": background.retry_dead(req.ids)}
+    except Exception as e:
+        return resilience.error_response(e)
 
 
 # ─── Syllabus & Doubts ────────────────────────────────────────────────────────
@@ -658,18 +1131,19 @@ class SyllabusUploadRequest(BaseModel):
 def upload_syllabus(course_id: str, req: SyllabusUploadRequest):
     try:
         decoded = auth.verify_id_token(req.token)
-        from firebase_config import db
-        
         # Verify ownership (omitted for brevity, but recommended)
         
         db.collection("courses").document(course_id).update({
             "syllabus_uploaded": True,
             "syllabus_url": req.file_url or "https://example.com/syllabus.pdf" # Mock URL if none provided
         })
-        
+        cache.shared.invalidate("courses", f"course:{course_id}")
+        course_index.patch(course_id, {"syllabus_uploaded": True})
+        student_dashboard.invalidate("courses")
+
         return {"status": "success"}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 class DoubtRequest(BaseModel):
@@ -679,7 +1153,11 @@ class DoubtRequest(BaseModel):
     token: str
 
 @app.post("/courses/doubts")
-def ask_doubt(req: DoubtRequest):
+def ask_doubt(req: DoubtRequest, idempotency_key: Optional[str] = Header(default=None)):
+    return idempotency.run(idempotency_key, "/courses/doubts", req, lambda: _ask_doubt(req))
+
+
+def _ask_doubt(req: DoubtRequest):
     try:
         decoded = auth.verify_id_token(req.token)
         if decoded["uid"] != req.student_id:
@@ -699,33 +1177,52 @@ def ask_doubt(req: DoubtRequest):
         # Add to global 'doubts' collection
         _, doubt_ref = db.collection("doubts").add(doubt_data)
 
-        # Increment doubt count on course
-        course_ref = db.collection("courses").document(req.course_id)
-        course_doc = course_ref.get()
-        course_title = "Unknown Course"
-        teacher_id = None
-        if course_doc.exists:
-            cd = course_doc.to_dict()
-            course_title = cd.get("title", course_title)
-            teacher_id = cd.get("teacher_id")
-            course_ref.update({"doubts_count": firestore.Increment(1)})
-
-        # Create a notification for the faculty
-        notif_data = {
-            "title": f"New doubt in {course_title}: \"{req.question[:80]}...\"",
-            "type": "info",
-            "sender_uid": req.student_id,
-            "sender_email": student_email,
-            "target_uid": teacher_id,
+        # Course counter and faculty notification happen in the background
+        background.enqueue("doubt_asked", {
             "doubt_id": doubt_ref.id,
             "course_id": req.course_id,
-            "created_at": firestore.SERVER_TIMESTAMP,
-        }
-        db.collection("notifications").add(notif_data)
+            "student_id": req.student_id,
+            "student_email": student_email,
+            "question": req.question,
+        })
 
+        student_dashboard.invalidate("doubts", req.student_id)
         return {"status": "success", "doubt_id": doubt_ref.id}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+@background.task("doubt_asked")
+def _doubt_asked(task):
+    """Bump the course's doubts_count and notify its teacher, exactly once per doubt."""
+    course_ref = db.collection("courses").document(task["course_id"])
+    course_doc = course_ref.get(field_paths=["title", "teacher_id"])
+    course_title = "Unknown Course"
+    teacher_id = None
+    batch = db.batch()
+    if course_doc.exists:
+        cd = course_doc.to_dict()
+        course_title = cd.get("title", course_title)
+        teacher_id = cd.get("teacher_id")
+        batch.update(course_ref, {"doubts_count": firestore.Increment(1)})
+
+    # The notification ID is derived from the doubt: if a retry finds it already
+    # created, the batch (and so the increment) was applied before.
+    batch.create(db.collection("notifications").document(f"doubt-{task['doubt_id']}"), {
+        "title": f"New doubt in {course_title}: \"{task['question'][:80]}...\"",
+        "type": "info",
+        "sender_uid": task["student_id"],
+        "sender_email": task["student_email"],
+        "target_uid": teacher_id,
+        "doubt_id": task["doubt_id"],
+        "course_id": task["course_id"],
+        "created_at": firestore.SERVER_TIMESTAMP,
+    })
+    try:
+        batch.commit()
+    except Exception as e:
+        if getattr(e, "code", None) != 409:  # AlreadyExists: done on an earlier attempt
+            raise
 
 
 @app.get("/courses/{course_id}/doubts")
@@ -748,12 +1245,13 @@ def get_course_doubts(course_id: str, student_id: str = Query(default=None)):
         doubts.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         return {"status": "success", "doubts": doubts}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 class ResolveDoubtRequest(BaseModel):
     token: str
     answer: str = ""
+    approve_ai_answer: bool = False  # publish the doubt_drafter.py draft as the answer
 
 @app.put("/doubts/{doubt_id}/resolve")
 def resolve_doubt(doubt_id: str, req: ResolveDoubtRequest):
@@ -763,8 +1261,7 @@ def resolve_doubt(doubt_id: str, req: ResolveDoubtRequest):
         uid = decoded["uid"]
 
         # Verify the user is admin/teacher
-        user_doc = db.collection("users").document(uid).get()
-        if not user_doc.exists or user_doc.to_dict().get("role") != "admin":
+        if _user_role(uid) != "admin":
             return {"status": "error", "message": "Unauthorized – admin only"}
 
         doubt_ref = db.collection("doubts").document(doubt_id)
@@ -775,11 +1272,37 @@ def resolve_doubt(doubt_id: str, req: ResolveDoubtRequest):
         update = {"status": "resolved", "resolved_at": firestore.SERVER_TIMESTAMP, "resolved_by": uid}
         if req.answer:
             update["faculty_answer"] = req.answer
+        draft = doubt_doc.to_dict().get("ai_answer")
+        if draft and req.approve_ai_answer:
+            update["ai_answer_status"] = "approved"
+            if not req.answer:
+                update["faculty_answer"] = draft
+        elif draft:
+            update["ai_answer_status"] = "replaced"
         doubt_ref.update(update)
+        doubt_index.remove(doubt_id)
 
+        student_dashboard.invalidate("doubts", doubt_doc.to_dict().get("student_id"))
         return {"status": "success"}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+# Firestore caps 'in' filters at 30 values
+IN_QUERY_LIMIT = 30
+
+# Fields the faculty doubt list renders
+ADMIN_DOUBT_FIELDS = ["course_id", "student_id", "student_email", "question", "status",
+                      "created_at", "ai_answer", "ai_answer_status"]
+
+
+# Open doubts per teacher, kept current by Firestore listeners (see doubt_queue.py)
+doubt_index = doubt_queue.DoubtIndex(db, ADMIN_DOUBT_FIELDS)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
 
 class AdminDoubtsRequest(BaseModel):
@@ -792,8 +1315,12 @@ def get_admin_doubts(req: AdminDoubtsRequest):
     try:
         decoded = auth.verify_id_token(req.token)
 
+        if doubt_index.ready():
+            return {"status": "success", "doubts": doubt_index.open_doubts(req.teacher_id)}
+
         # 1. Get all courses taught by this teacher
-        courses_query = db.collection("courses").where("teacher_id", "==", req.teacher_id).stream()
+        courses_query = (db.collection("courses").where("teacher_id", "==", req.teacher_id)
+                         .select(["title"]).stream())
         course_map = {}
         for c in courses_query:
             cd = c.to_dict()
@@ -802,14 +1329,15 @@ def get_admin_doubts(req: AdminDoubtsRequest):
         if not course_map:
             return {"status": "success", "doubts": []}
 
-        # 2. Get all open doubts and filter by teacher's courses
-        all_doubts = db.collection("doubts").where("status", "==", "open").stream()
+        # 2. Get open doubts for the teacher's courses only (chunked 'in' queries)
         doubts = []
-        for doc in all_doubts:
-            d = doc.to_dict()
-            if d.get("course_id") in course_map:
+        for chunk in _chunks(list(course_map), IN_QUERY_LIMIT):
+            query = (db.collection("doubts").where("status", "==", "open").where("course_id", "in", chunk)
+                     .select(ADMIN_DOUBT_FIELDS + ["priority"]))
+            for doc in query.stream():
+                d = doc.to_dict()
                 d["id"] = doc.id
-                d["course_title"] = course_map[d["course_id"]]
+                d["course_title"] = course_map.get(d.get("course_id"), "Unknown")
                 if d.get("created_at"):
                     d["created_at"] = d["created_at"].isoformat()
                 doubts.append(d)
@@ -818,9 +1346,29 @@ def get_admin_doubts(req: AdminDoubtsRequest):
         doubts.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         return {"status": "success", "doubts": doubts}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
+@app.post("/admin/doubts/next")
+def get_next_doubt(req: AdminDoubtsRequest):
+    """The open doubt this teacher should answer next: highest priority, then oldest."""
+    try:
+        auth.verify_id_token(req.token)
+        if doubt_index.ready():
+            return {"status": "success", "doubt": doubt_index.next(req.teacher_id)}
+
+        result = get_admin_doubts(req)
+        if not isinstance(result, dict) or result.get("status") != "success":
+            return result  # includes a 503 Response while Firestore is unavailable
+        doubts = result["doubts"]
+        return {"status": "success", "doubt": min(doubts, key=doubt_queue.priority_key, default=None)}
+    except Exception as e:
+        return resilience.error_response(e)
+
+
+# Fields the admin student table renders
+ADMIN_STUDENT_FIELDS = ["uid", "email", "profile.name", "profile.roll_number", "academic_stats", "created_at"]
+
 
 class AdminStudentsRequest(BaseModel):
     token: str
@@ -831,11 +1379,11 @@ def get_all_students(req: AdminStudentsRequest):
     try:
         decoded = auth.verify_id_token(req.token)
         # Verify admin
-        user_doc = db.collection("users").document(decoded["uid"]).get()
-        if not user_doc.exists or user_doc.to_dict().get("role") != "admin":
+        if _user_role(decoded["uid"]) != "admin":
              return {"status": "error", "message": "Unauthorized"}
         
-        docs = db.collection("users").where("role", "==", "student").stream()
+        docs = (db.collection("users").where("role", "==", "student")
+                .select(ADMIN_STUDENT_FIELDS).stream())
         students = []
         for doc in docs:
             d = doc.to_dict()
@@ -852,7 +1400,7 @@ def get_all_students(req: AdminStudentsRequest):
             
         return {"status": "success", "students": students}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 class BatchNotifyRequest(BaseModel):
@@ -862,33 +1410,47 @@ class BatchNotifyRequest(BaseModel):
     type: str = "info" # info, urgent, warning, success
 
 @app.post("/admin/notify/batch")
-def batch_notify(req: BatchNotifyRequest):
+def batch_notify(req: BatchNotifyRequest, idempotency_key: Optional[str] = Header(default=None)):
     """Send a notification to multiple students."""
+    return idempotency.run(idempotency_key, "/admin/notify/batch", req, lambda: _batch_notify(req))
+
+
+def _batch_notify(req: BatchNotifyRequest):
     try:
         decoded = auth.verify_id_token(req.token)
         # Verify admin
-        user_doc = db.collection("users").document(decoded["uid"]).get()
-        if not user_doc.exists or user_doc.to_dict().get("role") != "admin":
+        if _user_role(decoded["uid"]) != "admin":
              return {"status": "error", "message": "Unauthorized"}
         
-        batch = db.batch()
-        count = 0
-        for uid in req.student_ids:
-            ref = db.collection("notifications").document()
-            batch.set(ref, {
+        # IDs are picked now (client-side, no RPC) so a retried commit
+        # overwrites instead of duplicating; batches hold at most 500 writes.
+        notifications = db.collection("notifications")
+        targets = [[notifications.document().id, uid] for uid in req.student_ids]
+        for i in range(0, len(targets), 500):
+            background.enqueue("notify_batch", {
                 "title": req.title,
                 "type": req.type,
-                "target_uid": uid,
                 "sender_uid": decoded["uid"],
-                "created_at": firestore.SERVER_TIMESTAMP,
-                "read": False
+                "targets": targets[i:i + 500],
             })
-            count += 1
-            
-        batch.commit()
-        return {"status": "success", "count": count}
+        return {"status": "success", "count": len(targets)}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+@background.task("notify_batch")
+def _notify_batch(task):
+    batch = db.batch()
+    for notification_id, uid in task["targets"]:
+        batch.set(db.collection("notifications").document(notification_id), {
+            "title": task["title"],
+            "type": task["type"],
+            "target_uid": uid,
+            "sender_uid": task["sender_uid"],
+            "created_at": firestore.SERVER_TIMESTAMP,
+            "read": False
+        })
+    batch.commit()
 
 
 # ─── Quiz Generator ───────────────────────────────────────────────────────────
@@ -943,15 +1505,36 @@ class AdminStatsRequest(BaseModel):
     teacher_id: str
     token: str
 
+class UsageReportRequest(BaseModel):
+    token: str
+    scope: str = "student"  # or "course"
+    day: Optional[str] = None  # YYYY-MM-DD (UTC), default today
+    by: str = "total_tokens"  # any usage counter, e.g. "calls"
+    limit: int = 10
+
+
+@app.post("/admin/usage/top")
+def get_top_gemini_consumers(req: UsageReportRequest):
+    """Students or courses using the most Gemini tokens (or calls) on a day."""
+    try:
+        decoded = auth.verify_id_token(req.token)
+        if _user_role(decoded["uid"]) != "admin":
+            return {"status": "error", "message": "Unauthorized"}
+        if req.scope not in ("student", "course"):
+            return {"status": "error", "message": "scope must be 'student' or 'course'"}
+        top = usage_ledger.top(req.scope, req.day, max(1, min(req.limit, 100)), req.by)
+        return {"status": "success", "day": req.day or usage.today(), "scope": req.scope, "top": top}
+    except Exception as e:
+        return resilience.error_response(e)
+
+
 @app.post("/admin/stats")
 def get_admin_stats(req: AdminStatsRequest):
     try:
         decoded = auth.verify_id_token(req.token)
         
-        from firebase_config import db
-        
-        # 1. Active Courses
-        courses_query = db.collection("courses").where("teacher_id", "==", req.teacher_id).stream()
+        # 1. Active Courses (ids only)
+        courses_query = db.collection("courses").where("teacher_id", "==", req.teacher_id).select([]).stream()
         course_ids = []
         for c in courses_query:
             course_ids.append(c.id)
@@ -961,24 +1544,17 @@ def get_admin_stats(req: AdminStatsRequest):
         # 2. Total Students (Unique)
         student_uids = set()
         for cid in course_ids:
-            students = db.collection("courses").document(cid).collection("students").stream()
+            students = db.collection("courses").document(cid).collection("students").select([]).stream()
             for s in students:
                 student_uids.add(s.id)
         
         total_students_count = len(student_uids)
         
-        # 3. Unsolved Doubts
-        # Query doubts where course_id IN course_ids AND status == 'open'
-        # Firestore 'in' limit is 10. If > 10 courses, this simple query fails.
-        # Fallback: Query all 'open' doubts and filter in python (not scalable but works for prototype)
+        # 3. Unsolved Doubts: server-side count() per chunk of 30 course ids
         unsolved_doubts_count = 0
-        if course_ids:
-           # Optimization: If many courses, maybe query by course_id individually or rethink schema.
-           # For now, let's just count all doubts for these courses.
-           all_doubts = db.collection("doubts").where("status", "==", "open").stream()
-           for d in all_doubts:
-               if d.to_dict().get("course_id") in course_ids:
-                   unsolved_doubts_count += 1
+        for chunk in _chunks(course_ids, IN_QUERY_LIMIT):
+            query = db.collection("doubts").where("status", "==", "open").where("course_id", "in", chunk)
+            unsolved_doubts_count += int(query.count().get()[0][0].value)
 
         return {
             "total_students": total_students_count,
@@ -988,7 +1564,7 @@ def get_admin_stats(req: AdminStatsRequest):
             "avg_attendance": 85 
         }
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 # ─── Notifications ────────────────────────────────────────────────────────────
@@ -1000,15 +1576,18 @@ class NotificationCreateRequest(BaseModel):
 
 
 @app.post("/notifications")
-def create_notification(req: NotificationCreateRequest):
+def create_notification(req: NotificationCreateRequest, idempotency_key: Optional[str] = Header(default=None)):
     """Admin sends a notification to all students."""
+    return idempotency.run(idempotency_key, "/notifications", req, lambda: _create_notification(req))
+
+
+def _create_notification(req: NotificationCreateRequest):
     try:
         decoded = auth.verify_id_token(req.token)
         uid = decoded["uid"]
 
         # Verify sender is admin
-        user_doc = db.collection("users").document(uid).get()
-        if not user_doc.exists or user_doc.to_dict().get("role") != "admin":
+        if _user_role(uid) != "admin":
             return {"status": "error", "message": "Unauthorized – admin only"}
 
         if req.type not in ("urgent", "info", "success", "warning"):
@@ -1023,10 +1602,11 @@ def create_notification(req: NotificationCreateRequest):
         }
 
         _, doc_ref = db.collection("notifications").add(notif_data)
+        student_dashboard.invalidate("notifications")
         return {"status": "success", "id": doc_ref.id}
 
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 
 @app.get("/notifications")
@@ -1048,57 +1628,79 @@ def get_notifications(limit: int = 20):
             results.append(d)
         return {"status": "success", "notifications": results}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+# One Firestore listener per process feeds every connected client
+notifications_hub = notification_hub.Hub(db)
+
+
+@app.get("/notifications/stream")
+async def stream_notifications(request: Request, uid: str = "", last_event_id: Optional[str] = None):
+    """Server-Sent Events feed of new notifications for ``uid`` (broadcasts
+    plus those targeted at them). Reconnects resume from ``Last-Event-ID``."""
+    if notifications_hub.full():
+        return responses.FastJSONResponse({"status": "error", "message": "Too many live connections"},
+                                          status_code=503, headers={"Retry-After": "5"})
+    resume = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        notifications_hub.stream(uid, resume),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ─── Placement Preparation ────────────────────────────────────────────────────
 
+# Demo data, serialized and pre-compressed once
+PLACEMENT_DRIVES = responses.StaticJSON({"status": "success", "drives": [
+    {
+        "company": "Google",
+        "role": "SDE Intern",
+        "date": "March 5, 2026",
+        "location": "Bangalore, India",
+        "cgpa": "8.0+",
+        "status": "upcoming",
+    },
+    {
+        "company": "Amazon",
+        "role": "SDE-1",
+        "date": "March 12, 2026",
+        "location": "Hyderabad, India",
+        "cgpa": "7.0+",
+        "status": "upcoming",
+    },
+    {
+        "company": "Microsoft",
+        "role": "Software Engineer",
+        "date": "March 20, 2026",
+        "location": "Noida, India",
+        "cgpa": "7.5+",
+        "status": "upcoming",
+    },
+    {
+        "company": "Flipkart",
+        "role": "SDE Intern",
+        "date": "Feb 28, 2026",
+        "location": "Bangalore, India",
+        "cgpa": "7.0+",
+        "status": "ongoing",
+    },
+    {
+        "company": "Infosys",
+        "role": "Systems Engineer",
+        "date": "Feb 10, 2026",
+        "location": "Pune, India",
+        "cgpa": "6.0+",
+        "status": "completed",
+    },
+]})
+
+
 @app.get("/placement-drives")
-def get_placement_drives():
+def get_placement_drives(request: Request):
     """Return a list of upcoming placement drives (demo data)."""
-    drives = [
-        {
-            "company": "Google",
-            "role": "SDE Intern",
-            "date": "March 5, 2026",
-            "location": "Bangalore, India",
-            "cgpa": "8.0+",
-            "status": "upcoming",
-        },
-        {
-            "company": "Amazon",
-            "role": "SDE-1",
-            "date": "March 12, 2026",
-            "location": "Hyderabad, India",
-            "cgpa": "7.0+",
-            "status": "upcoming",
-        },
-        {
-            "company": "Microsoft",
-            "role": "Software Engineer",
-            "date": "March 20, 2026",
-            "location": "Noida, India",
-            "cgpa": "7.5+",
-            "status": "upcoming",
-        },
-        {
-            "company": "Flipkart",
-            "role": "SDE Intern",
-            "date": "Feb 28, 2026",
-            "location": "Bangalore, India",
-            "cgpa": "7.0+",
-            "status": "ongoing",
-        },
-        {
-            "company": "Infosys",
-            "role": "Systems Engineer",
-            "date": "Feb 10, 2026",
-            "location": "Pune, India",
-            "cgpa": "6.0+",
-            "status": "completed",
-        },
-    ]
-    return {"status": "success", "drives": drives}
+    return PLACEMENT_DRIVES.response(request)
 
 
 class PlacementProgressRequest(BaseModel):
@@ -1109,44 +1711,116 @@ class PlacementProgressRequest(BaseModel):
     streak: int = 0
 
 
+# Coalesces placement-progress writes per student (see placement.py)
+placement_buffer = placement.WriteBehind(db)
+
+
 @app.post("/placement-progress")
 def save_placement_progress(req: PlacementProgressRequest):
     """Save or retrieve placement preparation progress for a student."""
     try:
-        doc_ref = db.collection("placement_progress").document(req.student_id)
-
         if req.topic_progress or req.daily_goals or req.company_checks:
-            # Save progress
-            doc_ref.set({
+            # Save progress (buffered; flushed in the background)
+            placement_buffer.patch(req.student_id, {
                 "topic_progress": req.topic_progress,
                 "daily_goals": req.daily_goals,
                 "company_checks": req.company_checks,
-                "streak": req.streak,
-                "updated_at": firestore.SERVER_TIMESTAMP,
-            }, merge=True)
+            }, streak=req.streak)
+            student_dashboard.invalidate("placement", req.student_id)
             return {"status": "success", "message": "Progress saved"}
         else:
-            # Retrieve progress
-            doc = doc_ref.get()
-            if doc.exists:
-                data = doc.to_dict()
+            # Retrieve progress, including changes not yet flushed
+            data = placement_buffer.read(req.student_id)
+            if data:
                 if "updated_at" in data and data["updated_at"]:
                     data["updated_at"] = str(data["updated_at"])
                 return {"status": "success", "data": data}
             return {"status": "success", "data": {}}
 
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+class PlacementProgressPatch(BaseModel):
+    # Only the keys that changed; a null value removes the key
+    topic_progress: dict = {}
+    daily_goals: dict = {}
+    company_checks: dict = {}
+    streak: Optional[int] = None    # absolute value
+    streak_increment: int = 0       # applied atomically
+
+
+@app.patch("/placement-progress/{student_id}")
+def patch_placement_progress(student_id: str, req: PlacementProgressPatch):
+    """Apply a delta to a student's placement progress."""
+    try:
+        placement_buffer.patch(student_id, {
+            "topic_progress": req.topic_progress,
+            "daily_goals": req.daily_goals,
+            "company_checks": req.company_checks,
+        }, streak=req.streak, streak_increment=req.streak_increment)
+        student_dashboard.invalidate("placement", student_id)
+        return {"status": "success"}
+    except Exception as e:
+        return resilience.error_response(e)
+
+
+# ─── Student Dashboard ────────────────────────────────────────────────────────
+# One request instead of five-plus round trips: every section is read
+# concurrently, so the load is bounded by the slowest single read.
+
+def _enrolled_course_ids(uid):
+    docs = db.collection("users").document(uid).collection("enrolled_courses").select([]).stream()
+    return {"course_ids": [doc.id for doc in docs]}
+
+
+def _student_doubts(uid):
+    # One query on student_id instead of one per enrolled course.
+    by_course = {}
+    for doc in db.collection("doubts").where("student_id", "==", uid).stream():
+        d = doc.to_dict()
+        d["id"] = doc.id
+        if d.get("created_at"):
+            d["created_at"] = d["created_at"].isoformat()
+        by_course.setdefault(d.get("course_id"), []).append(d)
+    for doubts in by_course.values():
+        doubts.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+    return {"by_course": by_course}
+
+
+student_dashboard = dashboard.Dashboard([
+    dashboard.Section("profile", get_student_profile, dashboard.ttl("profile", 30)),
+    dashboard.Section("courses", lambda uid: get_courses(), dashboard.ttl("courses", 60), shared=True),
+    dashboard.Section("enrolled", _enrolled_course_ids, dashboard.ttl("enrolled", 30)),
+    dashboard.Section("notifications", lambda uid: get_notifications(), dashboard.ttl("notifications", 15), shared=True),
+    dashboard.Section("placement", lambda uid: save_placement_progress(PlacementProgressRequest(student_id=uid)),
+                      dashboard.ttl("placement", 30)),
+    dashboard.Section("doubts", _student_doubts, dashboard.ttl("doubts", 15)),
+])
+
+
+@app.get("/student/{uid}/dashboard")
+def get_student_dashboard(uid: str, sections: Optional[str] = None):
+    """Profile, courses, enrollments, notifications, placement progress and
+    doubts in one payload. Slow sections come back as ``timeout`` (or stale
+    from cache) instead of holding up the rest; ``sections`` is an optional
+    comma-separated subset."""
+    only = set(sections.split(",")) if sections else None
+    return student_dashboard.load(uid, only)
 
 
 # ─── System Settings ──────────────────────────────────────────────────────────
 
 @app.get("/admin/settings")
 def get_system_settings():
-    try:
+    def load():
         doc = db.collection("system").document("settings").get()
-        if doc.exists:
-            return {"status": "success", "settings": doc.to_dict()}
+        return doc.to_dict() if doc.exists else None
+    try:
+        # Invalidated by system_settings.invalidate() on every update
+        stored = cache.shared.get_or_load("settings:doc", system_settings.CACHE_TTL, load)
+        if stored is not None:
+            return {"status": "success", "settings": stored}
         else:
             # Return defaults
             defaults = {
@@ -1157,7 +1831,7 @@ def get_system_settings():
             }
             return {"status": "success", "settings": defaults}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
 
 class SystemSettingsRequest(BaseModel):
     token: str
@@ -1165,25 +1839,94 @@ class SystemSettingsRequest(BaseModel):
     exam_mode: bool
     attendance_threshold: float
     cgpa_threshold: float
+    rate_limits: Optional[system_settings.RateLimits] = None  # see system_settings.DEFAULTS["rate_limits"]
 
 @app.post("/admin/settings")
 def update_system_settings(req: SystemSettingsRequest):
     try:
         decoded = auth.verify_id_token(req.token)
         # Verify admin
-        user_doc = db.collection("users").document(decoded["uid"]).get()
-        if not user_doc.exists or user_doc.to_dict().get("role") != "admin":
+        if _user_role(decoded["uid"]) != "admin":
              return {"status": "error", "message": "Unauthorized"}
             
-        db.collection("system").document("settings").set({
+        # Fresh read of the thresholds in force before this change
+        system_settings.invalidate()
+        previous = system_settings.get_settings()
+
+        update = {
             "maintenance_mode": req.maintenance_mode,
             "exam_mode": req.exam_mode,
             "attendance_threshold": req.attendance_threshold,
             "cgpa_threshold": req.cgpa_threshold,
             "updated_at": firestore.SERVER_TIMESTAMP,
             "updated_by": decoded["uid"]
-        }, merge=True)
-        
-        return {"status": "success"}
+        }
+        if req.rate_limits is not None:
+            update["rate_limits"] = req.rate_limits.model_dump(exclude_unset=True)
+        db.collection("system").document("settings").set(update, merge=True)
+        system_settings.invalidate()
+
+        # Stored risk_status values are stale once a threshold moves
+        response = {"status": "success"}
+        if (req.attendance_threshold != previous["attendance_threshold"]
+                or req.cgpa_threshold != previous["cgpa_threshold"]):
+            job = risk_engine.start(db, req.attendance_threshold, req.cgpa_threshold,
+                                    on_changed=_risk_status_changed)
+            response["risk_recompute"] = job.status()
+        return response
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return resilience.error_response(e)
+
+
+def _risk_status_changed(uids):
+    """Drop cached profiles whose risk_status the recompute just rewrote."""
+    cache.shared.invalidate(*(f"profile:{uid}" for uid in uids))
+    for uid in uids:
+        student_dashboard.invalidate("profile", uid)
+
+
+# ─── Cohort Analytics ─────────────────────────────────────────────────────────
+
+class AnalyticsRequest(BaseModel):
+    token: str
+    branch: Optional[str] = None
+    year: Optional[int] = None
+    weeks: int = 8
+
+@app.post("/admin/analytics")
+def get_admin_analytics(req: AnalyticsRequest):
+    """Cohort distributions, risk breakdowns and course trends from the local snapshot."""
+    try:
+        decoded = auth.verify_id_token(req.token)
+        if _user_role(decoded["uid"]) != "admin":
+            return {"status": "error", "message": "Unauthorized"}
+
+        snapshot = analytics.current()
+        if snapshot is None:
+            analytics.export_in_background(db)  # no-op while an export is already running
+            return {"status": "pending", "message": "Analytics snapshot is being built. Try again shortly."}
+
+        settings = system_settings.get_settings()
+        start = time.perf_counter()
+        result = analytics.compute(snapshot, settings["attendance_threshold"], settings["cgpa_threshold"],
+                                   branch=req.branch, year=req.year, weeks=max(1, min(req.weeks, 52)))
+        result["snapshot"] = {k: snapshot.meta[k] for k in ("mode", "exported_at", "rows")}
+        result["compute_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return {"status": "success", "analytics": result}
+    except Exception as e:
+        return resilience.error_response(e)
+
+
+@app.get("/admin/risk-recompute")
+def get_risk_recompute_status(token: str):
+    """Progress of the latest cohort risk recomputation in this process."""
+    try:
+        decoded = auth.verify_id_token(token)
+        if _user_role(decoded["uid"]) != "admin":
+            return {"status": "error", "message": "Unauthorized"}
+        return {"status": "success", "job": risk_engine.status()}
+    except Exception as e:
+        return resilience.error_response(e)
+
+
+STARTUP["import_s"] = time.perf_counter() - _import_started
@@ -0,0 +1,481 @@
+"""
+metrics.py — Prometheus-format metrics for the Manan API
+
+Counters and histograms are sharded per thread: the hot path only touches a
+thread-local dict, so recording never takes a lock. A scrape of /metrics sums
+the shards. Three sources feed the registry:
+
+* ``MetricsMiddleware`` — latency and status per route template.
+* ``instrument_firestore`` — wraps the Firestore client and counts reads,
+  writes and deletes per request (and globally per route).
+* ``observe_gemini`` — called by gemini.py for latency, tokens and errors.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+OPS_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 5000, 25000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # list.append is atomic; shards are never removed
+
+    def _shard(self):
+        try:
+            return self._local.data
+        except AttributeError:
+            data = self._local.data = {}
+            self._shards.append(data)
+            return data
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self):
+        totals = {}
+        for shard in list(self._shards):
+            for key, value in dict(shard).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [per-bucket counts..., +Inf count, sum]
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def collect(self):
+        totals = {}
+        for shard in list(self._shards):
+            for key, state in dict(shard).items():
+                state = list(state)
+                acc = totals.get(key)
+                totals[key] = state if acc is None else [a + b for a, b in zip(acc, state)]
+        return totals
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, state in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), state[:-1]):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {state[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics():
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = _register(Counter(
+    "manan_http_requests_total", "HTTP requests by route template, method and status.",
+    ("route", "method", "status")))
+HTTP_LATENCY = _register(Histogram(
+    "manan_http_request_duration_seconds", "HTTP request latency.",
+    ("route", "method", "status")))
+FIRESTORE_OPS = _register(Counter(
+    "manan_firestore_operations_total", "Billed Firestore operations (reads = documents returned).",
+    ("route", "op")))
+FIRESTORE_READS_PER_REQUEST = _register(Histogram(
+    "manan_firestore_reads_per_request", "Firestore document reads per HTTP request.",
+    ("route",), OPS_BUCKETS))
+FIRESTORE_WRITES_PER_REQUEST = _register(Histogram(
+    "manan_firestore_writes_per_request", "Firestore writes and deletes per HTTP request.",
+    ("route",), OPS_BUCKETS))
+GEMINI_REQUESTS = _register(Counter(
+    "manan_gemini_requests_total", "Gemini calls by model and outcome.", ("model", "outcome")))
+GEMINI_LATENCY = _register(Histogram(
+    "manan_gemini_request_duration_seconds", "Gemini call latency.", ("model",)))
+GEMINI_TOKENS = _register(Counter(
+    "manan_gemini_tokens_total", "Gemini tokens by model and kind (prompt/output).", ("model", "kind")))
+DEPENDENCY_REJECTIONS = _register(Counter(
+    "manan_dependency_rejections_total", "Calls not attempted (breaker open or budget spent).",
+    ("dependency", "reason")))
+BREAKER_TRANSITIONS = _register(Counter(
+    "manan_circuit_breaker_transitions_total", "Circuit breaker state changes.", ("dependency", "state")))
+
+
+# ─── Request Context ──────────────────────────────────────────────────────────
+
+class RequestStats:
+    """Per-request Firestore counters, shared with threadpool handlers."""
+    __slots__ = ("reads", "writes", "deletes")
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+
+
+_current = contextvars.ContextVar("manan_request_stats", default=None)
+
+
+def current_stats():
+    return _current.get()
+
+
+def _route_label(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and Firestore ops per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route = _route_label(scope)
+            labels = (route, scope["method"], str(status))
+            HTTP_REQUESTS.inc(labels)
+            HTTP_LATENCY.observe(labels, elapsed)
+            FIRESTORE_READS_PER_REQUEST.observe((route,), stats.reads)
+            FIRESTORE_WRITES_PER_REQUEST.observe((route,), stats.writes + stats.deletes)
+            if stats.reads:
+                FIRESTORE_OPS.inc((route, "read"), stats.reads)
+            if stats.writes:
+                FIRESTORE_OPS.inc((route, "write"), stats.writes)
+            if stats.deletes:
+                FIRESTORE_OPS.inc((route, "delete"), stats.deletes)
+
+
+# ─── Firestore Instrumentation ────────────────────────────────────────────────
+# Hooks receive (op, path, docs, seconds) for every Firestore call; op is one of
+# "get", "stream", "count", "set", "update", "create", "delete", "add", "commit".
+
+FIRESTORE_HOOKS = []
+
+# Optional context manager factory guard(op, kwargs) entered around every
+# Firestore RPC; it may add call options to kwargs or refuse the call by
+# raising (resilience.py installs one).
+FIRESTORE_GUARD = None
+
+_WRITE_OPS = {"set", "update", "create", "add"}
+
+
+def _guard(op, kwargs):
+    return FIRESTORE_GUARD(op, kwargs) if FIRESTORE_GUARD is not None else contextlib.nullcontext()
+
+
+def _record(op, path, docs, seconds):
+    stats = _current.get()
+    if op == "delete":
+        if stats is not None:
+            stats.deletes += 1
+        else:
+            FIRESTORE_OPS.inc(("background", "delete"))
+    elif op in _WRITE_OPS or op == "commit":
+        n = docs if op == "commit" else 1
+        if stats is not None:
+            stats.writes += n
+        else:
+            FIRESTORE_OPS.inc(("background", "write"), n)
+    else:
+        n = max(1, docs)  # an empty query is still billed one read
+        if stats is not None:
+            stats.reads += n
+        else:
+            FIRESTORE_OPS.inc(("background", "read"), n)
+    for hook in FIRESTORE_HOOKS:
+        hook(op, path, docs, seconds)
+
+
+def _unwrap(obj):
+    return getattr(obj, "_wrapped", obj)
+
+
+def _path_of(obj):
+    """Collection path of a CollectionReference or Query."""
+    parts = getattr(obj, "_path", None)
+    if parts is None and getattr(obj, "_parent", None) is not None:
+        parts = getattr(obj._parent, "_path", None)
+    if isinstance(parts, tuple):
+        return "/".join(parts)
+    return parts or getattr(obj, "path", None) or getattr(obj, "id", "?")
+
+
+class _Proxy:
+    __slots__ = ("_wrapped",)
+
+    def __init__(self, wrapped):
+        object.__setattr__(self, "_wrapped", wrapped)
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def __repr__(self):
+        return f"<instrumented {self._wrapped!r}>"
+
+
+class _Snapshot(_Proxy):
+    __slots__ = ()
+
+    @property
+    def reference(self):
+        return _DocumentRef(self._wrapped.reference)
+
+
+class _Aggregation(_Proxy):
+    __slots__ = ("_path",)
+
+    def __init__(self, wrapped, path):
+        super().__init__(wrapped)
+        object.__setattr__(self, "_path", path)
+
+    def get(self, *args, **kwargs):
+        start = time.perf_counter()
+        with _guard("count", kwargs):
+            result = self._wrapped.get(*args, **kwargs)
+        _record("count", self._path, 1, time.perf_counter() - start)
+        return result
+
+
+class _Query(_Proxy):
+    __slots__ = ("_path",)
+
+    def __init__(self, wrapped, path=None):
+        super().__init__(wrapped)
+        object.__setattr__(self, "_path", path or _path_of(wrapped))
+
+    def _chain(self, name):
+        method = getattr(self._wrapped, name)
+
+        def call(*args, **kwargs):
+            return _Query(method(*args, **kwargs), self._path)
+        return call
+
+    def __getattr__(self, name):
+        if name in ("where", "order_by", "limit", "limit_to_last", "offset", "select",
+                    "start_at", "start_after", "end_at", "end_before"):
+            return self._chain(name)
+        return getattr(self._wrapped, name)
+
+    def stream(self, *args, **kwargs):
+        start = time.perf_counter()
+        n = 0
+        with _guard("stream", kwargs):
+            try:
+                for snap in self._wrapped.stream(*args, **kwargs):
+                    n += 1
+                    yield _Snapshot(snap)
+            finally:
+                _record("stream", self._path, n, time.perf_counter() - start)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+    def count(self, *args, **kwargs):
+        return _Aggregation(self._wrapped.count(*args, **kwargs), self._path)
+
+
+class _CollectionRef(_Query):
+    __slots__ = ()
+
+    def document(self, *args, **kwargs):
+        return _DocumentRef(self._wrapped.document(*args, **kwargs))
+
+    def add(self, *args, **kwargs):
+        start = time.perf_counter()
+        with _guard("add", kwargs):
+            update_time, ref = self._wrapped.add(*args, **kwargs)
+        _record("add", self._path, 1, time.perf_counter() - start)
+        return update_time, _DocumentRef(ref)
+
+
+class _DocumentRef(_Proxy):
+    __slots__ = ()
+
+    def get(self, *args, **kwargs):
+        start = time.perf_counter()
+        with _guard("get", kwargs):
+            snap = self._wrapped.get(*args, **kwargs)
+        _record("get", self._wrapped.path, 1, time.perf_counter() - start)
+        return _Snapshot(snap)
+
+    def _write(self, op, *args, **kwargs):
+        start = time.perf_counter()
+        with _guard(op, kwargs):
+            result = getattr(self._wrapped, op)(*args, **kwargs)
+        _record(op, self._wrapped.path, 1, time.perf_counter() - start)
+        return result
+
+    def set(self, *args, **kwargs):
+        return self._write("set", *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._write("update", *args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        return self._write("create", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write("delete", *args, **kwargs)
+
+    def collection(self, *args, **kwargs):
+        return _CollectionRef(self._wrapped.collection(*args, **kwargs))
+
+    @property
+    def parent(self):
+        return _CollectionRef(self._wrapped.parent)
+
+
+class _WriteBatch(_Proxy):
+    __slots__ = ("_count",)
+
+    def __init__(self, wrapped):
+        super().__init__(wrapped)
+        object.__setattr__(self, "_count", 0)
+
+    def _queue(self, name, reference, *args, **kwargs):
+        object.__setattr__(self, "_count", self._count + 1)
+        return getattr(self._wrapped, name)(_unwrap(reference), *args, **kwargs)
+
+    def set(self, reference, *args, **kwargs):
+        return self._queue("set", reference, *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._queue("update", reference, *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        return self._queue("create", reference, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._queue("delete", reference, *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        start = time.perf_counter()
+        with _guard("commit", kwargs):
+            result = self._wrapped.commit(*args, **kwargs)
+        _record("commit", "batch", self._count, time.perf_counter() - start)
+        object.__setattr__(self, "_count", 0)
+        return result
+
+
+class InstrumentedClient(_Proxy):
+    """Firestore client proxy that records every read and write."""
+    __slots__ = ()
+
+    def collection(self, *args, **kwargs):
+        return _CollectionRef(self._wrapped.collection(*args, **kwargs))
+
+    def collection_group(self, *args, **kwargs):
+        return _Query(self._wrapped.collection_group(*args, **kwargs))
+
+    def document(self, *args, **kwargs):
+        return _DocumentRef(self._wrapped.document(*args, **kwargs))
+
+    def batch(self, *args, **kwargs):
+        return _WriteBatch(self._wrapped.batch(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        refs = [_unwrap(r) for r in references]
+        start = time.perf_counter()
+        n = 0
+        with _guard("get_all", kwargs):
+            try:
+                for snap in self._wrapped.get_all(refs, *args, **kwargs):
+                    n += 1
+                    yield _Snapshot(snap)
+            finally:
+                _record("get_all", refs[0].parent.path if refs else "?", n, time.perf_counter() - start)
+
+
+def instrument_firestore(client):
+    """Wrap ``client`` so its operations are counted (idempotent)."""
+    if isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+
+# ─── Gemini ───────────────────────────────────────────────────────────────────
+
+def observe_gemini(model, seconds, usage=None, error=None):
+    """Record one Gemini call; ``usage`` is the SDK's ``usage_metadata``."""
+    GEMINI_REQUESTS.inc((model, "error" if error else "ok"))
+    GEMINI_LATENCY.observe((model,), seconds)
+    if usage is not None:
+        prompt = getattr(usage, "prompt_token_count", None) or 0
+        output = getattr(usage, "candidates_token_count", None) or 0
+        if prompt:
+            GEMINI_TOKENS.inc((model, "prompt"), prompt)
+        if output:
+            GEMINI_TOKENS.inc((model, "output"), output)
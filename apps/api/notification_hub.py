@@ -0,0 +1,238 @@
+"""
+notification_hub.py — Server-sent notification push
+
+Each API process keeps ONE Firestore snapshot listener on ``notifications``
+(started with the first connected client) and fans new notifications out in
+memory to its Server-Sent Events clients:
+
+* Notifications with a ``target_uid`` go only to that user; the rest are
+  broadcasts.
+* Every event is serialized once into an SSE frame and shared by all clients.
+* Event IDs are ``<created_at ms>-<doc id>``, so a reconnecting client's
+  ``Last-Event-ID`` works on any process: recent events replay from an
+  in-memory ring, older ones with one Firestore query.
+* Backpressure: a client more than ``NOTIFY_STREAM_MAX_QUEUE`` events behind
+  is disconnected and resumes via ``Last-Event-ID`` on reconnect, instead of
+  buffering without bound.
+* Idle connections get a comment heartbeat every ``NOTIFY_STREAM_HEARTBEAT_S``
+  seconds so proxies keep them open and dead clients are noticed.
+
+Configuration (environment):
+    NOTIFY_STREAM_RING            recent events kept for resume (default 1000)
+    NOTIFY_STREAM_MAX_QUEUE       events buffered per client (default 100)
+    NOTIFY_STREAM_HEARTBEAT_S     idle heartbeat interval (default 15)
+    NOTIFY_STREAM_MAX_CLIENTS     connections per process (default 5000)
+"""
+
+import asyncio
+import bisect
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from fastapi.concurrency import run_in_threadpool
+
+import responses
+
+RING_SIZE = int(os.getenv("NOTIFY_STREAM_RING", "1000"))
+MAX_QUEUE = int(os.getenv("NOTIFY_STREAM_MAX_QUEUE", "100"))
+HEARTBEAT_S = float(os.getenv("NOTIFY_STREAM_HEARTBEAT_S", "15"))
+MAX_CLIENTS = int(os.getenv("NOTIFY_STREAM_MAX_CLIENTS", "5000"))
+
+# How far back the listener's initial snapshot reaches (fills the ring).
+REPLAY_WINDOW = timedelta(hours=24)
+
+HEARTBEAT = b": ping\n\n"
+RETRY = b"retry: 3000\n\n"
+
+
+def _ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def parse_event_id(event_id):
+    """``(ms, doc_id)`` for an event ID, or None if it's malformed."""
+    ms, _, doc_id = (event_id or "").partition("-")
+    if not ms.isdigit() or not doc_id:
+        return None
+    return int(ms), doc_id
+
+
+class Event:
+    __slots__ = ("key", "id", "target", "frame")
+
+    def __init__(self, doc, fallback_time):
+        d = doc.to_dict()
+        created = d.get("created_at") or fallback_time
+        self.key = (_ms(created), doc.id)
+        self.id = f"{self.key[0]}-{doc.id}"
+        self.target = d.get("target_uid")
+        d["id"] = doc.id
+        d["created_at"] = created.isoformat()
+        self.frame = b"id: %s\nevent: notification\ndata: %s\n\n" % (
+            self.id.encode(), responses.dumps(d))
+
+    def visible_to(self, uid):
+        return self.target is None or self.target == uid
+
+
+class Subscriber:
+    def __init__(self, uid, max_queue):
+        self.uid = uid
+        self.max_queue = max_queue
+        self.queue = asyncio.Queue()
+        self.dropped = False
+
+    def offer(self, event):
+        # Runs on the event loop. None wakes the stream to disconnect.
+        if self.dropped:
+            return
+        if self.queue.qsize() >= self.max_queue:
+            self.dropped = True
+            self.queue.put_nowait(None)
+        else:
+            self.queue.put_nowait(event)
+
+
+class Hub:
+    def __init__(self, db, ring_size=RING_SIZE, max_queue=MAX_QUEUE, heartbeat=HEARTBEAT_S,
+                 max_clients=MAX_CLIENTS, collection="notifications"):
+        self.db = db
+        self.ring_size = ring_size
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.collection = collection
+        self._ring = []  # Events sorted by key
+        self._ring_full = False  # True once events have been trimmed off the front
+        self._subscribers = set()
+        self._loop = None
+        self._watch = None
+        self._since = None
+        self._ready = threading.Event()  # set once the initial snapshot is in the ring
+        self._lock = threading.Lock()
+        self.stats = {"events": 0, "delivered": 0, "dropped_clients": 0}
+
+    # ── Listener ──────────────────────────────────────────────────────────────
+
+    def start(self):
+        with self._lock:
+            if self._watch is not None:
+                return
+            since = datetime.now(timezone.utc) - REPLAY_WINDOW
+            self._since = (_ms(since), "")
+            self._ready.clear()
+            query = self.db.collection(self.collection).where("created_at", ">=", since)
+            self._watch = True  # claim before the initial snapshot calls back
+        try:
+            watch = query.on_snapshot(self._on_snapshot)
+        except Exception:
+            with self._lock:
+                self._watch = None
+            raise
+        with self._lock:
+            self._watch = watch
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Runs on the listener thread.
+        events = sorted((Event(c.document, read_time) for c in changes if c.type.name == "ADDED"),
+                        key=lambda e: e.key)
+        initial = not self._ready.is_set()
+        with self._lock:
+            for event in events:
+                if not self._ring or event.key > self._ring[-1].key:
+                    self._ring.append(event)
+                else:
+                    bisect.insort(self._ring, event, key=lambda e: e.key)
+            if len(self._ring) > self.ring_size:
+                del self._ring[:len(self._ring) - self.ring_size]
+                self._ring_full = True
+            self.stats["events"] += len(events)
+            loop = self._loop
+        self._ready.set()
+        # The initial snapshot is history for resume, not news to push.
+        if events and not initial and loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._deliver, events)
+
+    def _deliver(self, events):
+        for sub in list(self._subscribers):
+            for event in events:
+                if event.visible_to(sub.uid):
+                    sub.offer(event)
+                    self.stats["delivered"] += 1
+
+    # ── Clients ───────────────────────────────────────────────────────────────
+
+    def full(self):
+        return len(self._subscribers) >= self.max_clients
+
+    async def subscribe(self, uid):
+        self._loop = asyncio.get_running_loop()
+        if self._watch is None:
+            await run_in_threadpool(self.start)
+        sub = Subscriber(uid, self.max_queue)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self._subscribers.discard(sub)
+
+    def clients(self):
+        return len(self._subscribers)
+
+    def replay(self, last_event_id, uid):
+        """Events after ``last_event_id`` visible to ``uid``, oldest first."""
+        key = parse_event_id(last_event_id)
+        if key is None:
+            return []
+        in_memory = self._ready.wait(5) and self._watch is not None
+        with self._lock:
+            ring = list(self._ring)
+            if in_memory:
+                in_memory = key >= self._since and (not self._ring_full or key >= ring[0].key)
+        if in_memory:
+            start = bisect.bisect_right(ring, key, key=lambda e: e.key)
+            return [e for e in ring[start:] if e.visible_to(uid)]
+        # Older than anything in memory: one query (up to ring_size events)
+        # bridges the gap to the ring, filtered here.
+        since = datetime.fromtimestamp(key[0] / 1000, timezone.utc)
+        docs = (self.db.collection(self.collection)
+                .where("created_at", ">=", since)
+                .order_by("created_at")
+                .limit(self.ring_size)
+                .stream())
+        now = datetime.now(timezone.utc)
+        events = {e.id: e for e in (Event(doc, now) for doc in docs)}
+        if self._ready.is_set():
+            events.update((e.id, e) for e in ring)
+        return sorted((e for e in events.values() if e.key > key and e.visible_to(uid)), key=lambda e: e.key)
+
+    async def stream(self, uid, last_event_id=None):
+        """SSE byte stream for one client; the caller wraps it in a StreamingResponse."""
+        sub = await self.subscribe(uid)
+        try:
+            yield RETRY
+            replayed = set()
+            if last_event_id:
+                for event in await run_in_threadpool(self.replay, last_event_id, uid):
+                    replayed.add(event.id)
+                    yield event.frame
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                if event is None:  # too far behind: reconnect and resume
+                    self.stats["dropped_clients"] += 1
+                    return
+                if event.id not in replayed:  # may already have gone out in the replay
+                    yield event.frame
+        finally:
+            self.unsubscribe(sub)
+
+    def close(self):
+        with self._lock:
+            watch, self._watch = self._watch, None
+        if watch not in (None, True):
+            watch.unsubscribe()
@@ -0,0 +1,209 @@
+"""
+placement.py — Write-behind buffer for placement-prep progress
+
+The placement page saves on every checkbox click. Instead of rewriting the
+whole ``placement_progress/{student_id}`` document each time, handlers hand
+``WriteBehind.patch`` only the keys that changed. Patches are coalesced per
+student in memory and written as one ``set(..., merge=True)`` per student
+per flush, batched up to ``BATCH_SIZE`` documents per commit.
+
+* ``topic_progress`` / ``daily_goals`` / ``company_checks`` deltas are merged
+  key by key; a ``None`` value deletes the key.
+* ``streak_increment`` accumulates and is written as ``firestore.Increment``,
+  so concurrent writers never lose a bump. An absolute ``streak`` replaces
+  whatever was accumulated before it.
+* ``read`` overlays the buffered state on the stored document, so a student
+  sees their own unflushed changes (within the process that buffered them).
+* A failed commit puts its entries back under any newer patches.
+
+Configuration (environment):
+    PLACEMENT_FLUSH_INTERVAL  seconds between flushes (default 2; 0 writes
+                              through on every patch)
+    PLACEMENT_MAX_PENDING     students buffered before an early flush (default 5000)
+"""
+
+import os
+import threading
+
+from firebase_config import firestore
+
+FLUSH_INTERVAL = float(os.getenv("PLACEMENT_FLUSH_INTERVAL", "2"))
+MAX_PENDING = int(os.getenv("PLACEMENT_MAX_PENDING", "5000"))
+
+MAPS = ("topic_progress", "daily_goals", "company_checks")
+
+# Firestore caps a batch at 500 writes
+BATCH_SIZE = 500
+
+
+def _entry():
+    return {"maps": {}, "streak": None, "streak_increment": 0}
+
+
+def _combine(older, newer):
+    """``newer`` applied on top of ``older`` (both pending entries)."""
+    out = _entry()
+    for name in set(older["maps"]) | set(newer["maps"]):
+        out["maps"][name] = {**older["maps"].get(name, {}), **newer["maps"].get(name, {})}
+    if newer["streak"] is not None:
+        out["streak"], out["streak_increment"] = newer["streak"], newer["streak_increment"]
+    else:
+        out["streak"] = older["streak"]
+        out["streak_increment"] = older["streak_increment"] + newer["streak_increment"]
+    return out
+
+
+def _document(entry):
+    """The merge-set payload for one pending entry."""
+    doc = {name: {k: firestore.DELETE_FIELD if v is None else v for k, v in changes.items()}
+           for name, changes in entry["maps"].items() if changes}
+    if entry["streak"] is not None:
+        doc["streak"] = entry["streak"] + entry["streak_increment"]
+    elif entry["streak_increment"]:
+        doc["streak"] = firestore.Increment(entry["streak_increment"])
+    doc["updated_at"] = firestore.SERVER_TIMESTAMP
+    return doc
+
+
+def _overlay(data, entries):
+    for entry in entries:
+        for name, changes in entry["maps"].items():
+            current = dict(data.get(name) or {})
+            for key, value in changes.items():
+                if value is None:
+                    current.pop(key, None)
+                else:
+                    current[key] = value
+            data[name] = current
+        if entry["streak"] is not None:
+            data["streak"] = entry["streak"] + entry["streak_increment"]
+        elif entry["streak_increment"]:
+            data["streak"] = (data.get("streak") or 0) + entry["streak_increment"]
+    return data
+
+
+class WriteBehind:
+    def __init__(self, db, interval=FLUSH_INTERVAL, max_pending=MAX_PENDING, collection="placement_progress"):
+        self.db = db
+        self.interval = interval
+        self.max_pending = max_pending
+        self.collection = collection
+        self._pending = {}   # student_id → entry
+        self._flushing = {}  # entries swapped out by the flush in progress
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"patches": 0, "flushes": 0, "writes": 0, "failures": 0}
+
+    def _ref(self, student_id):
+        return self.db.collection(self.collection).document(student_id)
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def patch(self, student_id, changes=None, streak=None, streak_increment=0):
+        """Buffer a delta. ``changes`` maps each of MAPS to ``{key: value}``."""
+        entry = _entry()
+        for name, delta in (changes or {}).items():
+            if name not in MAPS:
+                raise ValueError(f"Unknown progress field: {name}")
+            if delta:
+                entry["maps"][name] = dict(delta)
+        entry["streak"] = streak
+        entry["streak_increment"] = streak_increment
+        with self._lock:
+            current = self._pending.get(student_id)
+            self._pending[student_id] = entry if current is None else _combine(current, entry)
+            self.stats["patches"] += 1
+            backlog = len(self._pending)
+        if self.interval <= 0 or self._thread is None and self._stop.is_set():
+            self.flush()
+        elif backlog >= self.max_pending:
+            self._wake.set()
+
+    def flush(self):
+        """Write every pending entry. Returns the number of documents written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._flushing, self._pending = self._pending, {}
+                batch_items = list(self._flushing.items())
+            written = 0
+            try:
+                for start in range(0, len(batch_items), BATCH_SIZE):
+                    chunk = batch_items[start:start + BATCH_SIZE]
+                    batch = self.db.batch()
+                    for student_id, entry in chunk:
+                        batch.set(self._ref(student_id), _document(entry), merge=True)
+                    try:
+                        batch.commit()
+                    except Exception as e:
+                        print(f"⚠️  Placement flush failed ({len(chunk)} students re-queued): {e}")
+                        with self._lock:
+                            self.stats["failures"] += 1
+                            for student_id, entry in batch_items[start:]:
+                                newer = self._pending.get(student_id)
+                                self._pending[student_id] = entry if newer is None else _combine(entry, newer)
+                        break
+                    written += len(chunk)
+            finally:
+                with self._lock:
+                    self._flushing = {}
+                    self._generation += 1
+                    self.stats["flushes"] += 1
+                    self.stats["writes"] += written
+            return written
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def read(self, student_id):
+        """Stored progress with this process's unflushed changes applied, or None."""
+        while True:
+            with self._lock:
+                generation = self._generation
+                entries = [e for e in (self._flushing.get(student_id), self._pending.get(student_id)) if e]
+            doc = self._ref(student_id).get()
+            with self._lock:
+                # A flush finished mid-read: the document may already hold the
+                # increments we're about to overlay, so read again.
+                if generation != self._generation:
+                    continue
+            if not doc.exists and not entries:
+                return None
+            return _overlay(doc.to_dict() if doc.exists else {}, entries)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    # ── Background Flusher ────────────────────────────────────────────────────
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return None
+
+        def loop():
+            while not self._stop.is_set():
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"⚠️  Placement flusher: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="placement-flusher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def close(self):
+        """Stop the flusher and write whatever is still buffered."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        return self.flush()
@@ -0,0 +1,229 @@
+"""
+profiler.py — Opt-in per-request Firestore profiler
+
+When enabled, every Firestore call made while serving a request is recorded
+with its duration, documents returned and call site. At the end of the
+request the trace is checked for N+1 patterns (the same single-document read
+or sub-collection stream repeated from one call site) and oversized
+collection streams, a ``Server-Timing`` header is attached, and the trace is
+kept if it is among the slowest seen so far (see ``GET /debug/firestore-traces``).
+
+Configuration (environment):
+    FIRESTORE_PROFILE            off | header | all   (default: off)
+                                 "header" profiles requests sent with
+                                 ``X-Firestore-Profile: 1``
+    FIRESTORE_PROFILE_REPEAT     repeated calls from one site to flag (default 5)
+    FIRESTORE_PROFILE_STREAM     docs returned by one stream to flag (default 500)
+    FIRESTORE_PROFILE_KEEP       slowest traces kept in memory (default 50)
+"""
+
+import contextvars
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+
+import metrics
+
+PROFILE_HEADER = b"x-firestore-profile"
+
+_trace = contextvars.ContextVar("manan_firestore_trace", default=None)
+
+
+class Settings:
+    def __init__(self):
+        self.mode = os.getenv("FIRESTORE_PROFILE", "off").lower()
+        self.repeat_threshold = int(os.getenv("FIRESTORE_PROFILE_REPEAT", "5"))
+        self.stream_threshold = int(os.getenv("FIRESTORE_PROFILE_STREAM", "500"))
+        self.keep = int(os.getenv("FIRESTORE_PROFILE_KEEP", "50"))
+
+    @property
+    def enabled(self):
+        return self.mode in ("header", "all")
+
+
+settings = Settings()
+
+
+# ─── Call Sites ───────────────────────────────────────────────────────────────
+
+_SKIP_FILES = {os.path.abspath(__file__), os.path.abspath(metrics.__file__)}
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _call_site():
+    """First stack frame in application code outside the instrumentation."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename not in _SKIP_FILES and filename.startswith(_APP_DIR) and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, _APP_DIR)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "?"
+
+
+def _collection_pattern(path, op):
+    """``courses/C1/students`` → ``courses/*/students``; doc paths → their collection."""
+    parts = path.split("/")
+    if op in ("get", "set", "update", "create", "delete") and len(parts) % 2 == 0:
+        parts = parts[:-1]
+    return "/".join("*" if i % 2 else p for i, p in enumerate(parts))
+
+
+# ─── Traces ───────────────────────────────────────────────────────────────────
+
+class Trace:
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.started = time.time()
+        self.duration_ms = 0.0
+        self.calls = []
+        self.warnings = []
+
+    def record(self, op, path, docs, seconds):
+        self.calls.append({
+            "op": op,
+            "path": path,
+            "docs": docs,
+            "ms": round(seconds * 1000, 3),
+            "site": _call_site(),
+        })
+
+    @property
+    def firestore_ms(self):
+        return sum(c["ms"] for c in self.calls)
+
+    def analyze(self, repeat_threshold, stream_threshold):
+        groups = {}
+        for call in self.calls:
+            if call["op"] not in ("get", "stream"):
+                continue
+            key = (call["op"], _collection_pattern(call["path"], call["op"]), call["site"])
+            groups[key] = groups.get(key, 0) + 1
+        for (op, pattern, site), n in sorted(groups.items(), key=lambda kv: -kv[1]):
+            if n >= repeat_threshold:
+                what = "single-document reads of" if op == "get" else "streams of"
+                self.warnings.append(f"N+1: {n} {what} {pattern} at {site}")
+        for call in self.calls:
+            if call["op"] == "stream" and call["docs"] >= stream_threshold:
+                self.warnings.append(
+                    f"Large stream: {call['docs']} docs from {call['path']} at {call['site']}")
+
+    def summary(self):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started,
+            "duration_ms": round(self.duration_ms, 2),
+            "firestore_ms": round(self.firestore_ms, 2),
+            "firestore_calls": len(self.calls),
+            "docs_read": sum(c["docs"] for c in self.calls if c["op"] in ("get", "stream", "get_all")),
+            "warnings": self.warnings,
+            "calls": self.calls,
+        }
+
+
+def _hook(op, path, docs, seconds):
+    trace = _trace.get()
+    if trace is not None:
+        trace.record(op, path, docs, seconds)
+
+
+metrics.FIRESTORE_HOOKS.append(_hook)
+
+
+class TraceStore:
+    """Keeps the ``keep`` slowest traces (min-heap on duration)."""
+
+    def __init__(self, keep):
+        self.keep = keep
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        item = (trace.duration_ms, next(self._seq), trace)
+        with self._lock:
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def slowest(self, limit=20, route=None):
+        with self._lock:
+            traces = [t for _, _, t in self._heap]
+        if route:
+            traces = [t for t in traces if t.route == route]
+        traces.sort(key=lambda t: t.duration_ms, reverse=True)
+        return [t.summary() for t in traces[:limit]]
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+
+
+traces = TraceStore(settings.keep)
+
+
+# ─── Middleware ───────────────────────────────────────────────────────────────
+
+def _server_timing(trace):
+    value = (f'firestore;dur={trace.firestore_ms:.1f};desc="{len(trace.calls)} calls", '
+             f'app;dur={trace.duration_ms:.1f}')
+    if trace.warnings:
+        value += f', n1;desc="{len(trace.warnings)} warnings"'
+    return value.encode()
+
+
+def _finish(trace, scope, start):
+    trace.duration_ms = (time.perf_counter() - start) * 1000
+    trace.route = getattr(scope.get("route"), "path", None)
+    trace.analyze(settings.repeat_threshold, settings.stream_threshold)
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware that profiles requests when enabled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope):
+        if settings.mode == "all":
+            return True
+        if settings.mode == "header":
+            return any(k == PROFILE_HEADER and v in (b"1", b"true") for k, v in scope.get("headers", ()))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            return await self.app(scope, receive, send)
+
+        trace = Trace(scope["method"], scope["path"])
+        token = _trace.set(trace)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Handlers have returned by now for regular (non-streaming) responses.
+                trace.status = message["status"]
+                _finish(trace, scope, start)
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"server-timing", _server_timing(trace))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            if trace.status is None:
+                _finish(trace, scope, start)
+            for warning in trace.warnings:
+                print(f"⚠️  [{trace.method} {trace.route or trace.path}] {warning}")
+            traces.add(trace)
@@ -0,0 +1,171 @@
+"""
+rate_limit.py — Admission control for Gemini-backed routes
+
+Two layers, both configured from ``system/settings`` → ``rate_limits`` (see
+system_settings.DEFAULTS):
+
+* Token buckets per (caller, route), plus a bucket per route. The caller is
+  the verified UID, or the client address for calls without an ID token.
+  Over-limit calls are rejected immediately with 429 and ``Retry-After``.
+* A global concurrency gate in front of Gemini with a short bounded queue.
+  When every slot is busy and the queue is full — or a queued call waits
+  longer than the timeout — the call gets a 429 instead of piling up.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from fastapi.responses import JSONResponse
+
+import resilience
+import system_settings
+
+MAX_BUCKETS = 100_000
+
+
+def rejection(message, retry_after):
+    """429 in the shape the Ask Manan UI already renders."""
+    retry_after = max(1, math.ceil(retry_after))
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+        content={"status": "error", "message": message, "answer": f"⚠️ {message}",
+                 "citations": [], "retry_after": retry_after},
+    )
+
+
+# ─── Token Buckets ────────────────────────────────────────────────────────────
+
+class TokenBuckets:
+    """Token buckets keyed by arbitrary tuples, LRU-bounded to ``max_keys``."""
+
+    def __init__(self, max_keys=MAX_BUCKETS, clock=time.monotonic):
+        self._buckets = OrderedDict()  # key → [tokens, last refill]
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+        self._clock = clock
+
+    def take(self, key, per_minute, burst):
+        """Consume one token; returns 0 if allowed, else seconds until one is available."""
+        if per_minute <= 0:
+            return 0.0
+        rate = per_minute / 60.0
+        capacity = max(1.0, float(burst))
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+                if len(self._buckets) > self._max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+buckets = TokenBuckets()
+
+
+def _route_limits(route):
+    limits = system_settings.get_settings().get("rate_limits", {})
+    return limits.get("routes", {}).get(route)
+
+
+def check_student(route, caller):
+    """Apply the per-route and per-caller buckets; returns a 429 response or None.
+
+    ``caller`` is a verified UID, or the client address for calls without a token.
+    The route is checked first, so a route-level rejection costs the caller nothing.
+    """
+    limits = _route_limits(route)
+    if not limits:
+        return None
+    wait = buckets.take(("route", route), limits.get("route_per_minute", 0),
+                        limits.get("route_burst", limits.get("route_per_minute", 0)))
+    if wait:
+        return rejection("Ask Manan is busy right now. Please try again shortly.", wait)
+    wait = buckets.take(("student", route, caller or "anonymous"),
+                        limits.get("per_minute", 0), limits.get("burst", 1))
+    if wait:
+        return rejection(f"You're asking too quickly. Please wait {math.ceil(wait)}s and try again.", wait)
+    return None
+
+
+# ─── Concurrency Gate ─────────────────────────────────────────────────────────
+
+class ConcurrencyGate:
+    """At most ``limit`` holders, at most ``queue`` waiters, bounded wait."""
+
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def configure(self, limit, queue, timeout):
+        with self._cond:
+            self.limit, self.queue, self.timeout = limit, queue, timeout
+            self._cond.notify_all()
+
+    def acquire(self, timeout=None):
+        """True if a slot was taken; False if rejected (queue full or timed out)."""
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue:
+                return False
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.active < self.limit, timeout=timeout):
+                    return False
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+gemini_gate = ConcurrencyGate(limit=8, queue=16, timeout=2.0)
+
+
+@contextmanager
+def gemini_slot():
+    """Hold a Gemini slot for the duration of the block.
+
+    Yields None when admitted, or a 429 response that the handler should
+    return as-is.
+    """
+    limits = system_settings.get_settings().get("rate_limits", {})
+    config = (limits.get("gemini_concurrency", 8), limits.get("gemini_queue", 16),
+              limits.get("gemini_queue_timeout_s", 2.0))
+    if config != (gemini_gate.limit, gemini_gate.queue, gemini_gate.timeout):
+        gemini_gate.configure(*config)
+
+    # Don't queue past the request's deadline budget.
+    if not gemini_gate.acquire(resilience.remaining()):
+        yield rejection("Ask Manan is handling a lot of questions. Please try again in a moment.",
+                        gemini_gate.timeout)
+        return
+    try:
+        yield None
+    finally:
+        gemini_gate.release()
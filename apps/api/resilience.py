@@ -0,0 +1,280 @@
+"""
+resilience.py — Deadline budgets and circuit breakers for Firestore and Gemini
+
+* Budgets: ``DeadlineMiddleware`` gives every request a time budget
+  (``ROUTE_BUDGETS``, else ``REQUEST_BUDGET_S``). Every Firestore RPC made
+  through the instrumented client and every Gemini call gets
+  ``timeout = min(its own limit, budget left)``. Once the budget is spent,
+  further calls raise ``DeadlineExceeded`` without going out. Work outside a
+  request (listeners, flush threads, scripts) gets no added timeouts.
+  ``stream()`` is one RPC for a whole scan, so it gets only the budget left,
+  never ``FIRESTORE_TIMEOUT_S``.
+* Breakers: one per dependency. After ``BREAKER_FAILURES`` consecutive
+  failures (timeouts, 5xx, connection errors; not 4xx like NotFound) the
+  breaker opens, and calls fail fast with ``CircuitOpen`` for
+  ``BREAKER_RESET_S``. A timeout set by the caller's budget (or on a scan)
+  says nothing about the dependency and isn't counted. Then one probe call is let through (half-open). If
+  it succeeds the breaker closes, and if it fails it opens again.
+* Degraded responses: ``error_response(e)`` turns ``CircuitOpen`` and
+  ``DeadlineExceeded`` into 503 with ``Retry-After`` and keeps the usual
+  ``{"status": "error", ...}`` body for everything else. Callers with a
+  fallback (last-known settings, cached answers, stale dashboard sections)
+  serve that instead.
+
+Configuration (environment):
+    REQUEST_BUDGET_S      default per-request budget in seconds (default 10)
+    FIRESTORE_TIMEOUT_S   longest single Firestore RPC in a request, scans excepted (default 5)
+    GEMINI_TIMEOUT_S      longest single Gemini call (default 20)
+    BREAKER_FAILURES      consecutive failures that open a breaker (default 5)
+    BREAKER_RESET_S       seconds a breaker stays open before probing (default 10)
+"""
+
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+import responses
+
+REQUEST_BUDGET_S = float(os.getenv("REQUEST_BUDGET_S", "10"))
+FIRESTORE_TIMEOUT_S = float(os.getenv("FIRESTORE_TIMEOUT_S", "5"))
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "20"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("BREAKER_RESET_S", "10"))
+
+# Route template → budget in seconds (None = unbounded, for long-lived streams).
+ROUTE_BUDGETS = {
+    "/solve-doubt": 25.0,
+    "/student/{uid}/dashboard": 3.0,
+    "/notifications/stream": None,
+}
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before a downstream call."""
+
+
+class CircuitOpen(Exception):
+    """A dependency's breaker is open; the call was not attempted."""
+
+    def __init__(self, dependency, retry_after):
+        super().__init__(f"{dependency} is unavailable, retry in {math.ceil(retry_after)}s")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+# ─── Budgets ──────────────────────────────────────────────────────────────────
+
+class Budget:
+    """Absolute deadline of a request, resolved from its route on first use."""
+    __slots__ = ("started", "_scope", "_expires")
+
+    _UNSET = object()
+
+    def __init__(self, scope=None, expires=_UNSET):
+        self.started = time.monotonic()
+        self._scope = scope
+        self._expires = expires
+
+    def expires(self):
+        if self._expires is Budget._UNSET:
+            route = getattr((self._scope or {}).get("route"), "path", None)
+            seconds = ROUTE_BUDGETS.get(route, REQUEST_BUDGET_S)
+            self._expires = None if seconds is None else self.started + seconds
+        return self._expires
+
+
+_budget = contextvars.ContextVar("manan_budget", default=None)
+
+
+def remaining():
+    """Seconds left in the current request's budget, or None if unbounded."""
+    budget = _budget.get()
+    expires = budget.expires() if budget is not None else None
+    return None if expires is None else expires - time.monotonic()
+
+
+def call_timeout(limit, dependency):
+    """Timeout for one downstream call: ``limit`` capped by the budget left."""
+    left = remaining()
+    if left is None:
+        return limit
+    if left <= 0:
+        metrics.DEPENDENCY_REJECTIONS.inc((dependency, "deadline"))
+        raise DeadlineExceeded(f"request deadline exceeded before calling {dependency}")
+    return min(limit, left)
+
+
+@contextmanager
+def deadline(seconds):
+    """Tighten the budget for a block (never extends the enclosing one)."""
+    expires = time.monotonic() + seconds
+    outer = _budget.get()
+    outer_expires = outer.expires() if outer is not None else None
+    if outer_expires is not None:
+        expires = min(expires, outer_expires)
+    token = _budget.set(Budget(expires=expires))
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware that starts each request's budget."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _budget.set(Budget(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _budget.reset(token)
+
+
+# ─── Circuit Breakers ─────────────────────────────────────────────────────────
+
+def is_failure(e):
+    """Whether an exception says the dependency is unhealthy (vs. a bad request)."""
+    code = getattr(e, "code", None)
+    if callable(code):  # grpc errors expose code() instead of an HTTP status
+        code = None
+    return not (isinstance(code, int) and 400 <= code < 500 and code not in (408, 429))
+
+
+class CircuitBreaker:
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_s=BREAKER_RESET_S, clock=time.monotonic):
+        self.name = name
+        self.failures = failures
+        self.reset_s = reset_s
+        self._clock = clock
+        self._state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == "open" and self._clock() - self._opened_at >= self.reset_s:
+                return "half_open"
+            return self._state
+
+    def _set(self, state):
+        if state != self._state:
+            self._state = state
+            metrics.BREAKER_TRANSITIONS.inc((self.name, state))
+            if state == "open":
+                print(f"⚠️  {self.name} breaker open after {self._consecutive} failures")
+            elif state == "closed":
+                print(f"✅ {self.name} breaker closed")
+
+    def _admit(self):
+        """'call' or 'probe' if the call may go out; raises CircuitOpen otherwise."""
+        with self._lock:
+            if self._state == "closed":
+                return "call"
+            wait = self.reset_s - (self._clock() - self._opened_at)
+            if wait <= 0 and not self._probing:
+                self._probing = True
+                self._set("half_open")
+                return "probe"
+        metrics.DEPENDENCY_REJECTIONS.inc((self.name, "open"))
+        raise CircuitOpen(self.name, max(wait, 1.0))
+
+    def _done(self, kind, failed):
+        with self._lock:
+            if kind == "probe":
+                self._probing = False
+            if failed:
+                self._consecutive += 1
+                if kind == "probe" or (self._state == "closed" and self._consecutive >= self.failures):
+                    self._opened_at = self._clock()
+                    self._set("open")
+            elif kind == "probe" or self._state == "closed":
+                # A slow call that started before the breaker opened doesn't close it.
+                self._consecutive = 0
+                self._set("closed")
+
+    @contextmanager
+    def guard(self, failure=is_failure):
+        """Run the block through the breaker; ``failure(e)`` decides what its exceptions count as."""
+        kind = self._admit()
+        verdict = None
+        try:
+            yield
+            verdict = False
+        except Exception as e:
+            verdict = failure(e)
+            raise
+        finally:
+            if verdict is None:  # abandoned (GeneratorExit, cancellation): no verdict
+                if kind == "probe":
+                    with self._lock:
+                        self._probing = False
+            else:
+                self._done(kind, verdict)
+
+    def retry_after(self):
+        with self._lock:
+            if self._state == "closed":
+                return 0.0
+            return max(1.0, self.reset_s - (self._clock() - self._opened_at))
+
+
+firestore = CircuitBreaker("firestore")
+gemini = CircuitBreaker("gemini")
+
+
+@contextmanager
+def firestore_guard(op, kwargs):
+    """metrics.FIRESTORE_GUARD: add a budgeted ``timeout`` and apply the breaker."""
+    left = remaining()
+    if kwargs.get("timeout") is None and left is not None:
+        kwargs["timeout"] = call_timeout(left if op == "stream" else FIRESTORE_TIMEOUT_S, "firestore")
+    timeout = kwargs.get("timeout")
+    # Running out of the caller's own time (or a long scan) is not Firestore failing
+    caller_side = op == "stream" or (timeout is not None and timeout < FIRESTORE_TIMEOUT_S)
+    with firestore.guard(lambda e: is_failure(e) and not (caller_side and is_unavailable(e))):
+        yield
+
+
+def install():
+    """Route every instrumented Firestore call through ``firestore_guard``."""
+    metrics.FIRESTORE_GUARD = firestore_guard
+
+
+def breakers():
+    return {b.name: {"state": b.state, "retry_after": b.retry_after()} for b in (firestore, gemini)}
+
+
+# ─── Degraded Responses ───────────────────────────────────────────────────────
+
+def unavailable(message, retry_after, **extra):
+    retry_after = max(1, math.ceil(retry_after))
+    return responses.FastJSONResponse({"status": "error", "message": message, "retry_after": retry_after, **extra},
+                                      status_code=503, headers={"Retry-After": str(retry_after)})
+
+
+def error_response(e):
+    """The handler error payload, or a 503 when a dependency was unavailable."""
+    if isinstance(e, CircuitOpen):
+        return unavailable(f"Service temporarily unavailable ({e.dependency}). Please retry shortly.",
+                           e.retry_after)
+    if is_unavailable(e):
+        return unavailable("The request took too long. Please retry.", 1)
+    return {"status": "error", "message": str(e)}
+
+
+def is_unavailable(e):
+    """Breaker open, budget spent, or the call itself timed out."""
+    return isinstance(e, (CircuitOpen, DeadlineExceeded, TimeoutError)) or \
+        type(e).__name__ in ("DeadlineExceeded", "ReadTimeout", "ConnectTimeout", "TimeoutException")
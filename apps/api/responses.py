@@ -0,0 +1,211 @@
+"""
+responses.py — Fast JSON responses and negotiated compression
+
+* ``FastJSONResponse`` renders with orjson. ``FastJSONRoute`` turns a
+  handler's plain dict/list return value straight into a FastJSONResponse,
+  skipping FastAPI's ``jsonable_encoder`` pass (the bulk of the per-response
+  CPU for large list endpoints). Handlers that return a Response are left
+  alone.
+* ``CompressionMiddleware`` compresses complete responses of at least
+  ``COMPRESS_MIN_SIZE`` bytes with brotli (when the ``brotli`` package is
+  installed) or gzip, whichever the client prefers. Streaming responses and
+  bodies that are already encoded pass through untouched.
+* ``StaticJSON`` serializes a constant payload once and keeps pre-compressed
+  variants, for canned answers and demo lists.
+
+Configuration (environment):
+    COMPRESS_MIN_SIZE     smallest body to compress, in bytes (default 1024)
+    COMPRESS_GZIP_LEVEL   gzip level for dynamic responses (default 6)
+    COMPRESS_BR_QUALITY   brotli quality for dynamic responses (default 4)
+"""
+
+import functools
+import gzip
+import inspect
+import os
+from datetime import date, datetime
+
+import orjson
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BR_QUALITY = int(os.getenv("COMPRESS_BR_QUALITY", "4"))
+
+# Compress bodies larger than this off the event loop.
+THREADPOOL_SIZE = 256 * 1024
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+SKIP_TYPES = (b"text/event-stream", b"image/", b"video/", b"audio/", b"application/zip",
+              b"application/gzip", b"application/octet-stream")
+
+
+# ─── JSON ─────────────────────────────────────────────────────────────────────
+
+def _default(obj):
+    # Firestore timestamps are datetime subclasses, which orjson refuses.
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+
+def dumps(content):
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def _to_response(result):
+    return result if isinstance(result, Response) else FastJSONResponse(result)
+
+
+class FastJSONRoute(APIRoute):
+    """APIRoute whose handler results are rendered by orjson directly."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        # Routes with a response model (explicit or from the return annotation)
+        # keep FastAPI's validation and serialization.
+        response_model = kwargs.get("response_model")
+        if isinstance(response_model, DefaultPlaceholder):
+            response_model = response_model.value
+        if response_model is None and "return" not in getattr(endpoint, "__annotations__", {}):
+            endpoint = _wrap(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _wrap(endpoint):
+    # functools.wraps keeps the signature FastAPI uses for parameters.
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            return _to_response(await endpoint(*args, **kwargs))
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            return _to_response(endpoint(*args, **kwargs))
+    return wrapper
+
+
+# ─── Encoding Negotiation ─────────────────────────────────────────────────────
+
+def choose_encoding(accept_encoding):
+    """"br", "gzip" or None for an ``Accept-Encoding`` header value."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda enc: (offered.get(enc, offered.get("*", 0.0)), enc == "br"))
+    return best if offered.get(best, offered.get("*", 0.0)) > 0 else None
+
+
+def compress(body, encoding, static=False):
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if static else BR_QUALITY)
+    return gzip.compress(body, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+
+
+def _accept_encoding(scope):
+    for key, value in scope.get("headers", ()):
+        if key == b"accept-encoding":
+            return value.decode("latin-1")
+    return ""
+
+
+# ─── Static Bodies ────────────────────────────────────────────────────────────
+
+class StaticJSON:
+    """A constant JSON payload, serialized and compressed once."""
+
+    def __init__(self, content):
+        self.body = dumps(content)
+        self.variants = {}
+        if len(self.body) >= MIN_SIZE:
+            for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+                self.variants[encoding] = compress(self.body, encoding, static=True)
+
+    def response(self, request):
+        encoding = choose_encoding(request.headers.get("accept-encoding", "")) if self.variants else None
+        if encoding in self.variants:
+            return Response(self.variants[encoding], media_type="application/json",
+                            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+        return Response(self.body, media_type="application/json",
+                        headers={"Vary": "Accept-Encoding"} if self.variants else None)
+
+
+# ─── Middleware ───────────────────────────────────────────────────────────────
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing complete responses above ``min_size``."""
+
+    def __init__(self, app, min_size=MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(_accept_encoding(scope))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", ()))
+                content_type = headers.get(b"content-type", b"")
+                if b"content-encoding" in headers or content_type.startswith(SKIP_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # held until we see the body
+                return
+            if passthrough or message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            if start is None:  # already streaming uncompressed
+                return await send(message)
+            head, start = start, None
+            if message.get("more_body", False) or len(body) < self.min_size:
+                # Streaming or small: send as-is.
+                passthrough = True
+                await send(head)
+                return await send(message)
+
+            if len(body) >= THREADPOOL_SIZE:
+                body = await run_in_threadpool(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            vary = [v for k, v in head.get("headers", ()) if k == b"vary"] + [b"Accept-Encoding"]
+            headers = [(k, v) for k, v in head.get("headers", ()) if k not in (b"content-length", b"vary")]
+            headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode()),
+                        (b"vary", b", ".join(vary))]
+            await send({**head, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,227 @@
+"""
+risk_engine.py — Student risk status and cohort-wide recomputation
+
+A student is "At Risk" when attendance is below ``attendance_threshold`` or
+CGPA is below ``cgpa_threshold`` (both from ``system/settings``).
+``risk_status()`` classifies one student for profile updates; ``Recompute``
+re-evaluates the whole cohort after an admin changes a threshold:
+
+* students are streamed in pages of ``page_size`` (only the fields needed),
+* each page is classified in one vectorized NumPy pass,
+* only documents whose status changed are updated, in batches of up to 500
+  committed by a thread pool while the next page is being read,
+* ``on_changed(uids)`` is called after each committed batch so callers can
+  drop cached copies of those students (profile cache, dashboard).
+
+``start()`` runs a recompute in a background thread (one per process; a new
+threshold change cancels the running job) and ``status()`` reports progress
+for ``GET /admin/risk-recompute``.
+
+Run by hand (thresholds from system/settings unless given):
+    python risk_engine.py --emulator
+    python risk_engine.py --attendance 70 --cgpa 5.5
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+AT_RISK = "At Risk"
+SAFE = "Safe"
+
+# Firestore rejects batches larger than 500 writes.
+MAX_BATCH = 500
+
+FIELDS = ["academic_stats.attendance_percent", "academic_stats.cgpa", "academic_stats.risk_status"]
+
+
+def risk_status(attendance, cgpa, attendance_threshold=75, cgpa_threshold=5.0):
+    return AT_RISK if attendance < attendance_threshold or cgpa < cgpa_threshold else SAFE
+
+
+def classify(attendance, cgpa, attendance_threshold, cgpa_threshold):
+    """Vectorized ``risk_status``: boolean array, True where the student is at risk."""
+    return (attendance < attendance_threshold) | (cgpa < cgpa_threshold)
+
+
+class Recompute:
+    """One cohort recomputation; counters are safe to read while it runs."""
+
+    def __init__(self, db, attendance_threshold, cgpa_threshold, page_size=2000, workers=8,
+                 batch_size=MAX_BATCH, log_every=10, on_changed=None):
+        self.db = db
+        self.attendance_threshold = float(attendance_threshold)
+        self.cgpa_threshold = float(cgpa_threshold)
+        self.page_size = page_size
+        self.workers = workers
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.log_every = log_every
+        self.on_changed = on_changed
+        self.state = "pending"
+        self.error = None
+        self.pages = self.scanned = self.changed = self.written = 0
+        self.started_at = self.finished_at = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def status(self):
+        end = self.finished_at or time.time()
+        return {
+            "state": self.state,
+            "attendance_threshold": self.attendance_threshold,
+            "cgpa_threshold": self.cgpa_threshold,
+            "pages": self.pages,
+            "scanned": self.scanned,
+            "changed": self.changed,
+            "written": self.written,
+            "seconds": round(end - self.started_at, 2) if self.started_at else 0.0,
+            "error": self.error,
+        }
+
+    # Reading
+    def _pages(self):
+        cursor = None
+        while not self._cancelled.is_set():
+            query = (self.db.collection("users")
+                     .where("role", "==", "student")
+                     .order_by("__name__")
+                     .select(FIELDS)
+                     .limit(self.page_size))
+            if cursor:
+                query = query.start_after({"__name__": cursor})
+            docs = list(query.stream())
+            if not docs:
+                return
+            cursor = docs[-1].id
+            yield docs
+
+    def _changes(self, docs):
+        """(doc id, new status) for students on this page whose status changes."""
+        ids, attendance, cgpa, current = [], [], [], []
+        for doc in docs:
+            stats = (doc.to_dict() or {}).get("academic_stats")
+            if not isinstance(stats, dict):
+                continue
+            ids.append(doc.id)
+            attendance.append(stats.get("attendance_percent") or 0.0)
+            cgpa.append(stats.get("cgpa") or 0.0)
+            current.append(stats.get("risk_status") == AT_RISK)
+        if not ids:
+            return []
+        at_risk = classify(np.asarray(attendance, dtype=float), np.asarray(cgpa, dtype=float),
+                           self.attendance_threshold, self.cgpa_threshold)
+        changed = np.flatnonzero(at_risk != np.asarray(current, dtype=bool))
+        return [(ids[i], AT_RISK if at_risk[i] else SAFE) for i in changed]
+
+    # Writing
+    def _commit(self, chunk):
+        batch = self.db.batch()
+        users = self.db.collection("users")
+        for uid, status in chunk:
+            batch.update(users.document(uid), {"academic_stats.risk_status": status})
+        batch.commit()
+        with self._lock:
+            self.written += len(chunk)
+        if self.on_changed is not None:
+            self.on_changed([uid for uid, _ in chunk])
+
+    def run(self):
+        self.state = "running"
+        self.started_at = time.time()
+        print(f"🔁 Recomputing risk (attendance < {self.attendance_threshold:g} or "
+              f"CGPA < {self.cgpa_threshold:g})")
+        pending = set()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for docs in self._pages():
+                    changes = self._changes(docs)
+                    self.pages += 1
+                    self.scanned += len(docs)
+                    self.changed += len(changes)
+                    for i in range(0, len(changes), self.batch_size):
+                        while len(pending) >= self.workers * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for fut in done:
+                                fut.result()
+                        pending.add(pool.submit(self._commit, changes[i:i + self.batch_size]))
+                    if self.log_every and self.pages % self.log_every == 0:
+                        print(f"   … {self.scanned:,} students scanned, {self.changed:,} changed")
+                for fut in pending:
+                    fut.result()
+            self.state = "cancelled" if self._cancelled.is_set() else "done"
+        except Exception as e:
+            self.state, self.error = "failed", str(e)
+            print(f"⚠️  Risk recompute failed: {e}")
+        self.finished_at = time.time()
+        s = self.status()
+        print(f"{'✅' if self.state == 'done' else '⚠️ '} Risk recompute {self.state}: {s['scanned']:,} "
+              f"students, {s['written']:,} updated in {s['seconds']:.1f}s")
+        return self
+
+
+# ─── Background Job ───────────────────────────────────────────────────────────
+
+_job = None
+_thread = None
+_job_lock = threading.Lock()
+
+
+def start(db, attendance_threshold, cgpa_threshold, **kwargs):
+    """Start a background recompute, cancelling any that is still running.
+
+    The new job waits for the cancelled one to stop so their writes never
+    interleave.
+    """
+    global _job, _thread
+    with _job_lock:
+        previous = _thread
+        if _job is not None and _job.state in ("pending", "running"):
+            _job.cancel()
+        job = _job = Recompute(db, attendance_threshold, cgpa_threshold, **kwargs)
+
+        def run():
+            if previous is not None:
+                previous.join()
+            job.run()
+
+        _thread = threading.Thread(target=run, name="risk-recompute", daemon=True)
+        _thread.start()
+        return job
+
+
+def status():
+    job = _job
+    return job.status() if job is not None else {"state": "idle"}
+
+
+def main(argv=None):
+    from seed_db import init_db
+    import system_settings
+
+    parser = argparse.ArgumentParser(description="Recompute risk_status for every student")
+    parser.add_argument("--attendance", type=float, help="attendance threshold (default: system/settings)")
+    parser.add_argument("--cgpa", type=float, help="CGPA threshold (default: system/settings)")
+    parser.add_argument("--page-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--emulator", action="store_true", help="use FIRESTORE_EMULATOR_HOST")
+    args = parser.parse_args(argv)
+
+    db = init_db(emulator=args.emulator)
+    doc = db.collection("system").document("settings").get()
+    settings = {**system_settings.DEFAULTS, **(doc.to_dict() if doc.exists else {})}
+    job = Recompute(db,
+                    args.attendance if args.attendance is not None else settings["attendance_threshold"],
+                    args.cgpa if args.cgpa is not None else settings["cgpa_threshold"],
+                    page_size=args.page_size, workers=args.workers).run()
+    return 0 if job.state == "done" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
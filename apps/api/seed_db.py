@@ -1,29 +1,175 @@
 """
 seed_db.py — Seed Firestore with dummy data for Manan AI
-Run: python seed_db.py
+
+Run:
+    python seed_db.py                                  # small hand-written demo campus
+    python seed_db.py --synthetic --preset large       # 50k students, 500 courses, 200k doubts
+    python seed_db.py --synthetic --students 100000 --courses 800 --doubts 300000 --workers 32
+
+Synthetic campuses are streamed from synthetic_data.py (deterministic for a
+given --seed) and written with parallel 500-document batches, so memory stays
+flat regardless of size. Progress is checkpointed to --checkpoint after every
+committed chunk; re-running the same command resumes where it stopped.
 """
 
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+
 import firebase_admin
 from firebase_admin import credentials, firestore
-from datetime import datetime, timedelta
-import random
+from dotenv import load_dotenv
+
+import synthetic_data as sd
+from synthetic_data import Record
+
+load_dotenv()
+
+# Firestore rejects batches larger than 500 writes.
+MAX_BATCH = 500
+
 
 # ──────────────────────────────────────────────
 # 1. Initialization
 # ──────────────────────────────────────────────
-cred = credentials.Certificate("nova-scholar-f10d5-firebase-adminsdk-fbsvc-9ac6252f8f.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+def init_db(emulator=False):
+    if emulator:
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud import firestore as gcf
+        return gcf.Client(project=os.getenv("GCLOUD_PROJECT", "manan-dev"),
+                          credentials=AnonymousCredentials())
+
+    service_account_path = os.getenv(
+        "FIREBASE_SERVICE_ACCOUNT_PATH",
+        "nova-scholar-f10d5-firebase-adminsdk-fbsvc-9ac6252f8f.json"
+    )
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(service_account_path)
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+class BulkSeeder:
+    """Parallel, checkpointed batch writer for record streams.
+
+    Records are grouped into batches of ``batch_size`` and committed by a
+    thread pool with at most ``2 * workers`` batches in flight. The checkpoint
+    stores, per stream, how many records have been committed contiguously
+    from the start; a resumed run skips exactly that many records.
+    """
+
+    def __init__(self, db, workers=16, batch_size=MAX_BATCH, checkpoint_path=None, run_key=None):
+        self.db = db
+        self.workers = workers
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.checkpoint_path = checkpoint_path
+        self.run_key = run_key
+        self.written = 0
+        self._lock = threading.Lock()
+        self._state = self._load_checkpoint()
+
+    # Checkpointing
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {"run_key": self.run_key, "streams": {}}
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        if state.get("run_key") != self.run_key:
+            print(f"  [WARN] Checkpoint {self.checkpoint_path} is for a different campus; starting over.")
+            return {"run_key": self.run_key, "streams": {}}
+        return state
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def done(self, name):
+        return self._state["streams"].get(name, {}).get("complete", False)
+
+    # Writing
+    def _commit(self, chunk):
+        batch = self.db.batch()
+        for rec in chunk:
+            batch.set(self.db.document(rec.path), rec.data, merge=rec.merge)
+        batch.commit()
+        return len(chunk)
+
+    def write_stream(self, name, records):
+        """Write ``records`` (an iterable of Record), resuming from the checkpoint."""
+        stream_state = self._state["streams"].setdefault(name, {"committed": 0, "complete": False})
+        if stream_state["complete"]:
+            print(f"  [SKIP] {name}: already seeded")
+            return 0
+
+        offset = stream_state["committed"]
+        if offset:
+            print(f"  [RESUME] {name}: skipping {offset:,} committed records")
+        records = itertools.islice(records, offset, None)
+
+        t0 = time.perf_counter()
+        pending = {}          # future → (chunk index, size)
+        finished = {}         # chunk index → size, waiting for earlier chunks
+        next_to_mark = 0
+        committed = offset
+
+        def drain(block):
+            nonlocal next_to_mark, committed
+            done, _ = wait(pending, return_when=FIRST_COMPLETED) if block else (
+                [f for f in pending if f.done()], None)
+            for fut in done:
+                idx, size = pending.pop(fut)
+                fut.result()  # surface write errors
+                finished[idx] = size
+            advanced = False
+            while next_to_mark in finished:
+                committed += finished.pop(next_to_mark)
+                next_to_mark += 1
+                advanced = True
+            if advanced:
+                stream_state["committed"] = committed
+                with self._lock:
+                    self._save_checkpoint()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for idx in itertools.count():
+                chunk = list(itertools.islice(records, self.batch_size))
+                if not chunk:
+                    break
+                while len(pending) >= self.workers * 2:
+                    drain(block=True)
+                pending[pool.submit(self._commit, chunk)] = (idx, len(chunk))
+                drain(block=False)
+            while pending:
+                drain(block=True)
+
+        n = committed - offset
+        self.written += n
+        stream_state["complete"] = True
+        self._save_checkpoint()
+        elapsed = time.perf_counter() - t0
+        rate = n / elapsed if elapsed else 0
+        print(f"  [OK] {name}: {n:,} writes in {elapsed:.1f}s ({rate:,.0f}/s)")
+        return n
 
 
 # ──────────────────────────────────────────────
 # 2A. Users Collection (1 Admin + 5 Students)
 # ──────────────────────────────────────────────
-def seed_users():
+def seed_users(seeder):
     print("Seeding Users...")
 
     # Admin
-    db.collection("users").document("admin_123").set({
+    records = [Record("users/admin_123", {
         "uid": "admin_123",
         "role": "admin",
         "email": "admin@manan.ai",
@@ -32,7 +178,7 @@ def seed_users():
             "avatar_url": "",
         },
         "created_at": datetime.utcnow(),
-    })
+    }, False)]
 
     # Students — 2 "At Risk", 3 "Safe"
     students = [
@@ -79,7 +225,7 @@ def seed_users():
     ]
 
     for s in students:
-        db.collection("users").document(s["uid"]).set({
+        records.append(Record(f"users/{s['uid']}", {
             "uid": s["uid"],
             "role": "student",
             "email": s["email"],
@@ -96,15 +242,15 @@ def seed_users():
                 "courses_enrolled": ["CS301", "CS302", "CS303"],
             },
             "created_at": datetime.utcnow(),
-        })
+        }, False))
 
-    print(f"  [OK] Created 1 admin + {len(students)} students.")
+    seeder.write_stream("demo_users", records)
 
 
 # ──────────────────────────────────────────────
 # 2B. Courses Collection (3 CSE Courses)
 # ──────────────────────────────────────────────
-def seed_courses():
+def seed_courses(seeder):
     print("Seeding Courses...")
 
     courses = [
@@ -185,16 +331,13 @@ def seed_courses():
         },
     ]
 
-    for c in courses:
-        db.collection("courses").document(c["course_id"]).set(c)
-
-    print(f"  [OK] Created {len(courses)} courses.")
+    seeder.write_stream("demo_courses", (Record(f"courses/{c['course_id']}", c, False) for c in courses))
 
 
 # ──────────────────────────────────────────────
 # 2C. Doubts Collection (5 chat history records)
 # ──────────────────────────────────────────────
-def seed_doubts():
+def seed_doubts(seeder):
     print("Seeding Doubts...")
 
     doubts = [
@@ -294,16 +437,13 @@ def seed_doubts():
         },
     ]
 
-    for d in doubts:
-        db.collection("doubts").document(d["doubt_id"]).set(d)
-
-    print(f"  [OK] Created {len(doubts)} doubt records.")
+    seeder.write_stream("demo_doubts", (Record(f"doubts/{d['doubt_id']}", d, False) for d in doubts))
 
 
 # ──────────────────────────────────────────────
 # 2D. Resume Reviews Collection (2 records)
 # ──────────────────────────────────────────────
-def seed_resume_reviews():
+def seed_resume_reviews(seeder):
     print("Seeding Resume Reviews...")
 
     reviews = [
@@ -345,19 +485,74 @@ def seed_resume_reviews():
         },
     ]
 
-    for r in reviews:
-        db.collection("resume_reviews").document(r["review_id"]).set(r)
+    seeder.write_stream("demo_resume_reviews",
+                        (Record(f"resume_reviews/{r['review_id']}", r, False) for r in reviews))
 
-    print(f"  [OK] Created {len(reviews)} resume review records.")
+
+# ──────────────────────────────────────────────
+# 2E. Synthetic Campus (streamed, any size)
+# ──────────────────────────────────────────────
+def seed_synthetic(seeder, spec):
+    print(f"Seeding synthetic campus: {spec.students:,} students, {spec.courses:,} courses, "
+          f"{spec.doubts:,} doubts (seed={spec.seed})...")
+    for name, stream in sd.STREAMS.items():
+        seeder.write_stream(name, stream(spec))
 
 
 # ──────────────────────────────────────────────
 # 3. Run All Seeders
 # ──────────────────────────────────────────────
-if __name__ == "__main__":
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed Firestore for Manan AI")
+    parser.add_argument("--synthetic", action="store_true", help="seed a generated campus instead of the demo data")
+    parser.add_argument("--preset", choices=sorted(sd.PRESETS), default="small")
+    parser.add_argument("--students", type=int)
+    parser.add_argument("--courses", type=int)
+    parser.add_argument("--teachers", type=int)
+    parser.add_argument("--doubts", type=int)
+    parser.add_argument("--notifications", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=16, help="parallel batch commits")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH)
+    parser.add_argument("--checkpoint", default=".seed_checkpoint.json")
+    parser.add_argument("--emulator", action="store_true", help="write to FIRESTORE_EMULATOR_HOST")
+    parser.add_argument("--dry-run", action="store_true", help="write to an in-memory store (timing only)")
+    return parser.parse_args(argv)
+
+
+def build_spec(args):
+    overrides = {k: getattr(args, k) for k in ("students", "courses", "teachers", "doubts", "notifications")
+                 if getattr(args, k) is not None}
+    return sd.CampusSpec(**{**sd.PRESETS[args.preset].__dict__, **overrides, "seed": args.seed})
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.dry_run:
+        from bench.memstore import MemoryFirestore
+        db = MemoryFirestore()
+    else:
+        db = init_db(emulator=args.emulator)
+
+    spec = build_spec(args) if args.synthetic else None
+    run_key = json.dumps(spec.__dict__, sort_keys=True) if spec else "demo"
+    seeder = BulkSeeder(db, workers=args.workers, batch_size=args.batch_size,
+                        checkpoint_path=None if args.dry_run else args.checkpoint, run_key=run_key)
+
     print("\n--- Starting Manan AI DB Seeder ---\n")
-    seed_users()
-    seed_courses()
-    seed_doubts()
-    seed_resume_reviews()
-    print("\n--- Database successfully seeded! ---\n")
+    t0 = time.perf_counter()
+    if spec:
+        seed_synthetic(seeder, spec)
+    else:
+        seed_users(seeder)
+        seed_courses(seeder)
+        seed_doubts(seeder)
+        seed_resume_reviews(seeder)
+    print(f"\n--- Database successfully seeded! {seeder.written:,} writes in "
+          f"{time.perf_counter() - t0:.1f}s ---\n")
+    if seeder.checkpoint_path and os.path.exists(seeder.checkpoint_path):
+        os.remove(seeder.checkpoint_path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
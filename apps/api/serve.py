@@ -0,0 +1,95 @@
+"""
+serve.py — Production launcher: several uvicorn workers on one socket
+
+    uvicorn main:app --reload     # development
+    python serve.py               # production
+
+The parent process binds the socket and supervises the workers. Each worker
+is started with ``spawn``, not ``fork``, so it imports ``main`` fresh and
+creates its own Firebase app, Firestore gRPC channel, Gemini client, cache
+listener and background threads in its lifespan. Nothing with open sockets or
+threads is ever copied across a fork.
+
+* Warm-up: ``STARTUP_PREWARM=1`` is the default here. A worker opens its
+  Firestore channel, builds the doubt index, etc. before it starts accepting
+  connections, so no request lands on a cold worker.
+* Drain: on SIGTERM/SIGINT, workers stop accepting and finish in-flight
+  requests for up to ``GRACEFUL_TIMEOUT`` seconds. Then the lifespan shutdown
+  flushes buffered placement progress and closes listeners. Open SSE streams
+  are cut at the deadline and the clients resume via Last-Event-ID.
+* Workers that stop responding are replaced by the supervisor.
+
+Configuration (environment):
+    WEB_CONCURRENCY     worker processes (default: usable CPUs, honouring
+                        cgroup quotas and CPU affinity)
+    HOST / PORT         bind address (default 0.0.0.0:8000)
+    GRACEFUL_TIMEOUT    seconds to drain on shutdown (default 30)
+    KEEPALIVE_TIMEOUT   idle keep-alive seconds (default 5)
+    FORWARDED_ALLOW_IPS proxies trusted for X-Forwarded-* (default 127.0.0.1)
+
+Run:
+    python serve.py
+    python serve.py --workers 8 --port 8080
+"""
+
+import argparse
+import math
+import os
+
+import uvicorn
+
+
+def _cgroup_cpus(path="/sys/fs/cgroup/cpu.max"):
+    """CPUs allowed by a cgroup v2 quota, or None if unlimited/unknown."""
+    try:
+        with open(path) as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def default_workers():
+    """One worker per usable CPU."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpus()
+    return max(1, min(cpus, quota) if quota else cpus)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or None,
+                        help="worker processes (default: usable CPUs)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--keepalive", type=int, default=int(os.getenv("KEEPALIVE_TIMEOUT", "5")))
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    workers = args.workers or default_workers()
+    # Workers inherit the environment: warm every client before accepting traffic.
+    os.environ.setdefault("STARTUP_PREWARM", "1")
+
+    print(f"✅ Starting {workers} worker(s) on {args.host}:{args.port}")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=args.keepalive,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        log_level=args.log_level,
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+if __name__ == "__main__":
+    main()
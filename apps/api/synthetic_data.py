@@ -0,0 +1,300 @@
+"""
+synthetic_data.py — Deterministic synthetic campus data for Manan AI
+
+Records follow the same schema as seed_db.py, but are produced lazily from a
+seed so that arbitrarily large campuses can be streamed without holding them
+in memory. Record ``i`` of a collection only depends on (seed, collection, i),
+which lets a seeder resume from any offset and still produce identical data.
+"""
+
+import random
+from collections import namedtuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+# A single document write: Firestore path, document data, merge flag.
+Record = namedtuple("Record", ["path", "data", "merge"])
+
+EPOCH = datetime(2026, 1, 5, 9, 0, tzinfo=timezone.utc)
+
+FIRST_NAMES = [
+    "Rahul", "Priya", "Amit", "Sneha", "Vikram", "Ananya", "Rohan", "Kavya",
+    "Arjun", "Isha", "Karan", "Meera", "Aditya", "Pooja", "Siddharth", "Neha",
+    "Yash", "Mahi", "Aarav", "Diya", "Kabir", "Riya", "Dev", "Tanvi",
+]
+LAST_NAMES = [
+    "Sharma", "Patel", "Verma", "Gupta", "Singh", "Maurya", "Rao", "Joshi",
+    "Krishnan", "Iyer", "Nair", "Mehta", "Kapoor", "Reddy", "Das", "Mishra",
+]
+BRANCHES = ["CSE", "IT", "ECE", "ME", "CE", "EE"]
+
+SUBJECTS = [
+    ("Operating Systems", [
+        "Process Management", "CPU Scheduling Algorithms", "Deadlocks",
+        "Memory Management & Paging", "Virtual Memory", "File Systems",
+    ]),
+    ("Database Management Systems", [
+        "ER Model & Relational Model", "SQL — DDL, DML, DCL",
+        "Normalization (1NF to BCNF)", "Indexing & B-Trees",
+        "Transaction Management", "Concurrency Control",
+    ]),
+    ("Computer Networks", [
+        "Introduction & OSI Model", "TCP/IP Protocol Suite",
+        "Network Layer — IP Addressing & Routing", "Transport Layer — TCP & UDP",
+        "Application Layer Protocols (HTTP, DNS, SMTP)", "Network Security & Firewalls",
+    ]),
+    ("Data Structures", [
+        "Arrays & Linked Lists", "Stacks & Queues", "Trees & BST",
+        "Heaps & Priority Queues", "Graphs & Traversals", "Hashing",
+    ]),
+    ("Design and Analysis of Algorithms", [
+        "Asymptotic Analysis", "Divide and Conquer", "Greedy Algorithms",
+        "Dynamic Programming", "Backtracking", "NP-Completeness",
+    ]),
+    ("Machine Learning", [
+        "Linear Regression", "Logistic Regression", "Decision Trees",
+        "Support Vector Machines", "Neural Networks", "Model Evaluation",
+    ]),
+]
+
+QUESTION_TEMPLATES = [
+    "What is the difference between {a} and {b}?",
+    "Can you explain {a} with an example?",
+    "Why is {a} important in practice?",
+    "How does {a} relate to {b}?",
+    "What are common exam questions on {a}?",
+]
+
+
+@dataclass
+class CampusSpec:
+    """Size parameters for a synthetic campus."""
+    students: int = 2_000
+    courses: int = 50
+    teachers: int = 0          # 0 → one teacher per 5 courses
+    doubts: int = 8_000
+    notifications: int = 500
+    courses_per_student: int = 3
+    open_doubt_ratio: float = 0.4
+    seed: int = 42
+
+    @property
+    def teacher_count(self):
+        return self.teachers or max(1, self.courses // 5)
+
+
+# Named presets used by the benchmark and the seeder.
+PRESETS = {
+    "tiny": CampusSpec(students=200, courses=10, doubts=600, notifications=50),
+    "small": CampusSpec(),
+    "medium": CampusSpec(students=10_000, courses=200, doubts=40_000, notifications=2_000),
+    "large": CampusSpec(students=50_000, courses=500, doubts=200_000, notifications=5_000),
+}
+
+
+def _rng(spec, kind, i):
+    """Independent RNG for record ``i`` of ``kind`` — stable across runs."""
+    return random.Random(f"{spec.seed}:{kind}:{i}")
+
+
+# ─── IDs ──────────────────────────────────────────────────────────────────────
+
+def student_id(i):
+    return f"student_{i + 1}"
+
+
+def teacher_id(i):
+    return f"teacher_{i + 1}"
+
+
+def course_id(i):
+    return f"C{i + 1:04d}"
+
+
+def doubt_id(i):
+    return f"doubt_{i + 1}"
+
+
+def course_teacher(spec, c):
+    """Index of the teacher who owns course ``c``."""
+    return c % spec.teacher_count
+
+
+def student_courses(spec, i):
+    """Course indices that student ``i`` is enrolled in."""
+    k = min(spec.courses_per_student, spec.courses)
+    return sorted(_rng(spec, "enroll", i).sample(range(spec.courses), k))
+
+
+# ─── Record Streams ───────────────────────────────────────────────────────────
+
+def iter_settings(spec):
+    yield Record("system/settings", {
+        "maintenance_mode": False,
+        "exam_mode": False,
+        "attendance_threshold": 75,
+        "cgpa_threshold": 5.0,
+    }, True)
+
+
+def iter_teachers(spec, start=0):
+    for i in range(start, spec.teacher_count):
+        r = _rng(spec, "teacher", i)
+        name = f"Dr. {r.choice(FIRST_NAMES)} {r.choice(LAST_NAMES)}"
+        uid = teacher_id(i)
+        yield Record(f"users/{uid}", {
+            "uid": uid,
+            "role": "admin",
+            "email": f"{uid}@manan.ai",
+            "profile": {"name": name, "avatar_url": ""},
+            "created_at": EPOCH,
+        }, False)
+
+
+def iter_students(spec, start=0):
+    for i in range(start, spec.students):
+        r = _rng(spec, "student", i)
+        uid = student_id(i)
+        attendance = round(min(100.0, max(20.0, r.gauss(80, 12))), 1)
+        cgpa = round(min(10.0, max(2.0, r.gauss(7.0, 1.5))), 2)
+        year = r.randint(1, 4)
+        risk_status = "At Risk" if attendance < 75 or cgpa < 5.0 else "Safe"
+        yield Record(f"users/{uid}", {
+            "uid": uid,
+            "role": "student",
+            "email": f"{uid}@manan.ai",
+            "enrollment_no": f"BBDU{2022 + (4 - year)}{i + 1:06d}",
+            "semester": str(year * 2 - r.randint(0, 1)),
+            "profile": {
+                "name": f"{r.choice(FIRST_NAMES)} {r.choice(LAST_NAMES)}",
+                "roll_number": f"R{i + 1:06d}",
+                "branch": r.choice(BRANCHES),
+                "year": year,
+                "avatar_url": "",
+            },
+            "academic_stats": {
+                "attendance_percent": attendance,
+                "cgpa": cgpa,
+                "risk_status": risk_status,
+                "courses_enrolled": [course_id(c) for c in student_courses(spec, i)],
+            },
+            "created_at": EPOCH + timedelta(minutes=i),
+        }, False)
+
+
+def iter_courses(spec, start=0):
+    for c in range(start, spec.courses):
+        r = _rng(spec, "course", c)
+        title, topics = SUBJECTS[c % len(SUBJECTS)]
+        cid = course_id(c)
+        t = course_teacher(spec, c)
+        yield Record(f"courses/{cid}", {
+            "course_id": cid,
+            "code": cid,
+            "title": f"{title} {c // len(SUBJECTS) + 1}" if c >= len(SUBJECTS) else title,
+            "description": f"Core course on {title.lower()}.",
+            "department": BRANCHES[c % len(BRANCHES)],
+            "semester": r.randint(1, 8),
+            "teacher_id": teacher_id(t),
+            "teacher_name": f"Teacher {t + 1}",
+            "syllabus_topics": topics,
+            "student_count": 0,
+            "doubts_count": 0,
+            "created_at": EPOCH,
+        }, False)
+
+
+def iter_enrollments(spec, start=0):
+    """Both enrollment mirrors for every student from ``start`` onwards."""
+    for i in range(start, spec.students):
+        uid = student_id(i)
+        for c in student_courses(spec, i):
+            cid = course_id(c)
+            ts = EPOCH + timedelta(days=1, minutes=i)
+            yield Record(f"courses/{cid}/students/{uid}", {"enrolled_at": ts, "uid": uid}, False)
+            yield Record(f"users/{uid}/enrolled_courses/{cid}", {"enrolled_at": ts, "course_id": cid}, False)
+
+
+def iter_course_counts(spec):
+    """Final ``student_count`` / ``doubts_count`` per course.
+
+    Needs one pass over the enrollment and doubt assignments, but only keeps
+    a counter per course in memory.
+    """
+    students = [0] * spec.courses
+    for i in range(spec.students):
+        for c in student_courses(spec, i):
+            students[c] += 1
+    doubts = [0] * spec.courses
+    for i in range(spec.doubts):
+        doubts[_doubt_course(spec, i)[1]] += 1
+    for c in range(spec.courses):
+        yield Record(f"courses/{course_id(c)}", {
+            "student_count": students[c],
+            "doubts_count": doubts[c],
+        }, True)
+
+
+def _doubt_course(spec, i):
+    r = _rng(spec, "doubt", i)
+    s = r.randrange(spec.students)
+    return r, r.choice(student_courses(spec, s)), s
+
+
+def iter_doubts(spec, start=0):
+    for i in range(start, spec.doubts):
+        r, c, s = _doubt_course(spec, i)
+        _, topics = SUBJECTS[c % len(SUBJECTS)]
+        a, b = r.sample(topics, 2)
+        uid = student_id(s)
+        is_open = r.random() < spec.open_doubt_ratio
+        data = {
+            "doubt_id": doubt_id(i),
+            "course_id": course_id(c),
+            "student_id": uid,
+            "student_uid": uid,
+            "student_email": f"{uid}@manan.ai",
+            "question": r.choice(QUESTION_TEMPLATES).format(a=a, b=b),
+            "status": "open" if is_open else "resolved",
+            "created_at": EPOCH + timedelta(days=2, seconds=i * 30),
+        }
+        if not is_open:
+            data["faculty_answer"] = f"See the lecture notes on {a}."
+            data["resolved_by"] = teacher_id(course_teacher(spec, c))
+        yield Record(f"doubts/{doubt_id(i)}", data, False)
+
+
+def iter_notifications(spec, start=0):
+    for i in range(start, spec.notifications):
+        r = _rng(spec, "notification", i)
+        t = teacher_id(r.randrange(spec.teacher_count))
+        data = {
+            "title": f"Reminder #{i + 1}: check the course portal",
+            "type": r.choice(["info", "urgent", "success", "warning"]),
+            "sender_uid": t,
+            "sender_email": f"{t}@manan.ai",
+            "created_at": EPOCH + timedelta(hours=i),
+        }
+        if r.random() < 0.5:
+            data["target_uid"] = student_id(r.randrange(spec.students))
+            data["read"] = False
+        yield Record(f"notifications/notif_{i + 1}", data, False)
+
+
+# Stream name → generator; the order is also the recommended write order.
+STREAMS = {
+    "settings": iter_settings,
+    "teachers": iter_teachers,
+    "students": iter_students,
+    "courses": iter_courses,
+    "enrollments": iter_enrollments,
+    "doubts": iter_doubts,
+    "notifications": iter_notifications,
+    "course_counts": iter_course_counts,
+}
+
+
+def iter_campus(spec):
+    """Every record of the campus, in write order."""
+    for stream in STREAMS.values():
+        yield from stream(spec)
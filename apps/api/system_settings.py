@@ -0,0 +1,130 @@
+"""
+system_settings.py — Cached view of the ``system/settings`` document
+
+Hot paths (exam-mode checks, rate limits, risk thresholds) read settings
+through ``get_settings()``, which refreshes from Firestore at most once per
+``SETTINGS_CACHE_TTL`` seconds. Refreshes go through the shared cache tier
+(cache.py), so one worker's load serves the others. ``update_system_settings``
+calls ``invalidate()``, which reaches every worker through the cache's pub/sub
+channel.
+
+``RateLimits`` validates ``rate_limits`` updates before they are written, so
+a malformed value can't break every rate-limited request.
+"""
+
+import copy
+import os
+import threading
+import time
+from typing import Dict
+
+from pydantic import BaseModel, ConfigDict, NonNegativeFloat, NonNegativeInt, PositiveInt, field_validator
+
+import cache
+from firebase_config import db
+
+CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "15"))
+
+DEFAULTS = {
+    "maintenance_mode": False,
+    "exam_mode": False,
+    "attendance_threshold": 75,
+    "cgpa_threshold": 5.0,
+    "rate_limits": {
+        # Token buckets per (student, route): sustained rate and burst size.
+        # route_per_minute caps the route across all students (0 = no cap).
+        # /solve-doubt takes student_id from the body, so the route cap is
+        # what bounds a caller that rotates IDs.
+        "routes": {
+            "/solve-doubt": {"per_minute": 10, "burst": 5, "route_per_minute": 600, "route_burst": 300},
+        },
+        # Global gate in front of Gemini calls.
+        "gemini_concurrency": 8,
+        "gemini_queue": 16,
+        "gemini_queue_timeout_s": 2.0,
+    },
+    # Daily Gemini limits per UTC day, enforced from usage.py's ledger (0 = none).
+    "gemini_quota": {
+        "student_daily_tokens": 0,
+        "student_daily_calls": 0,
+        "course_daily_tokens": 0,
+    },
+}
+
+
+
+class RouteLimits(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    per_minute: NonNegativeFloat = 0
+    burst: NonNegativeFloat = 1
+    route_per_minute: NonNegativeFloat = 0
+    route_burst: NonNegativeFloat = 0
+
+
+class RateLimits(BaseModel):
+    """A ``rate_limits`` update; fields left out keep their stored values."""
+    model_config = ConfigDict(extra="forbid")
+
+    routes: Dict[str, RouteLimits] = {}
+    gemini_concurrency: PositiveInt = 8
+    gemini_queue: NonNegativeInt = 16
+    gemini_queue_timeout_s: NonNegativeFloat = 2.0
+
+    @field_validator("routes")
+    @classmethod
+    def _known_routes(cls, routes):
+        unknown = sorted(set(routes) - set(DEFAULTS["rate_limits"]["routes"]))
+        if unknown:
+            raise ValueError(f"No rate limits for {', '.join(unknown)}")
+        return routes
+
+
+_cache = {"value": None, "loaded_at": 0.0}
+_lock = threading.Lock()
+
+
+def _merge(defaults, overrides):
+    out = copy.deepcopy(defaults)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(out.get(key), dict):
+            out[key] = _merge(out[key], value)
+        else:
+            out[key] = value
+    return out
+
+
+def _load():
+    doc = db.collection("system").document("settings").get()
+    return _merge(DEFAULTS, doc.to_dict() if doc.exists else {})
+
+
+def get_settings():
+    """Settings merged over DEFAULTS; the last good value is kept if a refresh fails."""
+    value = _cache["value"]
+    if value is not None and time.monotonic() - _cache["loaded_at"] < CACHE_TTL:
+        return value
+    with _lock:
+        # Another thread may have refreshed while we waited.
+        if _cache["value"] is not None and time.monotonic() - _cache["loaded_at"] < CACHE_TTL:
+            return _cache["value"]
+        try:
+            _cache["value"] = cache.shared.get_or_load("settings", CACHE_TTL, _load)
+        except Exception as e:
+            print(f"⚠️  Could not load system settings: {e}")
+            if _cache["value"] is None:
+                _cache["value"] = copy.deepcopy(DEFAULTS)
+        _cache["loaded_at"] = time.monotonic()
+        return _cache["value"]
+
+
+def _expire():
+    _cache["loaded_at"] = 0.0
+
+
+def invalidate():
+    """Drop the cached settings in every worker (``settings:doc`` is the raw document)."""
+    cache.shared.invalidate("settings", "settings:doc")
+
+
+cache.shared.on_invalidate("settings", _expire)
@@ -0,0 +1,229 @@
+"""
+tasks.py — Durable background tasks for request side effects
+
+Handlers ``enqueue`` side effects that don't change their response (counter
+bumps, notification fan-out) and return right away. Tasks are stored in a
+local SQLite file (WAL mode) before ``enqueue`` returns. Worker threads run
+them from there, so a task enqueued before a crash or restart still runs
+after it.
+
+* Delivery is at-least-once. A task whose worker died mid-run is picked up
+  again once its lease expires, so task functions must be idempotent
+  (deterministic document IDs, ``create()`` guards).
+* A failed task is retried with exponential backoff and jitter. After
+  ``TASKS_MAX_ATTEMPTS`` attempts it moves to the dead-letter list, where
+  ``dead()`` shows it and ``retry_dead()`` puts it back in the queue.
+* Several worker processes can share one file. Claims are single
+  ``UPDATE ... RETURNING`` statements, so each task goes to one worker.
+* If the file can't be written, ``enqueue`` runs the task inline, so the side
+  effect is not lost.
+
+Configuration (environment):
+    TASKS_DB             SQLite file (default .tasks.sqlite3)
+    TASKS_WORKERS        worker threads per process (default 4)
+    TASKS_MAX_ATTEMPTS   attempts before dead-lettering (default 8)
+    TASKS_BACKOFF_S      first retry delay; doubles per attempt (default 1)
+    TASKS_MAX_BACKOFF_S  longest retry delay (default 300)
+    TASKS_LEASE_S        a running task is re-queued after this long (default 300)
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import orjson
+
+DB_PATH = os.getenv("TASKS_DB", ".tasks.sqlite3")
+WORKERS = int(os.getenv("TASKS_WORKERS", "4"))
+MAX_ATTEMPTS = int(os.getenv("TASKS_MAX_ATTEMPTS", "8"))
+BACKOFF_S = float(os.getenv("TASKS_BACKOFF_S", "1"))
+MAX_BACKOFF_S = float(os.getenv("TASKS_MAX_BACKOFF_S", "300"))
+LEASE_S = float(os.getenv("TASKS_LEASE_S", "300"))
+
+# Workers also poll, for tasks enqueued by other processes sharing the file.
+POLL_S = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',   -- pending | running | dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_due ON tasks (state, run_at);
+"""
+
+
+class TaskQueue:
+    def __init__(self, path=DB_PATH, workers=WORKERS, max_attempts=MAX_ATTEMPTS, backoff_s=BACKOFF_S,
+                 max_backoff_s=MAX_BACKOFF_S, lease_s=LEASE_S):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.lease_s = lease_s
+        self._handlers = {}
+        self._local = threading.local()
+        self._wake = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self.stats = {"enqueued": 0, "done": 0, "retried": 0, "dead": 0, "inline": 0}
+
+    # ── Storage ───────────────────────────────────────────────────────────────
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable across process crashes
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # ── Producers ─────────────────────────────────────────────────────────────
+
+    def task(self, name):
+        """Decorator registering ``fn(payload)`` as the handler for ``name``."""
+        def register(fn):
+            self._handlers[name] = fn
+            return fn
+        return register
+
+    def enqueue(self, name, payload, delay=0.0):
+        """Persist a task; it runs on a worker thread as soon as one is free."""
+        if name not in self._handlers:
+            raise KeyError(f"No task handler registered for {name!r}")
+        now = time.time()
+        try:
+            self._db().execute("INSERT INTO tasks (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+                               (name, orjson.dumps(payload), now + delay, now))
+        except sqlite3.Error as e:
+            print(f"⚠️  Task queue unavailable, running {name} inline: {e}")
+            self.stats["inline"] += 1
+            self._handlers[name](payload)
+            return
+        self.stats["enqueued"] += 1
+        with self._wake:
+            self._wake.notify()
+
+    # ── Workers ───────────────────────────────────────────────────────────────
+
+    def _claim(self):
+        now = time.time()
+        # Expired leases (a worker that died mid-task) count as due.
+        return self._db().execute(
+            "UPDATE tasks SET state = 'running', attempts = attempts + 1, run_at = ? "
+            "WHERE id = (SELECT id FROM tasks WHERE (state = 'pending' AND run_at <= ?) "
+            "OR (state = 'running' AND run_at <= ?) ORDER BY run_at LIMIT 1) "
+            "RETURNING id, name, payload, attempts",
+            (now + self.lease_s, now, now)).fetchone()
+
+    def _next_due(self):
+        row = self._db().execute("SELECT MIN(run_at) FROM tasks WHERE state != 'dead'").fetchone()
+        return row[0] if row and row[0] is not None else None
+
+    def _backoff(self, attempts):
+        delay = min(self.max_backoff_s, self.backoff_s * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def run_one(self):
+        """Claim and run one due task; returns False if none was due."""
+        row = self._claim()
+        if row is None:
+            return False
+        task_id, name, payload, attempts = row
+        db = self._db()
+        try:
+            handler = self._handlers.get(name)
+            if handler is None:
+                raise KeyError(f"No task handler registered for {name!r}")
+            handler(orjson.loads(payload))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempts >= self.max_attempts:
+                db.execute("UPDATE tasks SET state = 'dead', last_error = ? WHERE id = ?", (error, task_id))
+                self.stats["dead"] += 1
+                print(f"⚠️  Task {name} #{task_id} dead-lettered after {attempts} attempts: {error}")
+            else:
+                db.execute("UPDATE tasks SET state = 'pending', run_at = ?, last_error = ? WHERE id = ?",
+                           (time.time() + self._backoff(attempts), error, task_id))
+                self.stats["retried"] += 1
+            return True
+        db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        self.stats["done"] += 1
+        return True
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_one():
+                    continue
+                due = self._next_due()
+            except sqlite3.Error as e:
+                print(f"⚠️  Task worker: {e}")
+                due = None
+            wait = POLL_S if due is None else min(POLL_S, max(0.0, due - time.time()))
+            with self._wake:
+                self._wake.wait(wait)
+
+    def start(self):
+        """Start the worker threads (after any fork); pending tasks from before a restart run first."""
+        if self._threads:
+            return
+        self._stop.clear()
+        self._db()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"tasks-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self, timeout=10):
+        """Stop the workers; tasks not yet run stay in the file for the next start."""
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def drain(self, timeout=10):
+        """Run due tasks on this thread until none are left (tests, shutdown scripts)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.run_one():
+            pass
+
+    # ── Inspection ────────────────────────────────────────────────────────────
+
+    def counts(self):
+        rows = self._db().execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+        return {"pending": 0, "running": 0, "dead": 0, **dict(rows)}
+
+    def dead(self, limit=100):
+        rows = self._db().execute(
+            "SELECT id, name, payload, attempts, created_at, last_error FROM tasks WHERE state = 'dead' "
+            "ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [{"id": r[0], "name": r[1], "payload": orjson.loads(r[2]), "attempts": r[3],
+                 "created_at": r[4], "last_error": r[5]} for r in rows]
+
+    def retry_dead(self, ids=None):
+        """Re-queue dead tasks (all of them, or ``ids``) with a fresh attempt count."""
+        query = "UPDATE tasks SET state = 'pending', attempts = 0, run_at = ? WHERE state = 'dead'"
+        params = [time.time()]
+        if ids is not None:
+            if not ids:
+                return 0
+            query += f" AND id IN ({','.join('?' * len(ids))})"
+            params += list(ids)
+        count = self._db().execute(query, params).rowcount
+        with self._wake:
+            self._wake.notify_all()
+        return count
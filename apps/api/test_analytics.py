@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+
+import analytics
+import synthetic_data as sd
+from bench.memstore import MemoryFirestore
+
+
+def _campus():
+    db = MemoryFirestore()
+    db.load(sd.iter_campus(sd.PRESETS["tiny"]))
+    return db
+
+
+def test_full_export_and_compute(tmp_path):
+    db = _campus()
+    path = str(tmp_path / "snapshot.npz")
+    snapshot = analytics.Exporter(db, path).export()
+    assert snapshot.meta["mode"] == "full"
+
+    result = analytics.compute(analytics.Snapshot.load(path), 75, 5.0)
+
+    students = [d.to_dict() for d in db.collection("users").where("role", "==", "student").stream()]
+    at_risk = [s for s in students if s["academic_stats"]["attendance_percent"] < 75
+               or s["academic_stats"]["cgpa"] < 5.0]
+    assert (result["students"], result["at_risk"]) == (len(students), len(at_risk))
+    assert sum(b["students"] for b in result["risk_by_branch"]) == len(students)
+    assert sum(result["attendance"]["histogram"]["counts"]) == len(students)
+
+    courses = {c["course_id"]: c for c in result["courses"]}
+    c1 = sd.course_id(0)
+    expected_doubts = [d for d in db.collection("doubts").where("course_id", "==", c1).stream()]
+    assert courses[c1]["doubts"] == len(expected_doubts)
+    assert courses[c1]["enrolled"] == len(list(db.collection("courses").document(c1).collection("students").stream()))
+
+    year_1 = analytics.compute(snapshot, 75, 5.0, year=1)
+    assert year_1["students"] == sum(1 for s in students if s["profile"]["year"] == 1)
+
+
+def test_incremental_export_reads_only_changes(tmp_path):
+    db = _campus()
+    path = str(tmp_path / "snapshot.npz")
+    analytics.Exporter(db, path).export()
+
+    now = datetime.now(timezone.utc)
+    uid = sd.student_id(0)
+    db.collection("users").document(uid).update({
+        "academic_stats.attendance_percent": 12.0, "updated_at": now})
+    db.collection("doubts").document("new_doubt").set({
+        "course_id": sd.course_id(0), "student_id": uid, "question": "Why?",
+        "status": "open", "created_at": now})
+
+    snapshot = analytics.Exporter(db, path).export()
+    assert snapshot.meta["mode"] == "incremental"
+    assert snapshot.meta["read"]["students"] == 1
+    assert snapshot.meta["read"]["doubts"] == 1
+    assert snapshot.meta["rows"]["doubts"] == sd.PRESETS["tiny"].doubts + 1
+
+    students = snapshot.tables["students"]
+    row = list(students["uid"]).index(uid)
+    assert students["attendance"][row] == 12.0
+    assert len(students["uid"]) == sd.PRESETS["tiny"].students
+
+
+def test_filters_on_a_campus_without_students(tmp_path):
+    db = _campus()
+    for doc in db.collection("users").where("role", "==", "student").stream():
+        doc.reference.delete()
+    snapshot = analytics.Exporter(db, str(tmp_path / "snapshot.npz")).export()
+    assert snapshot.meta["rows"]["students"] == 0 and snapshot.meta["rows"]["doubts"] > 0
+
+    result = analytics.compute(snapshot, 75, 5.0, branch="CSE", year=2)
+    assert result["students"] == 0
+    assert all(c["doubts"] == c["enrolled"] == 0 for c in result["courses"])
+
+
+def test_background_export_runs_one_at_a_time(tmp_path):
+    db = _campus()
+    path = str(tmp_path / "snapshot.npz")
+    with analytics._exporter_lock:  # an export is already running
+        assert analytics.export_in_background(db, path=path) is None
+    thread = analytics.export_in_background(db, path=path)
+    thread.join(10)
+    assert analytics.Snapshot.load(path).meta["rows"]["students"] == sd.PRESETS["tiny"].students
+    assert not analytics._exporter_lock.locked()
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import cache
+from bench.memredis import MemoryRedis
+
+
+def _workers(n, server, **kwargs):
+    workers = [cache.TwoLevelCache(server, **kwargs) for _ in range(n)]
+    for w in workers:
+        w.start()
+    return workers
+
+
+def _eventually(check, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.01)
+    return check()
+
+
+def test_one_load_serves_every_worker():
+    server = MemoryRedis()
+    a, b, c = _workers(3, server)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {"courses": [{"id": "C1", "title": "DBMS"}]}
+
+    for w in (a, b, c, a, b, c):
+        assert w.get_or_load("courses", 60, loader)["courses"][0]["title"] == "DBMS"
+    assert len(loads) == 1
+    assert (a.stats["misses"], b.stats["l2_hits"], c.stats["l1_hits"]) == (1, 1, 1)
+    for w in (a, b, c):
+        w.close()
+
+
+def test_invalidation_reaches_every_worker_and_hooks():
+    server = MemoryRedis()
+    a, b = _workers(2, server)
+    version = {"n": 1}
+    expired = []
+    b.on_invalidate("settings", lambda: expired.append(1))
+
+    assert a.get_or_load("settings", 60, lambda: dict(version))["n"] == 1
+    assert b.get_or_load("settings", 60, lambda: dict(version))["n"] == 1
+
+    version["n"] = 2
+    a.invalidate("settings")
+    assert _eventually(lambda: expired == [1])
+    assert b.get_or_load("settings", 60, lambda: dict(version))["n"] == 2
+    for w in (a, b):
+        w.close()
+
+
+def test_loader_runs_once_under_concurrency_and_errors_are_not_cached():
+    c = cache.TwoLevelCache(MemoryRedis())
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"role": "admin"}
+
+    threads = [threading.Thread(target=c.get_or_load, args=("role:t1", 60, slow)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+
+    def broken():
+        raise RuntimeError("firestore down")
+
+    try:
+        c.get_or_load("profile:s1", 60, broken)
+        raise AssertionError("loader error should propagate")
+    except RuntimeError:
+        pass
+    assert c.get_or_load("profile:s1", 60, lambda: {"uid": "s1"}) == {"uid": "s1"}
+
+
+def test_value_loaded_across_an_invalidation_is_not_cached():
+    c = cache.TwoLevelCache(MemoryRedis())
+    version = {"n": 1}
+
+    def racing_write():
+        old = dict(version)  # read before the write...
+        version["n"] = 2
+        c.invalidate("profile:s1")  # ...which invalidates before the load finishes
+        return old
+
+    assert c.get_or_load("profile:s1", 60, racing_write) == {"n": 1}
+    assert c.get_or_load("profile:s1", 60, lambda: dict(version)) == {"n": 2}
+    assert c._generations == {}
+
+
+def test_shared_store_outage_fails_open():
+    server = MemoryRedis()
+    c = cache.TwoLevelCache(server, retry_s=60)
+    server.fail = True
+    assert c.get_or_load("courses", 60, lambda: {"courses": []}) == {"courses": []}
+    assert c.get_or_load("courses", 60, lambda: 1 / 0) == {"courses": []}  # L1 still works
+    assert c.stats["l2_errors"] == 1  # then backs off instead of retrying every call
+    c.invalidate("courses")
+
+
+if __name__ == "__main__":
+    test_one_load_serves_every_worker()
+    test_invalidation_reaches_every_worker_and_hooks()
+    test_loader_runs_once_under_concurrency_and_errors_are_not_cached()
+    test_value_loaded_across_an_invalidation_is_not_cached()
+    test_shared_store_outage_fails_open()
+    print("✅ Cache tests passed")
@@ -0,0 +1,83 @@
+import cache
+import conversations
+from bench.memredis import MemoryRedis
+
+
+def _prompt_tokens(contents, config):
+    text = contents if isinstance(contents, str) else " ".join(c["parts"][0]["text"] for c in contents)
+    if config:
+        text += config["system_instruction"]
+    return conversations.estimate_tokens(text)
+
+
+def test_prompts_stay_under_budget_with_occasional_summaries():
+    convs = conversations.Conversations(cache.TwoLevelCache(None), budget=600, summary_tokens=100)
+    summaries = []
+
+    def summarize(summary, turns):
+        summaries.append(len(turns))
+        return f"{summary} covered {len(turns)} more turns".strip()
+
+    conversation_id, state = convs.start("s1", "CS301")
+    pasted = ""
+    for turn in range(30):
+        question = f"Follow-up {turn}: how does paging interact with the TLB in case {turn}? " * 3
+        contents, config = convs.prompt(state, question, summarize)
+        assert _prompt_tokens(contents, config) <= 600
+        answer = "The TLB caches page table entries so most lookups skip the walk. " * 6
+        state = convs.record(conversation_id, state, question, answer)
+        state = convs.load(conversation_id, "s1")
+        pasted += question + answer
+
+    assert contents[-1]["parts"][0]["text"] == question and "covered" in config["system_instruction"]
+    assert 2 <= len(summaries) <= 10 and min(summaries) >= 2  # folds several turns at a time
+    assert _prompt_tokens(contents, config) * 5 < conversations.estimate_tokens(pasted)
+    assert state["n"] == 30
+
+
+def test_any_worker_continues_a_conversation_and_only_its_student():
+    server = MemoryRedis()
+    a = conversations.Conversations(cache.TwoLevelCache(server))
+    b = conversations.Conversations(cache.TwoLevelCache(server))
+
+    conversation_id, state = a.start("s1")
+    assert a.prompt(state, "What is a deadlock?") == ("What is a deadlock?", None)
+    a.record(conversation_id, state, "What is a deadlock?", "A cycle of waits.", answer_tokens=5)
+    state = b.load(conversation_id, "s1")
+    b.record(conversation_id, state, "How do I prevent it?", "Break a Coffman condition.")
+
+    state = a.load(conversation_id, "s1")  # not the stale copy a cached locally
+    contents, _ = a.prompt(state, "Give an example")
+    assert [c["parts"][0]["text"] for c in contents] == [
+        "What is a deadlock?", "A cycle of waits.", "How do I prevent it?", "Break a Coffman condition.",
+        "Give an example"]
+    assert a.load(conversation_id, "s2") is None
+    assert a.load("unknown", "s1") is None
+
+
+def test_idle_conversations_expire_and_failed_summaries_keep_an_extract():
+    now = [0.0]
+    convs = conversations.Conversations(cache.TwoLevelCache(None, clock=lambda: now[0]), budget=200,
+                                        summary_tokens=50, ttl=60)
+    conversation_id, state = convs.start("s1")
+    for i in range(4):
+        state = convs.record(conversation_id, state, f"Question {i} about semaphores", "x" * 200)
+
+    def failing(summary, turns):
+        raise TimeoutError("gemini timed out")
+
+    contents, config = convs.prompt(state, "And monitors?", failing)
+    assert "Asked: Question 0 about semaphores" in config["system_instruction"]
+    assert convs.stats["summary_failures"] == 1
+
+    now[0] = 59
+    assert convs.load(conversation_id, "s1") is not None
+    now[0] = 61
+    assert convs.load(conversation_id, "s1") is None
+
+
+if __name__ == "__main__":
+    test_prompts_stay_under_budget_with_occasional_summaries()
+    test_any_worker_continues_a_conversation_and_only_its_student()
+    test_idle_conversations_expire_and_failed_summaries_keep_an_extract()
+    print("✅ Conversation tests passed")
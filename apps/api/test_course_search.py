@@ -0,0 +1,67 @@
+import course_search
+import synthetic_data as sd
+from bench.memstore import MemoryFirestore
+
+COURSES = [
+    {"id": "CS301", "title": "Operating Systems", "code": "CS301", "department": "CSE", "semester": 5,
+     "syllabus_topics": ["Process Management", "CPU Scheduling Algorithms", "Virtual Memory"]},
+    {"id": "CS302", "title": "Database Management Systems", "code": "CS302", "department": "CSE", "semester": 5,
+     "syllabus_topics": ["Normalization (1NF to BCNF)", "Transaction Management"]},
+    {"id": "IT401", "title": "Cloud Computing", "code": "IT401", "department": "IT", "semester": 7,
+     "description": "Virtualization and scheduling in data centres.",
+     "syllabus_topics": ["Virtual Machines", "Resource Scheduling"]},
+]
+
+
+def _ids(result):
+    return [hit["id"] for hit in result["results"]]
+
+
+def test_ranking_prefix_and_typos():
+    index = course_search.CourseIndex.from_courses(COURSES)
+
+    assert _ids(index.search("operating systems")) == ["CS301"]
+    assert _ids(index.search("oper")) == ["CS301"]              # prefix on the last word
+    assert _ids(index.search("opreating")) == ["CS301"]         # transposition
+    assert _ids(index.search("normalisation")) == ["CS302"]     # one substitution
+    # A title match outranks a syllabus-only one.
+    assert _ids(index.search("management")) == ["CS302", "CS301"]
+    hits = {h["id"]: h for h in index.search("scheduling")["results"]}
+    assert hits["CS301"]["matched_topics"] == ["CPU Scheduling Algorithms"]
+    # No course has both words: fall back to partial matches.
+    assert set(_ids(index.search("virtual normalization"))) == {"CS301", "CS302", "IT401"}
+
+
+def test_facets_and_filters():
+    index = course_search.CourseIndex.from_courses(COURSES)
+
+    result = index.search("", department="CSE")
+    assert result["total"] == 2
+    assert result["facets"]["department"] == {"CSE": 2, "IT": 1}  # own filter ignored
+    assert result["facets"]["semester"] == {"5": 2}
+    assert _ids(index.search("scheduling", semester="7")) == ["IT401"]
+    assert _ids(index.search("", limit=1, offset=1)) == ["CS302"]  # browse is by title
+
+
+def test_listener_and_incremental_updates():
+    db = MemoryFirestore()
+    db.load(sd.iter_campus(sd.PRESETS["tiny"]))
+    index = course_search.CourseIndex(db)
+    index.start()
+    assert index.ready() and index.stats()["courses"] == sd.PRESETS["tiny"].courses
+
+    db.collection("courses").document("NEW1").set({"title": "Quantum Cryptography", "department": "CSE"})
+    assert _ids(index.search("quantum")) == ["NEW1"]
+    index.patch("NEW1", {"syllabus_topics": ["Shor's Algorithm"]})
+    assert _ids(index.search("shor")) == ["NEW1"]
+    db.collection("courses").document("NEW1").delete()
+    assert index.search("quantum")["total"] == 0
+    assert "quantum" not in index._postings and "quantum" not in index._vocab
+    index.close()
+
+
+if __name__ == "__main__":
+    test_ranking_prefix_and_typos()
+    test_facets_and_filters()
+    test_listener_and_incremental_updates()
+    print("✅ Course search tests passed")
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import dashboard
+import resilience
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _board(loaders, timeout=0.5, clock=time.monotonic):
+    return dashboard.Dashboard([dashboard.Section(name, fn, ttl, shared)
+                                for name, (fn, ttl, shared) in loaders.items()],
+                               timeout=timeout, clock=clock)
+
+
+def test_sections_load_concurrently():
+    def slow(value):
+        def load(uid):
+            time.sleep(0.2)
+            return {"uid": uid, "value": value}
+        return load
+
+    board = _board({name: (slow(name), 30, False) for name in ("a", "b", "c", "d", "e")}, timeout=2)
+    started = time.perf_counter()
+    result = board.load("s1")
+    elapsed = time.perf_counter() - started
+
+    assert result["status"] == "success"
+    assert result["c"] == {"uid": "s1", "value": "c"}
+    assert elapsed < 0.6  # bounded by the slowest read, not the sum (1.0s)
+
+
+def test_slow_section_times_out_and_fills_cache_for_next_load():
+    release = threading.Event()
+
+    def stuck(uid):
+        release.wait(5)
+        return {"items": [1, 2]}
+
+    board = _board({"fast": (lambda uid: {"ok": True}, 30, False), "slow": (stuck, 30, False)}, timeout=0.1)
+    result = board.load("s1")
+    assert result["status"] == "partial"
+    assert result["fast"] == {"ok": True}
+    assert result["slow"] is None
+    assert result["sections"]["slow"] == {"status": "timeout"}
+
+    release.set()
+    for _ in range(50):
+        if not board._inflight:
+            break
+        time.sleep(0.01)
+    result = board.load("s1")
+    assert result["status"] == "success"
+    assert result["slow"] == {"items": [1, 2]}
+    assert result["sections"]["slow"]["cached"] is True
+
+
+def test_per_section_ttl_shared_sections_and_stale_fallback():
+    clock = Clock()
+    calls = {"profile": 0, "courses": 0}
+    failing = {"profile": False}
+
+    def profile(uid):
+        calls["profile"] += 1
+        if failing["profile"]:
+            return {"status": "error", "message": "unavailable"}
+        return {"uid": uid}
+
+    def courses(uid):
+        calls["courses"] += 1
+        return {"courses": []}
+
+    board = _board({"profile": (profile, 10, False), "courses": (courses, 60, True)}, clock=clock)
+    board.load("s1")
+    board.load("s2")
+    assert calls == {"profile": 2, "courses": 1}  # courses cached once for everyone
+
+    clock.now = 30  # profile expired, courses still fresh
+    failing["profile"] = True
+    result = board.load("s1")
+    assert calls == {"profile": 3, "courses": 1}
+    assert result["profile"] == {"uid": "s1"}
+    assert result["sections"]["profile"]["status"] == "error"
+    assert result["sections"]["profile"]["stale"] is True
+
+    board.invalidate("courses")
+    board.load("s1", only={"courses"})
+    assert calls["courses"] == 2
+
+
+def test_open_breaker_is_an_error_and_loaders_see_the_request_budget():
+    clock = Clock()
+    breaker = resilience.CircuitBreaker("firestore", failures=1, reset_s=10, clock=clock)
+    budgets = []
+
+    def profile(uid):
+        budgets.append(resilience.remaining())
+        try:
+            with breaker.guard():
+                return {"uid": uid}
+        except Exception as e:
+            return resilience.error_response(e)
+
+    try:
+        with breaker.guard():
+            raise ConnectionError("firestore down")
+    except ConnectionError:
+        pass
+    assert breaker.state == "open"
+
+    board = _board({"profile": (profile, 60, False)}, clock=clock)
+    with resilience.deadline(5):
+        result = board.load("s1")
+    assert result["status"] == "partial" and result["profile"] is None
+    assert result["sections"]["profile"]["status"] == "error"
+    assert "firestore" in result["sections"]["profile"]["message"]
+    assert budgets[0] is not None and 0 < budgets[0] <= 5
+
+    clock.now = 11  # breaker half-open: the probe succeeds, nothing stale was cached
+    result = board.load("s1", only={"profile"})
+    assert result["profile"] == {"uid": "s1"} and result["sections"]["profile"]["cached"] is False
+
+
+if __name__ == "__main__":
+    test_sections_load_concurrently()
+    test_slow_section_times_out_and_fills_cache_for_next_load()
+    test_per_section_ttl_shared_sections_and_stale_fallback()
+    test_open_breaker_is_an_error_and_loaders_see_the_request_budget()
+    print("✅ Dashboard tests passed")
@@ -0,0 +1,76 @@
+import json
+
+import gemini
+from bench.gemini_stub import _Response, _Usage
+from bench.memstore import MemoryFirestore
+from doubt_drafter import DoubtDrafter
+from synthetic_data import Record
+
+
+def _campus(n_doubts):
+    db = MemoryFirestore()
+    db.load([Record("courses/C1", {"title": "Operating Systems"}, False),
+             Record("courses/C2", {"title": "DBMS"}, False)])
+    db.load(Record(f"doubts/d{i:03d}", {
+        "course_id": "C1" if i % 2 else "C2",
+        "question": f"Question {i}?",
+        "status": "resolved" if i % 5 == 0 else "open",
+    }, False) for i in range(n_doubts))
+    return db
+
+
+def _fake_gemini(calls, fail_courses=()):
+    def generate_content(prompt, model=None, config=None, **kwargs):
+        questions = json.loads(prompt.rsplit("Questions:\n", 1)[1])
+        course = prompt.split('"', 2)[1]
+        calls.append((course, [q["id"] for q in questions]))
+        if course in fail_courses:
+            raise RuntimeError("quota exceeded")
+        text = json.dumps([{"id": q["id"], "answer": f"About {q['question']}"} for q in questions])
+        return _Response(text, _Usage(100, 50))
+    return generate_content
+
+
+def test_drafts_open_doubts_in_grouped_calls(monkeypatch):
+    db = _campus(40)
+    calls = []
+    monkeypatch.setattr(gemini, "generate_content", _fake_gemini(calls))
+
+    report = DoubtDrafter(db, group_size=5, concurrency=3, page_size=10).run()
+
+    open_ids = {f"d{i:03d}" for i in range(40) if i % 5}
+    drafted = {doc.id: doc.to_dict() for doc in db.collection("doubts").stream() if doc.to_dict().get("ai_answer")}
+    assert set(drafted) == open_ids
+    assert all(d["ai_answer_status"] == "draft" for d in drafted.values())
+    assert all(len(ids) <= 5 for _, ids in calls)
+    assert {course for course, _ in calls} == {"Operating Systems", "DBMS"}
+    assert (report.drafted, report.failed, report.calls) == (32, 0, len(calls))
+    assert report.prompt_tokens == 100 * len(calls)
+
+
+def test_resume_skips_finished_pages_and_existing_drafts(monkeypatch, tmp_path):
+    db = _campus(40)
+    checkpoint = str(tmp_path / "draft.json")
+    calls = []
+    monkeypatch.setattr(gemini, "generate_content", _fake_gemini(calls, fail_courses={"DBMS"}))
+    first = DoubtDrafter(db, group_size=4, concurrency=2, page_size=10, retries=0, checkpoint_path=checkpoint).run()
+    assert (first.drafted, first.failed) == (16, 16)
+
+    # Start over from the beginning: only the failed DBMS questions are asked again.
+    calls.clear()
+    monkeypatch.setattr(gemini, "generate_content", _fake_gemini(calls))
+    report = DoubtDrafter(db, group_size=4, concurrency=2, page_size=10).run()
+    assert {course for course, _ in calls} == {"DBMS"}
+    assert report.drafted == 16
+
+    # Resuming from the checkpoint finds nothing left after the last page.
+    calls.clear()
+    resumed = DoubtDrafter(db, group_size=4, concurrency=2, page_size=10, checkpoint_path=checkpoint)
+    assert resumed.report.to_dict() == first.to_dict()
+    resumed.run()
+    assert calls == []
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
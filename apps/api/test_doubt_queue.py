@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+
+import doubt_queue
+import synthetic_data as sd
+from bench.memstore import MemoryFirestore
+
+FIELDS = ["course_id", "student_id", "question", "status", "created_at"]
+
+
+def _index():
+    db = MemoryFirestore()
+    db.load(sd.iter_campus(sd.PRESETS["tiny"]))
+    index = doubt_queue.DoubtIndex(db, FIELDS)
+    index.start()
+    return db, index
+
+
+def _teacher(db, course_id):
+    return db.collection("courses").document(course_id).get().to_dict()["teacher_id"]
+
+
+def _expected(db, teacher_id):
+    courses = {c.id for c in db.collection("courses").where("teacher_id", "==", teacher_id).stream()}
+    return {d.id for d in db.collection("doubts").where("status", "==", "open").stream()
+            if d.to_dict()["course_id"] in courses}
+
+
+def test_index_matches_firestore_and_serves_without_reads():
+    db, index = _index()
+    teacher = _teacher(db, sd.course_id(0))
+    assert index.ready()
+
+    expected = _expected(db, teacher)
+    before = db.totals.snapshot()["reads"]
+    listing = index.open_doubts(teacher)
+    assert {d["id"] for d in listing} == expected
+    assert [d["created_at"] for d in listing] == sorted((d["created_at"] for d in listing), reverse=True)
+    assert listing[0]["course_title"]
+    assert index.next(teacher)["created_at"] == listing[-1]["created_at"]
+    assert db.totals.snapshot()["reads"] == before
+
+
+def test_listener_and_resolve_keep_index_current():
+    db, index = _index()
+    course = sd.course_id(0)
+    teacher = _teacher(db, course)
+    now = datetime.now(timezone.utc)
+
+    db.collection("doubts").document("urgent").set({
+        "course_id": course, "student_id": "s1", "question": "Exam tomorrow?",
+        "status": "open", "priority": 5, "created_at": now})
+    db.collection("doubts").document("ancient").set({
+        "course_id": course, "student_id": "s2", "question": "Old one",
+        "status": "open", "created_at": now - timedelta(days=400)})
+    assert index.next(teacher)["id"] == "urgent"
+    assert index.open_doubts(teacher)[0]["id"] == "urgent"
+
+    # Resolved here: gone at once, and a stale "open" event can't bring it back.
+    index.remove("urgent")
+    assert index.next(teacher)["id"] == "ancient"
+    db.collection("doubts").document("urgent").update({"question": "Exam tomorrow!!"})
+    assert "urgent" not in {d["id"] for d in index.open_doubts(teacher)}
+
+    # Resolved elsewhere: the listener drops it.
+    db.collection("doubts").document("ancient").update({"status": "resolved"})
+    assert index.next(teacher)["id"] != "ancient"
+    assert {d["id"] for d in index.open_doubts(teacher)} == _expected(db, teacher) - {"urgent"}
+
+    # Course handed to another teacher: its doubts move with it.
+    db.collection("courses").document(course).update({"teacher_id": "new_teacher"})
+    assert {d["id"] for d in index.open_doubts("new_teacher")} == _expected(db, "new_teacher") - {"urgent"}
+    assert {d["id"] for d in index.open_doubts(teacher)} == _expected(db, teacher)
+    index.close()
+
+
+def test_rendered_doubts_order_like_the_heap():
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    doubts = [{"id": "new", "created_at": (t0 + timedelta(hours=1)).isoformat()},
+              {"id": "old", "created_at": t0.isoformat()},
+              {"id": "urgent", "priority": 1, "created_at": (t0 + timedelta(hours=2)).isoformat()}]
+    assert [d["id"] for d in sorted(doubts, key=doubt_queue.priority_key)] == ["urgent", "old", "new"]
+    assert doubt_queue.priority_key(doubts[1]) == doubt_queue.priority_key({"created_at": t0})
+
+
+def test_index_and_query_fallback_render_the_same_doubts():
+    from fastapi.testclient import TestClient
+    from bench.run import build_app
+    import main
+
+    app, store = build_app(sd.PRESETS["tiny"])
+    teacher = _teacher(store, sd.course_id(0))
+    urgent = next(d.id for d in store.collection("doubts").where("course_id", "==", sd.course_id(0)).stream()
+                  if d.to_dict()["status"] == "open")
+    store.collection("doubts").document(urgent).update({"priority": 2})
+    with TestClient(app) as client:
+        def ask(path):
+            return client.post(path, json={"teacher_id": teacher, "token": teacher}).json()
+
+        indexed, indexed_next = ask("/admin/doubts"), ask("/admin/doubts/next")
+        main.doubt_index.close()  # not ready: both routes query Firestore
+        queried, queried_next = ask("/admin/doubts"), ask("/admin/doubts/next")
+
+    assert indexed["doubts"] and sorted(indexed["doubts"], key=lambda d: d["id"]) == \
+        sorted(queried["doubts"], key=lambda d: d["id"])
+    assert indexed_next["doubt"] == queried_next["doubt"]
+    assert indexed_next["doubt"]["id"] == urgent and indexed_next["doubt"]["priority"] == 2
+
+
+if __name__ == "__main__":
+    test_index_matches_firestore_and_serves_without_reads()
+    test_listener_and_resolve_keep_index_current()
+    test_rendered_doubts_order_like_the_heap()
+    test_index_and_query_fallback_render_the_same_doubts()
+    print("✅ Doubt queue tests passed")
@@ -0,0 +1,84 @@
+import enrollment
+import synthetic_data as sd
+from bench.memstore import MemoryFirestore
+
+SPEC = sd.PRESETS["tiny"]
+COURSE = sd.course_id(0)
+
+
+def _campus():
+    db = MemoryFirestore()
+    db.load(sd.iter_campus(SPEC))
+    return db
+
+
+def _count(db):
+    return db.collection("courses").document(COURSE).get().to_dict()["student_count"]
+
+
+def test_section_is_enrolled_with_a_status_per_row():
+    db = _campus()
+    already = {sd.student_id(i) for i in range(SPEC.students) if 0 in sd.student_courses(SPEC, i)}
+    section = [sd.student_id(i) for i in range(SPEC.students)]
+    rows = section + ["ghost_1", sd.teacher_id(0), section[0], ""]
+    count_before = _count(db)
+    writes_before = db.totals.snapshot()["writes"]
+
+    summary, results = enrollment.bulk_enroll(db, COURSE, rows)
+
+    new = SPEC.students - len(already)
+    assert summary == {"enrolled": new, "already_enrolled": len(already), "not_found": 1,
+                       "not_a_student": 1, "duplicate": 1, "invalid": 1}
+    assert [r["status"] for r in results[-4:]] == ["not_found", "not_a_student", "duplicate", "invalid"]
+    assert results[0]["row"] == 1 and results[-1]["row"] == len(rows)
+    # Both mirrors per new student, plus one counter update for the whole section
+    assert db.totals.snapshot()["writes"] - writes_before == 2 * new + 1
+    assert _count(db) == count_before + new
+    uid = next(u for u in section if u not in already)
+    assert db.collection("courses").document(COURSE).collection("students").document(uid).get().exists
+    assert db.collection("users").document(uid).collection("enrolled_courses").document(COURSE).get().exists
+
+    # Re-running the same upload changes nothing
+    summary, _ = enrollment.bulk_enroll(db, COURSE, section)
+    assert summary == {"already_enrolled": SPEC.students}
+    assert _count(db) == count_before + new
+
+
+def test_a_failed_batch_is_reported_and_not_counted():
+    db = _campus()
+    real_batch = db.batch
+    batches = []
+
+    def flaky_batch():
+        batch = real_batch()
+        batches.append(batch)
+        if len(batches) == 2:
+            def fail():
+                raise ConnectionError("deadline exceeded")
+            batch.commit = fail
+        return batch
+
+    db.batch = flaky_batch
+    uids = [f"new_{i}" for i in range(600)]
+    for uid in uids:
+        db.collection("users").document(uid).set({"uid": uid, "role": "student"})
+    count_before = _count(db)
+
+    summary, results = enrollment.bulk_enroll(db, COURSE, uids, workers=1)
+
+    assert summary == {"enrolled": 350, "failed": 250}
+    assert all(r["status"] == "failed" and "deadline" in r["error"] for r in results[250:500])
+    assert _count(db) == count_before + 350
+
+
+def test_csv_column_is_found_by_header_or_position():
+    assert enrollment.parse_csv("\ufeffname,Student_ID\nAsha,s1\nRavi,s2\n\n") == ["s1", "s2"]
+    assert enrollment.parse_csv("s1,Asha\ns2,Ravi") == ["s1", "s2"]
+    assert enrollment.parse_csv("") == []
+
+
+if __name__ == "__main__":
+    test_section_is_enrolled_with_a_status_per_row()
+    test_a_failed_batch_is_reported_and_not_counted()
+    test_csv_column_is_found_by_header_or_position()
+    print("✅ Bulk enrollment tests passed")
@@ -0,0 +1,127 @@
+import threading
+
+import orjson
+from pydantic import BaseModel
+
+import cache
+import idempotency
+from bench.memredis import MemoryRedis
+
+
+class Ask(BaseModel):
+    course_id: str
+    question: str
+    token: str
+
+
+def _verify(token):
+    if not token.startswith(("s1-", "s2-")):
+        raise ValueError("Invalid token")
+    return {"uid": token[:2]}
+
+
+def _counting_handler(result=None):
+    calls = []
+
+    def handler():
+        calls.append(1)
+        return result or {"status": "success", "doubt_id": f"d{len(calls)}"}
+    return calls, handler
+
+
+def test_replay_returns_stored_response_without_running_handler(monkeypatch):
+    monkeypatch.setattr(cache, "shared", cache.TwoLevelCache())
+    monkeypatch.setattr(idempotency.auth, "verify_id_token", _verify)
+    calls, handler = _counting_handler()
+    req = Ask(course_id="C1", question="What is paging?", token="s1-a")
+
+    first = idempotency.run("k1", "/courses/doubts", req, handler)
+    retry = idempotency.run("k1", "/courses/doubts", req.model_copy(update={"token": "s1-b"}), handler)
+    assert first == {"status": "success", "doubt_id": "d1"}
+    assert orjson.loads(retry.body) == first
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(calls) == 1
+
+    # Same key, different route or no key: independent.
+    idempotency.run("k1", "/courses", req, handler)
+    idempotency.run(None, "/courses/doubts", req, handler)
+    assert len(calls) == 3
+
+    changed = idempotency.run("k1", "/courses/doubts", req.model_copy(update={"question": "Other"}), handler)
+    assert changed.status_code == 422
+
+
+def test_keys_are_scoped_to_the_verified_caller(monkeypatch):
+    monkeypatch.setattr(cache, "shared", cache.TwoLevelCache())
+    monkeypatch.setattr(idempotency.auth, "verify_id_token", _verify)
+    calls, handler = _counting_handler()
+    req = Ask(course_id="C1", question="q", token="s1-a")
+    assert idempotency.run("k5", "/courses/doubts", req, handler) == {"status": "success", "doubt_id": "d1"}
+
+    # Another user, or no valid token, reusing the key runs the handler (which does its own auth)
+    other = idempotency.run("k5", "/courses/doubts", req.model_copy(update={"token": "s2-a"}), handler)
+    forged = idempotency.run("k5", "/courses/doubts", req.model_copy(update={"token": "forged"}), handler)
+    assert other == {"status": "success", "doubt_id": "d2"} and forged["doubt_id"] == "d3"
+    assert len(calls) == 3
+
+
+def test_errors_are_not_stored(monkeypatch):
+    monkeypatch.setattr(cache, "shared", cache.TwoLevelCache())
+    monkeypatch.setattr(idempotency.auth, "verify_id_token", _verify)
+    req = Ask(course_id="C1", question="q", token="s1-a")
+    calls, failing = _counting_handler({"status": "error", "message": "deadline exceeded"})
+    assert idempotency.run("k2", "/courses/doubts", req, failing)["status"] == "error"
+    _, ok = _counting_handler()
+    assert idempotency.run("k2", "/courses/doubts", req, ok)["status"] == "success"
+
+
+def test_concurrent_retry_on_another_worker_gets_409_then_replay(monkeypatch):
+    monkeypatch.setattr(idempotency.auth, "verify_id_token", _verify)
+    server = MemoryRedis()
+    worker_a, worker_b = cache.TwoLevelCache(server), cache.TwoLevelCache(server)
+    req = Ask(course_id="C1", question="q", token="s1-a")
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return {"status": "success", "count": 30}
+
+    results = {}
+    monkeypatch.setattr(cache, "shared", worker_a)
+    first = threading.Thread(target=lambda: results.update(
+        a=idempotency.run("k3", "/admin/notify/batch", req, slow)))
+    first.start()
+    started.wait(5)
+
+    monkeypatch.setattr(cache, "shared", worker_b)
+    calls, handler = _counting_handler()
+    assert idempotency.run("k3", "/admin/notify/batch", req, handler).status_code == 409
+    release.set()
+    first.join()
+
+    replay = idempotency.run("k3", "/admin/notify/batch", req, handler)
+    assert orjson.loads(replay.body) == results["a"] == {"status": "success", "count": 30}
+    assert calls == []
+
+
+def test_async_handlers(monkeypatch):
+    import asyncio
+    monkeypatch.setattr(cache, "shared", cache.TwoLevelCache())
+    monkeypatch.setattr(idempotency.auth, "verify_id_token", _verify)
+    req = Ask(course_id="C1", question="q", token="s1-a")
+    calls = []
+
+    async def enroll():
+        calls.append(1)
+        return {"status": "success"}
+
+    first = asyncio.run(idempotency.run_async("k4", "/courses/enroll", req, enroll))
+    retry = asyncio.run(idempotency.run_async("k4", "/courses/enroll", req, enroll))
+    assert first == orjson.loads(retry.body) == {"status": "success"}
+    assert calls == [1]
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
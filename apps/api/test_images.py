@@ -0,0 +1,117 @@
+import io
+import socket
+
+import httpx
+import pytest
+
+import cache
+import images
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 2048  # passed through when it can't be decoded
+HOST = "http://93.184.216.34"  # a public address, so the host check passes without DNS
+
+
+def _pipeline(handler, **kwargs):
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    return images.ImagePipeline(client=client, store=cache.TwoLevelCache(None), **kwargs)
+
+
+def test_fetch_is_streamed_and_capped():
+    chunks_sent = []
+
+    def handler(request):
+        if request.url.path == "/claims-huge.jpg":
+            return httpx.Response(200, headers={"content-length": str(50 * 1024 * 1024)}, content=b"")
+
+        def body():  # no Content-Length: only the running total can stop it
+            for _ in range(1000):
+                chunks_sent.append(1)
+                yield b"\xff" * 1024
+        return httpx.Response(200, content=body())
+
+    pipeline = _pipeline(handler, max_bytes=10 * 1024)
+    for path in ("/claims-huge.jpg", "/endless.jpg"):
+        try:
+            pipeline.load(f"{HOST}{path}")
+            raise AssertionError("oversized image accepted")
+        except images.ImageError as e:
+            assert "must be under" in str(e)
+    assert len(chunks_sent) < 100  # stopped after the first read, not all 1000 KB
+
+
+def test_private_hosts_and_redirects_to_them_are_refused():
+    def handler(request):
+        return httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data"})
+
+    pipeline = _pipeline(handler)
+    for url in ("http://127.0.0.1/a.png", "http://10.0.0.8/a.png", "file:///etc/passwd", f"{HOST}/redirect"):
+        try:
+            pipeline.load(url)
+            raise AssertionError(f"{url} fetched")
+        except images.ImageError:
+            pass
+
+
+def test_same_image_is_fetched_and_processed_once():
+    fetches = []
+
+    def handler(request):
+        fetches.append(request.url.path)
+        if request.url.path == "/notes.txt":
+            return httpx.Response(200, content=b"just some text")
+        return httpx.Response(200, content=JPEG)
+
+    pipeline = _pipeline(handler)
+    first = pipeline.load(f"{HOST}/q1.jpg")
+    assert pipeline.load(f"{HOST}/q1.jpg")["hash"] == first["hash"]  # URL cached: no fetch
+    assert pipeline.load(f"{HOST}/copy-of-q1.jpg")["data"] == first["data"]  # same bytes: not reprocessed
+    assert fetches == ["/q1.jpg", "/copy-of-q1.jpg"]
+    assert (pipeline.stats["processed"], pipeline.stats["url_hits"], pipeline.stats["content_hits"]) == (1, 1, 1)
+    assert first["mime_type"] == "image/jpeg"
+
+    try:
+        pipeline.load(f"{HOST}/notes.txt")
+        raise AssertionError("text accepted as an image")
+    except images.ImageError:
+        pass
+    pipeline.close()
+
+
+def test_fetch_connects_to_the_checked_address(monkeypatch):
+    answers = [[(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", 443))],
+               [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", 443))]]  # rebound after the check
+    monkeypatch.setattr(socket, "getaddrinfo", lambda *args, **kwargs: answers.pop(0))
+    seen = []
+
+    def handler(request):
+        seen.append((request.url.host, request.headers["host"], request.extensions.get("sni_hostname")))
+        return httpx.Response(200, content=JPEG)
+
+    assert _pipeline(handler).fetch("https://img.example.com/q.jpg") == JPEG
+    assert seen == [("93.184.216.34", "img.example.com", "img.example.com")]
+    assert len(answers) == 1  # resolved once; the connection never asked DNS again
+
+
+def test_large_photos_are_downscaled_when_pillow_is_installed():
+    pytest.importorskip("PIL")
+    photo = io.BytesIO()
+    images.Image.new("RGB", (4000, 3000), "white").save(photo, "JPEG")
+    image = _pipeline(lambda request: httpx.Response(200, content=photo.getvalue())).load(f"{HOST}/photo.jpg")
+    assert (image["width"], image["height"]) == (768, 576)
+    assert len(image["data"]) < len(photo.getvalue())
+
+
+def test_image_goes_with_the_current_question():
+    image = {"mime_type": "image/jpeg", "data": b"jpeg"}
+    assert images.attach("Solve this", image) == [
+        {"role": "user", "parts": [{"inline_data": {"mime_type": "image/jpeg", "data": b"jpeg"}},
+                                   {"text": "Solve this"}]}]
+    history = [{"role": "user", "parts": [{"text": "Hi"}]}, {"role": "model", "parts": [{"text": "Hello"}]},
+               {"role": "user", "parts": [{"text": "And this one?"}]}]
+    contents = images.attach(history, image)
+    assert contents[:2] == history[:2] and len(contents[2]["parts"]) == 2
+    assert len(history[2]["parts"]) == 1  # caller's list left alone
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,59 @@
+import threading
+
+import metrics
+from bench.memstore import MemoryFirestore
+from firebase_admin import firestore
+
+
+def test_counter_shards_sum_across_threads():
+    counter = metrics.Counter("test_total", "test", ("route",))
+
+    def work():
+        for _ in range(1000):
+            counter.inc(("/x",))
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.collect() == {("/x",): 8000}
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("test_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(("/x",), value)
+    lines = hist.render()
+    assert 'test_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/x",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/x"} 3' in lines
+
+
+def test_instrumented_client_counts_per_request():
+    db = metrics.instrument_firestore(MemoryFirestore())
+    db.collection("courses").document("c1").set({"teacher_id": "t1"})
+    db.collection("courses").document("c1").collection("students").document("s1").set({"uid": "s1"})
+
+    stats = metrics.RequestStats()
+    token = metrics._current.set(stats)
+    try:
+        for course in db.collection("courses").where("teacher_id", "==", "t1").stream():
+            list(course.reference.collection("students").stream())
+        db.collection("users").document("s1").get()
+        batch = db.batch()
+        batch.set(db.collection("notifications").document(), {"title": "hi"})
+        batch.update(db.collection("courses").document("c1"), {"student_count": firestore.Increment(1)})
+        batch.commit()
+    finally:
+        metrics._current.reset(token)
+
+    assert (stats.reads, stats.writes, stats.deletes) == (3, 2, 0)
+
+
+if __name__ == "__main__":
+    test_counter_shards_sum_across_threads()
+    test_histogram_renders_cumulative_buckets()
+    test_instrumented_client_counts_per_request()
+    print("✅ Metrics tests passed")
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+import notification_hub
+from bench.memstore import MemoryFirestore
+
+
+def _notify(db, doc_id, title, minutes_ago=0, target=None):
+    data = {"title": title, "type": "info",
+            "created_at": datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)}
+    if target:
+        data["target_uid"] = target
+    db.collection("notifications").document(doc_id).set(data)
+
+
+def _parse(frame):
+    fields = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n"))
+    return fields["id"], orjson.loads(fields["data"])
+
+
+async def _next(stream, timeout=2):
+    while True:
+        frame = await asyncio.wait_for(stream.__anext__(), timeout)
+        if frame.startswith(b"id:"):
+            return _parse(frame)
+
+
+def test_one_listener_fans_out_filtered_by_target():
+    async def run():
+        db = MemoryFirestore()
+        _notify(db, "old", "Old news", minutes_ago=5)
+        hub = notification_hub.Hub(db)
+        a, b = hub.stream("s1"), hub.stream("s2")
+        assert await a.__anext__() == notification_hub.RETRY
+        assert await b.__anext__() == notification_hub.RETRY
+        assert len(db._watches) == 1 and hub.clients() == 2
+
+        # History is not pushed; new notifications are, filtered by target.
+        _notify(db, "n1", "Only for s2", target="s2")
+        _notify(db, "n2", "Campus closed")
+        assert (await _next(a))[1]["title"] == "Campus closed"
+        assert (await _next(b))[1]["title"] == "Only for s2"
+        assert (await _next(b))[1]["title"] == "Campus closed"
+        await a.aclose()
+        await b.aclose()
+        assert hub.clients() == 0
+        hub.close()
+        assert db._watches == []
+
+    asyncio.run(run())
+
+
+def test_resume_from_last_event_id_in_memory_and_from_firestore():
+    async def run():
+        db = MemoryFirestore()
+        for i in range(6):
+            _notify(db, f"n{i}", f"Notice {i}", minutes_ago=60 - i)
+        hub = notification_hub.Hub(db, ring_size=3)
+        hub.start()
+        ring_ids = [e.id for e in hub._ring]
+        assert len(ring_ids) == 3
+
+        # Resume inside the ring: no Firestore read.
+        before = db.totals.snapshot()["reads"]
+        replay = hub.replay(ring_ids[0], "s1")
+        assert [e.id for e in replay] == ring_ids[1:]
+        assert db.totals.snapshot()["reads"] == before
+
+        # Resume from before the ring: falls back to a query.
+        first = db.collection("notifications").document("n0").get().to_dict()["created_at"]
+        oldest = f"{int(first.timestamp() * 1000) - 1}-n0"
+        titles = [orjson.loads(e.frame.split(b"data: ")[1])["title"] for e in hub.replay(oldest, "s1")]
+        assert titles == [f"Notice {i}" for i in range(6)]
+
+        stream = hub.stream("s1", ring_ids[1])
+        await stream.__anext__()
+        assert (await _next(stream))[0] == ring_ids[2]
+        await stream.aclose()
+        hub.close()
+
+    asyncio.run(run())
+
+
+def test_slow_client_is_dropped_and_idle_client_gets_heartbeat():
+    async def run():
+        db = MemoryFirestore()
+        hub = notification_hub.Hub(db, max_queue=2, heartbeat=0.05)
+        idle = hub.stream("s1")
+        await idle.__anext__()
+        assert await asyncio.wait_for(idle.__anext__(), 1) == notification_hub.HEARTBEAT
+
+        slow = hub.stream("s2")
+        await slow.__anext__()
+        for i in range(5):
+            _notify(db, f"n{i}", f"Notice {i}")
+        await asyncio.sleep(0.01)  # let call_soon_threadsafe deliveries run
+        assert (await _next(slow))[1]["title"] == "Notice 0"
+        assert (await _next(slow))[1]["title"] == "Notice 1"
+        try:
+            await _next(slow)
+            raise AssertionError("slow client should have been disconnected")
+        except StopAsyncIteration:
+            pass
+        assert hub.stats["dropped_clients"] == 1
+        await idle.aclose()
+        hub.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_one_listener_fans_out_filtered_by_target()
+    test_resume_from_last_event_id_in_memory_and_from_firestore()
+    test_slow_client_is_dropped_and_idle_client_gets_heartbeat()
+    print("✅ Notification hub tests passed")
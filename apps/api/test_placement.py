@@ -0,0 +1,86 @@
+import threading
+
+import placement
+from bench.memstore import MemoryFirestore
+
+
+def _stored(db, uid):
+    return db.collection("placement_progress").document(uid).get().to_dict()
+
+
+def test_patches_coalesce_into_one_write_per_student():
+    db = MemoryFirestore()
+    db.collection("placement_progress").document("s1").set({
+        "topic_progress": {"arrays": True, "graphs": False}, "streak": 4})
+    buffer = placement.WriteBehind(db, interval=60)
+    before = db.totals.snapshot()["writes"]
+
+    for i in range(20):
+        buffer.patch("s1", {"topic_progress": {f"topic_{i % 5}": i % 2 == 0}})
+    buffer.patch("s1", {"daily_goals": {"solve_3": True}}, streak_increment=1)
+    buffer.patch("s1", {"topic_progress": {"graphs": None}}, streak_increment=1)
+    buffer.patch("s2", {"company_checks": {"tcs": True}})
+
+    # Reads see the buffered state before anything is written.
+    data = buffer.read("s1")
+    assert data["topic_progress"] == {"arrays": True, "topic_0": False, "topic_1": True,
+                                      "topic_2": False, "topic_3": True, "topic_4": False}
+    assert data["daily_goals"] == {"solve_3": True}
+    assert data["streak"] == 6
+    assert db.totals.snapshot()["writes"] == before
+
+    assert buffer.flush() == 2
+    assert db.totals.snapshot()["writes"] - before == 2
+    stored = _stored(db, "s1")
+    assert stored["topic_progress"] == data["topic_progress"]
+    assert stored["streak"] == 6
+    assert _stored(db, "s2")["company_checks"] == {"tcs": True}
+    assert buffer.read("s1")["streak"] == 6  # nothing left to overlay
+
+
+def test_streak_increments_from_concurrent_writers_are_not_lost():
+    db = MemoryFirestore()
+    buffer = placement.WriteBehind(db, interval=60)
+
+    def bump():
+        for _ in range(50):
+            buffer.patch("s1", streak_increment=1)
+            if buffer.pending() > 0:
+                buffer.flush()
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    buffer.close()
+    assert _stored(db, "s1")["streak"] == 200
+
+    buffer.patch("s1", streak=0)
+    buffer.patch("s1", streak_increment=2)
+    assert buffer.read("s1")["streak"] == 2
+
+
+def test_failed_flush_requeues_under_newer_patches():
+    db = MemoryFirestore()
+    buffer = placement.WriteBehind(db, interval=60)
+    buffer.patch("s1", {"topic_progress": {"arrays": True, "dp": True}}, streak_increment=1)
+
+    real_batch = db.batch
+    db.batch = lambda: type("Broken", (), {"set": lambda *a, **k: None,
+                                           "commit": lambda self: 1 / 0})()
+    assert buffer.flush() == 0
+    db.batch = real_batch
+
+    buffer.patch("s1", {"topic_progress": {"dp": False}}, streak_increment=1)
+    assert buffer.close() == 1
+    stored = _stored(db, "s1")
+    assert stored["topic_progress"] == {"arrays": True, "dp": False}
+    assert stored["streak"] == 2
+
+
+if __name__ == "__main__":
+    test_patches_coalesce_into_one_write_per_student()
+    test_streak_increments_from_concurrent_writers_are_not_lost()
+    test_failed_flush_requeues_under_newer_patches()
+    print("✅ Placement tests passed")
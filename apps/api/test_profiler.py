@@ -0,0 +1,39 @@
+import metrics
+import profiler
+from bench.memstore import MemoryFirestore
+
+
+def test_flags_repeated_reads_and_large_streams():
+    db = metrics.instrument_firestore(MemoryFirestore())
+    for i in range(6):
+        db.collection("users").document(f"u{i}").set({"role": "student"})
+
+    trace = profiler.Trace("POST", "/teacher/students")
+    token = profiler._trace.set(trace)
+    try:
+        for i in range(6):
+            db.collection("users").document(f"u{i}").get()
+        list(db.collection("users").stream())
+    finally:
+        profiler._trace.reset(token)
+
+    trace.analyze(repeat_threshold=5, stream_threshold=6)
+    assert len(trace.calls) == 7
+    assert trace.calls[0]["site"].startswith("test_profiler.py:")
+    assert any(w.startswith("N+1: 6 single-document reads of users") for w in trace.warnings)
+    assert any(w.startswith("Large stream: 6 docs from users") for w in trace.warnings)
+
+
+def test_trace_store_keeps_slowest():
+    store = profiler.TraceStore(keep=2)
+    for ms in (5, 50, 1, 20):
+        t = profiler.Trace("GET", "/x")
+        t.duration_ms = ms
+        store.add(t)
+    assert [t["duration_ms"] for t in store.slowest()] == [50, 20]
+
+
+if __name__ == "__main__":
+    test_flags_repeated_reads_and_large_streams()
+    test_trace_store_keeps_slowest()
+    print("✅ Profiler tests passed")
@@ -0,0 +1,108 @@
+import threading
+
+import rate_limit
+import system_settings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    buckets = rate_limit.TokenBuckets(clock=clock)
+    key = ("student", "/solve-doubt", "s1")
+
+    assert [buckets.take(key, per_minute=60, burst=3) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take(key, per_minute=60, burst=3) == 1.0
+
+    clock.now += 1.0
+    assert buckets.take(key, per_minute=60, burst=3) == 0
+    # Other students are unaffected.
+    assert buckets.take(("student", "/solve-doubt", "s2"), per_minute=60, burst=3) == 0
+
+
+def test_token_buckets_are_lru_bounded():
+    buckets = rate_limit.TokenBuckets(max_keys=2, clock=FakeClock())
+    for uid in ("a", "b", "c"):
+        buckets.take(uid, per_minute=10, burst=1)
+    assert len(buckets) == 2
+
+
+def test_gate_rejects_when_queue_is_full():
+    gate = rate_limit.ConcurrencyGate(limit=1, queue=1, timeout=5.0)
+    assert gate.acquire()
+
+    waiter_result = []
+    waiter = threading.Thread(target=lambda: waiter_result.append(gate.acquire()))
+    waiter.start()
+    while gate.waiting == 0:
+        pass
+
+    assert gate.acquire() is False  # slot busy, queue full
+    gate.release()
+    waiter.join()
+    assert waiter_result == [True]
+    gate.release()
+    assert gate.active == 0
+
+
+def test_gate_times_out_queued_calls():
+    gate = rate_limit.ConcurrencyGate(limit=1, queue=4, timeout=0.05)
+    assert gate.acquire()
+    assert gate.acquire() is False
+    assert gate.waiting == 0
+
+
+def test_check_student_returns_429_with_retry_after(monkeypatch):
+    settings = system_settings._merge(system_settings.DEFAULTS, {
+        "rate_limits": {"routes": {"/solve-doubt": {"per_minute": 1, "burst": 1}}}})
+    monkeypatch.setattr(system_settings, "get_settings", lambda: settings)
+    monkeypatch.setattr(rate_limit, "buckets", rate_limit.TokenBuckets())
+
+    assert rate_limit.check_student("/solve-doubt", "s1") is None
+    rejected = rate_limit.check_student("/solve-doubt", "s1")
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "60"
+    assert rate_limit.check_student("/other", "s1") is None
+
+
+def test_default_route_cap_bounds_rotating_student_ids(monkeypatch):
+    settings = system_settings._merge(system_settings.DEFAULTS, {})
+    monkeypatch.setattr(system_settings, "get_settings", lambda: settings)
+    monkeypatch.setattr(rate_limit, "buckets", rate_limit.TokenBuckets())
+
+    limits = settings["rate_limits"]["routes"]["/solve-doubt"]
+    assert limits["route_per_minute"] > 0
+    results = [rate_limit.check_student("/solve-doubt", f"s{i}") for i in range(limits["route_burst"] + 1)]
+    assert all(r is None for r in results[:-1])
+    assert results[-1].status_code == 429
+
+    # The route rejected the last caller before it took one of their tokens
+    last = ("student", "/solve-doubt", f"s{limits['route_burst']}")
+    assert [rate_limit.buckets.take(last, limits["per_minute"], limits["burst"]) for _ in range(5)] == [0] * 5
+
+
+def test_rate_limit_updates_are_validated():
+    update = system_settings.RateLimits(routes={"/solve-doubt": {"per_minute": 20}})
+    assert update.model_dump(exclude_unset=True) == {"routes": {"/solve-doubt": {"per_minute": 20.0}}}
+    for bad in ({"gemini_concurrency": None}, {"gemini_queue": -1}, {"routes": {"/solve-doubt": {"per_minute": "ten"}}},
+                {"routes": {"/unknown": {}}}, {"routes": {"/solve-doubt": {"perminute": 5}}}):
+        try:
+            system_settings.RateLimits(**bad)
+            raise AssertionError(f"{bad} accepted")
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    test_token_bucket_allows_burst_then_refills()
+    test_token_buckets_are_lru_bounded()
+    test_gate_rejects_when_queue_is_full()
+    test_gate_times_out_queued_calls()
+    test_rate_limit_updates_are_validated()
+    print("✅ Rate limit tests passed")
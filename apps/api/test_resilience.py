@@ -0,0 +1,146 @@
+import time
+
+import metrics
+import resilience
+from bench.memstore import MemoryFirestore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Unavailable(Exception):
+    code = 503
+
+
+class NotFound(Exception):
+    code = 404
+
+
+def _call(breaker, exc=None):
+    with breaker.guard():
+        if exc is not None:
+            raise exc
+
+
+def _outcome(breaker, exc=None):
+    try:
+        _call(breaker, exc)
+        return "ok"
+    except resilience.CircuitOpen:
+        return "rejected"
+    except Exception:
+        return "failed"
+
+
+def test_breaker_opens_fails_fast_and_probes():
+    clock = FakeClock()
+    breaker = resilience.CircuitBreaker("firestore", failures=3, reset_s=10, clock=clock)
+
+    assert [_outcome(breaker, NotFound()) for _ in range(5)] == ["failed"] * 5  # client errors don't count
+    assert breaker.state == "closed"
+    assert [_outcome(breaker, Unavailable()) for _ in range(3)] == ["failed"] * 3
+    assert breaker.state == "open"
+    assert _outcome(breaker) == "rejected"
+
+    clock.now += 10
+    assert breaker.state == "half_open"
+    assert _outcome(breaker, Unavailable()) == "failed"  # probe fails: open again
+    assert _outcome(breaker) == "rejected"
+
+    clock.now += 10
+    assert _outcome(breaker) == "ok"  # probe succeeds: closed
+    assert breaker.state == "closed"
+    assert _outcome(breaker) == "ok"
+
+
+def test_budget_caps_timeouts_then_refuses():
+    assert resilience.call_timeout(5, "firestore") == 5  # no request budget
+    with resilience.deadline(0.05):
+        assert resilience.call_timeout(5, "firestore") <= 0.05
+        with resilience.deadline(60):  # nested blocks can't extend it
+            assert resilience.remaining() <= 0.05
+        time.sleep(0.06)
+        try:
+            resilience.call_timeout(5, "gemini")
+            raise AssertionError("spent budget should refuse the call")
+        except resilience.DeadlineExceeded:
+            pass
+
+
+def test_firestore_calls_get_timeouts_and_degrade_to_503(monkeypatch):
+    seen = []
+    store = MemoryFirestore()
+    store.collection("courses").document("C1").set({"title": "DBMS"})
+    ref_class = type(store.collection("courses").document("C1"))
+    original = ref_class.get
+
+    def spy(self, *args, **kwargs):
+        seen.append(kwargs.get("timeout"))
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(ref_class, "get", spy)
+    breaker = resilience.CircuitBreaker("firestore", failures=1, reset_s=60)
+    monkeypatch.setattr(resilience, "firestore", breaker)
+    monkeypatch.setattr(metrics, "FIRESTORE_GUARD", resilience.firestore_guard)
+    db = metrics.instrument_firestore(store)
+
+    with resilience.deadline(2):
+        assert db.collection("courses").document("C1").get().to_dict()["title"] == "DBMS"
+    assert 0 < seen[0] <= 2
+
+    _outcome(breaker, Unavailable())
+    try:
+        db.collection("courses").document("C1").get()
+        raise AssertionError("open breaker should refuse the call")
+    except resilience.CircuitOpen as e:
+        response = resilience.error_response(e)
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert resilience.error_response(ValueError("bad")) == {"status": "error", "message": "bad"}
+
+
+def test_scans_and_background_calls_get_no_fixed_timeout(monkeypatch):
+    seen = []
+    store = MemoryFirestore()
+    store.collection("courses").document("C1").set({"title": "DBMS"})
+    query_class = type(store.collection("courses"))
+    original = query_class.stream
+
+    def timing_out(self, *args, **kwargs):
+        seen.append(kwargs.get("timeout"))
+        raise TimeoutError("scan took longer than the budget")
+        yield
+
+    breaker = resilience.CircuitBreaker("firestore", failures=1, reset_s=60)
+    monkeypatch.setattr(resilience, "firestore", breaker)
+    monkeypatch.setattr(metrics, "FIRESTORE_GUARD", resilience.firestore_guard)
+    db = metrics.instrument_firestore(store)
+
+    assert len(list(db.collection("courses").stream())) == 1  # background: client defaults
+    monkeypatch.setattr(query_class, "stream", timing_out)
+    with resilience.deadline(30):
+        try:
+            list(db.collection("courses").stream())
+            raise AssertionError("scan should have timed out")
+        except TimeoutError:
+            pass
+    assert 5 < seen[0] <= 30  # the budget left, not FIRESTORE_TIMEOUT_S
+    assert breaker.state == "closed"  # a long scan isn't Firestore failing
+
+    monkeypatch.setattr(query_class, "stream", original)
+    calls = []
+    monkeypatch.setattr(type(store.collection("courses").document("C1")), "get",
+                        lambda self, *a, **kw: calls.append(kw) or None)
+    db.collection("courses").document("C1").get()
+    assert calls == [{}]
+
+
+if __name__ == "__main__":
+    test_breaker_opens_fails_fast_and_probes()
+    test_budget_caps_timeouts_then_refuses()
+    print("✅ Resilience tests passed")
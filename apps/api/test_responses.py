@@ -0,0 +1,82 @@
+import gzip
+from datetime import datetime, timezone
+
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import responses
+
+BIG = {"items": [{"id": i, "name": f"student_{i}", "at": datetime(2026, 1, 1, tzinfo=timezone.utc)}
+                 for i in range(200)]}
+STATIC = responses.StaticJSON({"answer": "x" * 5000, "citations": []})
+
+
+def _app():
+    app = FastAPI(default_response_class=responses.FastJSONResponse)
+    app.router.route_class = responses.FastJSONRoute
+    app.add_middleware(responses.CompressionMiddleware)
+
+    @app.get("/big")
+    def big(limit: int = 200):
+        return {"items": BIG["items"][:limit]}
+
+    @app.get("/small")
+    async def small():
+        return {"status": "ok"}
+
+    @app.get("/static")
+    def static(request: Request):
+        return STATIC.response(request)
+
+    return app
+
+
+def test_choose_encoding():
+    assert responses.choose_encoding("gzip, deflate") == "gzip"
+    assert responses.choose_encoding("identity") is None
+    assert responses.choose_encoding("gzip;q=0") is None
+    assert responses.choose_encoding("*") in ("br", "gzip")
+    assert responses.choose_encoding("") is None
+
+
+def test_routes_skip_jsonable_encoder(monkeypatch):
+    import fastapi.routing
+    monkeypatch.setattr(fastapi.routing, "jsonable_encoder", lambda *a, **k: 1 / 0)
+    res = TestClient(_app()).get("/big", params={"limit": 2})
+    assert res.json()["items"][1]["name"] == "student_1"
+
+
+def test_large_responses_are_gzipped_and_small_ones_are_not():
+    client = TestClient(_app())
+    res = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["vary"]
+    assert res.json()["items"][0] == {"id": 0, "name": "student_0", "at": "2026-01-01T00:00:00+00:00"}
+    assert int(res.headers["content-length"]) < len(orjson.dumps(res.json()))
+
+    res = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    assert res.json() == {"status": "ok"}
+
+    res = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert len(res.json()["items"]) == 200
+
+
+def test_static_json_serves_precompressed_variant():
+    client = TestClient(_app())
+    res = client.get("/static", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(STATIC.variants["gzip"]) == STATIC.body
+    assert res.json()["answer"] == "x" * 5000
+
+    res = client.get("/static", headers={"Accept-Encoding": "identity"})
+    assert res.content == STATIC.body
+
+
+if __name__ == "__main__":
+    test_choose_encoding()
+    test_large_responses_are_gzipped_and_small_ones_are_not()
+    test_static_json_serves_precompressed_variant()
+    print("✅ Response tests passed")
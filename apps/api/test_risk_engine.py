@@ -0,0 +1,66 @@
+import numpy as np
+
+import risk_engine
+import synthetic_data as sd
+from bench.memstore import MemoryFirestore
+
+
+def _campus(students):
+    db = MemoryFirestore()
+    spec = sd.CampusSpec(students=students, courses=10, teachers=2, doubts=0, notifications=0)
+    db.load(sd.iter_teachers(spec))
+    db.load(sd.iter_students(spec))
+    return db
+
+
+def test_classify_matches_scalar_rule():
+    attendance = np.array([80.0, 70.0, 90.0, 74.9])
+    cgpa = np.array([6.0, 8.0, 4.9, 5.0])
+    expected = [risk_engine.risk_status(a, c) == risk_engine.AT_RISK for a, c in zip(attendance, cgpa)]
+    assert risk_engine.classify(attendance, cgpa, 75, 5.0).tolist() == expected
+
+
+def test_recompute_writes_only_changed_students():
+    db = _campus(3000)
+    before = db.totals.snapshot()
+
+    job = risk_engine.Recompute(db, attendance_threshold=85, cgpa_threshold=6.0, page_size=400, workers=4).run()
+
+    students = [d.to_dict() for d in db.collection("users").where("role", "==", "student").stream()]
+    for s in students:
+        stats = s["academic_stats"]
+        assert stats["risk_status"] == risk_engine.risk_status(
+            stats["attendance_percent"], stats["cgpa"], 85, 6.0)
+    assert job.state == "done"
+    assert (job.scanned, job.pages) == (3000, 8)
+    assert 0 < job.written == job.changed < 3000
+    assert db.totals.snapshot()["writes"] - before["writes"] == job.written
+
+    # Same thresholds again: nothing to write.
+    assert risk_engine.Recompute(db, 85, 6.0, page_size=400).run().written == 0
+
+
+def test_start_runs_in_background_and_reports_status():
+    db = _campus(500)
+    job = risk_engine.start(db, 90, 7.0, page_size=100)
+    risk_engine._thread.join(timeout=10)
+    assert risk_engine.status()["state"] == "done"
+    assert risk_engine.status()["scanned"] == job.scanned == 500
+
+
+def test_recompute_reports_each_changed_student():
+    db = _campus(500)
+    seen = []
+    job = risk_engine.Recompute(db, 90, 7.0, page_size=100, batch_size=50, on_changed=seen.extend).run()
+    assert len(seen) == len(set(seen)) == job.written > 0
+    for uid in seen:
+        stats = db.collection("users").document(uid).get().to_dict()["academic_stats"]
+        assert stats["risk_status"] == risk_engine.risk_status(stats["attendance_percent"], stats["cgpa"], 90, 7.0)
+
+
+if __name__ == "__main__":
+    test_classify_matches_scalar_rule()
+    test_recompute_writes_only_changed_students()
+    test_start_runs_in_background_and_reports_status()
+    test_recompute_reports_each_changed_student()
+    print("✅ Risk engine tests passed")
@@ -0,0 +1,36 @@
+import serve
+
+
+def test_cgroup_quota_parsing(tmp_path):
+    path = tmp_path / "cpu.max"
+    path.write_text("max 100000\n")
+    assert serve._cgroup_cpus(str(path)) is None
+    path.write_text("250000 100000\n")
+    assert serve._cgroup_cpus(str(path)) == 3
+    path.write_text("50000 100000\n")
+    assert serve._cgroup_cpus(str(path)) == 1
+    assert serve._cgroup_cpus(str(tmp_path / "missing")) is None
+
+
+def test_default_workers_honours_quota(monkeypatch):
+    monkeypatch.setattr(serve.os, "sched_getaffinity", lambda pid: set(range(16)), raising=False)
+    monkeypatch.setattr(serve, "_cgroup_cpus", lambda: 4)
+    assert serve.default_workers() == 4
+    monkeypatch.setattr(serve, "_cgroup_cpus", lambda: None)
+    assert serve.default_workers() == 16
+
+
+def test_main_passes_worker_settings_to_uvicorn(monkeypatch):
+    calls = {}
+    monkeypatch.setattr(serve.uvicorn, "run", lambda app, **kw: calls.update(app=app, **kw))
+    monkeypatch.setenv("STARTUP_PREWARM", "")
+    monkeypatch.delenv("STARTUP_PREWARM")  # restored (unset) afterwards
+    serve.main(["--workers", "3", "--port", "9000", "--graceful-timeout", "12"])
+    assert calls["app"] == "main:app"
+    assert (calls["workers"], calls["port"], calls["timeout_graceful_shutdown"]) == (3, 9000, 12)
+    assert serve.os.environ["STARTUP_PREWARM"] == "1"
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
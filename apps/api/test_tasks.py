@@ -0,0 +1,80 @@
+import time
+
+import tasks
+
+
+def _queue(tmp_path, **kwargs):
+    return tasks.TaskQueue(str(tmp_path / "tasks.sqlite3"), workers=2, backoff_s=0.01, **kwargs)
+
+
+def _eventually(check, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.01)
+    return check()
+
+
+def test_tasks_survive_a_restart(tmp_path):
+    ran = []
+    first = _queue(tmp_path)
+    first.task("notify")(lambda p: ran.append(p["uid"]))
+    first.enqueue("notify", {"uid": "s1"})  # never started: the process "crashed"
+
+    second = _queue(tmp_path)
+    second.task("notify")(lambda p: ran.append(p["uid"]))
+    second.start()
+    assert _eventually(lambda: ran == ["s1"])
+    assert _eventually(lambda: second.counts()["pending"] == 0)
+    second.close()
+
+
+def test_retries_with_backoff_then_dead_letters(tmp_path):
+    queue = _queue(tmp_path, max_attempts=3)
+    attempts = []
+
+    @queue.task("flaky")
+    def flaky(payload):
+        attempts.append(time.monotonic())
+        if len(attempts) < 2:
+            raise ConnectionError("firestore unavailable")
+
+    @queue.task("broken")
+    def broken(payload):
+        raise ValueError("bad payload")
+
+    queue.enqueue("flaky", {})
+    queue.enqueue("broken", {"n": 1})
+    queue.start()
+    assert _eventually(lambda: queue.counts()["dead"] == 1 and len(attempts) == 2)
+    queue.close()
+
+    dead = queue.dead()
+    assert [(d["name"], d["attempts"], d["payload"]) for d in dead] == [("broken", 3, {"n": 1})]
+    assert "bad payload" in dead[0]["last_error"]
+
+    queue.task("broken")(lambda p: None)  # fixed: the dead task can be replayed
+    assert queue.retry_dead() == 1
+    queue.drain()
+    assert queue.counts() == {"pending": 0, "running": 0, "dead": 0}
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = _queue(tmp_path, lease_s=0.05)
+    ran = []
+    queue.task("count")(lambda p: ran.append(1))
+    queue.enqueue("count", {})
+    assert queue._claim() is not None  # a worker claims it, then dies
+    assert queue.run_one() is False
+    time.sleep(0.06)
+    assert queue.run_one() is True and ran == [1]
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+    for test in (test_tasks_survive_a_restart, test_retries_with_backoff_then_dead_letters,
+                 test_expired_lease_is_reclaimed):
+        test(pathlib.Path(tempfile.mkdtemp()))
+    print("✅ Task queue tests passed")
@@ -0,0 +1,96 @@
+import usage
+from bench.memstore import MemoryFirestore
+
+NOW = 1_760_000_000.0  # 2025-10-09 08:53:20 UTC
+
+
+def _ledger(db):
+    return usage.Ledger(db, interval=60, clock=lambda: NOW)
+
+
+def test_calls_accumulate_in_memory_and_flush_once_per_key():
+    db = MemoryFirestore()
+    ledger = _ledger(db)
+    before = db.totals.snapshot()
+
+    for i in range(50):
+        ledger.record("s1", "CS301", prompt_tokens=100, output_tokens=20, latency_s=0.5, error=i == 0)
+    ledger.record("s2", None, prompt_tokens=10, output_tokens=5)
+    assert db.totals.snapshot() == before  # recording does no I/O
+    assert ledger.used("student", "s1")["total_tokens"] == 6000
+    assert ledger.used("student", "s1")["total_tokens"] == 6000
+    assert db.totals.snapshot()["reads"] - before["reads"] == 1  # stored totals read once per key
+
+    assert ledger.flush() == 3  # s1, CS301, s2
+    assert db.totals.snapshot()["writes"] - before["writes"] == 3
+    doc = db.collection("gemini_usage").document("2025-10-09_student_s1").get().to_dict()
+    assert (doc["calls"], doc["errors"], doc["prompt_tokens"], doc["latency_ms"]) == (50, 1, 5000, 25000)
+    assert ledger.used("course", "CS301")["calls"] == 50
+
+
+def test_workers_see_each_others_usage_after_a_flush_and_quotas_apply():
+    db = MemoryFirestore()
+    a, b = _ledger(db), _ledger(db)
+    quota = {"student_daily_tokens": 1000}
+
+    a.record("s1", prompt_tokens=600)
+    b.record("s1", prompt_tokens=300)
+    assert a.check_quota(quota, "s1") is None
+    a.flush()
+    b.flush()  # reads back a's increment too
+    assert b.used("student", "s1")["prompt_tokens"] == 900
+
+    b.record("s1", prompt_tokens=100)
+    message, retry_after = b.check_quota(quota, "s1")
+    assert "limit" in message and 0 < retry_after <= 86400
+    assert b.check_quota(quota, "s2") is None
+    assert b.check_quota({"student_daily_tokens": 0}, "s1") is None  # 0 = unlimited
+
+    assert [row["id"] for row in b.top("student")] == ["s1"]
+
+
+def test_failed_flush_requeues_increments():
+    db = MemoryFirestore()
+    ledger = _ledger(db)
+    ledger.record("s1", prompt_tokens=10)
+
+    real_batch = db.batch
+
+    class Failing:
+        def __init__(self):
+            self._batch = real_batch()
+
+        def set(self, *args, **kwargs):
+            self._batch.set(*args, **kwargs)
+
+        def commit(self):
+            raise ConnectionError("unavailable")
+
+    db.batch = Failing
+    assert ledger.flush() == 0
+    ledger.record("s1", prompt_tokens=5)
+    assert ledger.used("student", "s1")["prompt_tokens"] == 15
+
+    db.batch = real_batch
+    assert ledger.flush() == 1
+    assert db.collection("gemini_usage").document("2025-10-09_student_s1").get().to_dict()["prompt_tokens"] == 15
+
+
+def test_restarted_worker_starts_from_stored_totals():
+    db = MemoryFirestore()
+    before_restart = _ledger(db)
+    before_restart.record("s1", prompt_tokens=900)
+    before_restart.flush()
+
+    ledger = _ledger(db)
+    assert ledger.used("student", "s1")["prompt_tokens"] == 900
+    ledger.record("s1", prompt_tokens=100)
+    assert ledger.check_quota({"student_daily_tokens": 1000}, "s1") is not None
+
+
+if __name__ == "__main__":
+    test_calls_accumulate_in_memory_and_flush_once_per_key()
+    test_workers_see_each_others_usage_after_a_flush_and_quotas_apply()
+    test_failed_flush_requeues_increments()
+    test_restarted_worker_starts_from_stored_totals()
+    print("✅ Usage ledger tests passed")
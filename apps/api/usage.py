@@ -0,0 +1,241 @@
+"""
+usage.py — Per-student and per-course Gemini usage ledger
+
+``/solve-doubt`` records each Gemini call in memory. The ledger counts calls,
+errors, prompt/output tokens and latency per (day, student) and
+(day, course), and a flusher thread writes the increments accumulated since
+the last flush to ``gemini_usage`` in 500-document batches. One
+``set(merge=True)`` with ``firestore.Increment`` per key per flush, however
+many calls were made; ``close()`` flushes on shutdown.
+
+* Documents are ``gemini_usage/{day}_{scope}_{id}`` (UTC day), with
+  ``scope``, ``subject``, ``day``, ``calls``, ``errors``, ``prompt_tokens``,
+  ``output_tokens``, ``total_tokens`` and ``latency_ms`` fields. Increments
+  from several workers add up.
+* ``used()`` and ``check_quota()`` add this process's unflushed counts to
+  the totals last read from Firestore. A key's document is read the first
+  time it is checked, so a restart doesn't reset anyone's usage, and re-read
+  after each flush that writes it. Other workers' usage is seen only at
+  those reads, so with several workers a quota is a soft limit: a student
+  can go over by what other workers served since this one last flushed
+  their key.
+* Quotas come from ``system/settings`` → ``gemini_quota`` (0 = unlimited).
+* A failed commit puts its increments back in the queue.
+
+Configuration (environment):
+    USAGE_FLUSH_INTERVAL  seconds between flushes (default 10)
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from firebase_config import firestore
+
+FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "10"))
+
+COUNTERS = ("calls", "errors", "prompt_tokens", "output_tokens", "total_tokens", "latency_ms")
+
+# Firestore caps a batch at 500 writes
+BATCH_SIZE = 500
+
+
+def today(now=None):
+    return datetime.fromtimestamp(now if now is not None else time.time(), timezone.utc).strftime("%Y-%m-%d")
+
+
+def seconds_to_midnight(now=None):
+    now = datetime.fromtimestamp(now if now is not None else time.time(), timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+def _add(into, delta):
+    for name in COUNTERS:
+        into[name] = into.get(name, 0) + delta.get(name, 0)
+    return into
+
+
+class Ledger:
+    def __init__(self, db, interval=FLUSH_INTERVAL, collection="gemini_usage", clock=time.time):
+        self.db = db
+        self.interval = interval
+        self.collection = collection
+        self._clock = clock
+        self._pending = {}   # (day, scope, id) → counter deltas not yet written
+        self._flushing = {}  # deltas swapped out by the flush in progress
+        self._base = {}      # (day, scope, id) → totals last read from Firestore
+        self._seeded = set()  # keys whose stored totals have been read
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"records": 0, "flushes": 0, "writes": 0, "failures": 0}
+
+    def _ref(self, key):
+        day, scope, subject = key
+        return self.db.collection(self.collection).document(f"{day}_{scope}_{subject}")
+
+    # ── Recording ─────────────────────────────────────────────────────────────
+
+    def record(self, student_id, course_id=None, prompt_tokens=0, output_tokens=0, latency_s=0.0, error=False):
+        """Count one Gemini call against the student (and course) for today."""
+        delta = {"calls": 1, "errors": int(bool(error)), "prompt_tokens": prompt_tokens,
+                 "output_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens,
+                 "latency_ms": int(latency_s * 1000)}
+        day = today(self._clock())
+        keys = [(day, "student", student_id)] + ([(day, "course", course_id)] if course_id else [])
+        with self._lock:
+            for key in keys:
+                _add(self._pending.setdefault(key, {}), delta)
+            self.stats["records"] += 1
+        if self.interval <= 0:
+            self.flush()
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def _seed(self, key):
+        """Read a key's stored totals the first time it is seen (e.g. after a restart)."""
+        with self._lock:
+            if key in self._seeded:
+                return
+            self._seeded.add(key)
+        try:
+            snap = self._ref(key).get()
+        except Exception as e:
+            print(f"⚠️  Usage totals for {key[1]} {key[2]} not read: {e}")
+            with self._lock:
+                self._seeded.discard(key)  # try again on the next check
+            return
+        if snap.exists:
+            d = snap.to_dict()
+            with self._lock:  # a flush may have refreshed it meanwhile
+                self._base.setdefault(key, {name: d.get(name, 0) for name in COUNTERS})
+
+    def used(self, scope, subject, day=None):
+        """Today's (or ``day``'s) counters for a student or course."""
+        key = (day or today(self._clock()), scope, subject)
+        self._seed(key)
+        with self._lock:
+            totals = dict(self._base.get(key, {}))
+            for pending in (self._flushing, self._pending):
+                if key in pending:
+                    _add(totals, pending[key])
+        return {name: totals.get(name, 0) for name in COUNTERS}
+
+    def check_quota(self, quota, student_id, course_id=None):
+        """None if the call may go ahead, else (message, seconds until the quota resets)."""
+        limits = [("student", student_id, "tokens", quota.get("student_daily_tokens", 0)),
+                  ("student", student_id, "calls", quota.get("student_daily_calls", 0)),
+                  ("course", course_id, "tokens", quota.get("course_daily_tokens", 0))]
+        for scope, subject, kind, limit in limits:
+            if not limit or not subject:
+                continue
+            used = self.used(scope, subject)["total_tokens" if kind == "tokens" else "calls"]
+            if used >= limit:
+                who = "You've" if scope == "student" else "This course has"
+                return (f"{who} reached today's Ask Manan limit. It resets at midnight UTC.",
+                        seconds_to_midnight(self._clock()))
+        return None
+
+    # ── Flushing ──────────────────────────────────────────────────────────────
+
+    def flush(self):
+        """Write pending increments and refresh totals. Returns documents written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._flushing, self._pending = self._pending, {}
+                items = list(self._flushing.items())
+            written = 0
+            refreshed = {}
+            try:
+                for start in range(0, len(items), BATCH_SIZE):
+                    chunk = items[start:start + BATCH_SIZE]
+                    batch = self.db.batch()
+                    for (day, scope, subject), delta in chunk:
+                        doc = {name: firestore.Increment(delta[name]) for name in COUNTERS if delta.get(name)}
+                        doc.update(scope=scope, subject=subject, day=day, updated_at=firestore.SERVER_TIMESTAMP)
+                        batch.set(self._ref((day, scope, subject)), doc, merge=True)
+                    try:
+                        batch.commit()
+                    except Exception as e:
+                        print(f"⚠️  Usage flush failed ({len(items) - start} counters re-queued): {e}")
+                        with self._lock:
+                            self.stats["failures"] += 1
+                            for key, delta in items[start:]:
+                                _add(self._pending.setdefault(key, {}), delta)
+                            for key, _ in items[start:]:
+                                self._flushing.pop(key, None)
+                        break
+                    written += len(chunk)
+                    try:
+                        # Totals across every worker, now including this chunk.
+                        for snap in self.db.get_all([self._ref(key) for key, _ in chunk]):
+                            if snap.exists:
+                                d = snap.to_dict()
+                                refreshed[(d["day"], d["scope"], d["subject"])] = {
+                                    name: d.get(name, 0) for name in COUNTERS}
+                    except Exception as e:
+                        print(f"⚠️  Usage totals not refreshed: {e}")
+                        for key, delta in chunk:  # keep counting what we know we wrote
+                            refreshed[key] = _add(dict(self._base.get(key, {})), delta)
+            finally:
+                with self._lock:
+                    self._base.update(refreshed)
+                    self._seeded.update(refreshed)
+                    self._flushing = {}
+                    current = today(self._clock())
+                    for key in [k for k in self._base if k[0] < current]:
+                        del self._base[key]
+                    self._seeded = {k for k in self._seeded if k[0] >= current}
+                    self.stats["flushes"] += 1
+                    self.stats["writes"] += written
+            return written
+
+    # ── Reports ───────────────────────────────────────────────────────────────
+
+    def top(self, scope="student", day=None, limit=10, by="total_tokens"):
+        """Largest consumers for a day, across every worker (flushes this one first)."""
+        if by not in COUNTERS:
+            raise ValueError(f"Unknown usage counter: {by}")
+        self.flush()
+        query = (self.db.collection(self.collection)
+                 .where("day", "==", day or today(self._clock()))
+                 .where("scope", "==", scope)
+                 .order_by(by, direction="DESCENDING")
+                 .limit(limit))
+        return [{"id": d.get("subject"), **{name: d.get(name, 0) for name in COUNTERS}}
+                for d in (doc.to_dict() for doc in query.stream())]
+
+    # ── Background Flusher ────────────────────────────────────────────────────
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return None
+
+        def loop():
+            while not self._stop.is_set():
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"⚠️  Usage flusher: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="usage-flusher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def close(self):
+        """Stop the flusher and write whatever is still pending."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        return self.flush()
@@ -2,8 +2,10 @@
 
 import { useState, useRef, useEffect } from "react";
 import { Send, Loader2, BookOpen, MessageCircle, Sparkles, User, Bot, HelpCircle } from "lucide-react";
+import { useAuth } from "../../../context/AuthContext";
 
 export default function DoubtSolverPage() {
+  const { user } = useAuth();
   const [messages, setMessages] = useState([
     {
       role: "ai",
@@ -13,6 +15,7 @@ export default function DoubtSolverPage() {
   ]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
+  const [conversationId, setConversationId] = useState(null);
   const messagesEndRef = useRef(null);
 
   const scrollToBottom = () => {
@@ -33,22 +36,32 @@ export default function DoubtSolverPage() {
     setLoading(true);
 
     try {
+      // Usage, quotas and rate limits follow the verified ID token
+      const token = user ? await user.getIdToken() : null;
       const response = await fetch("http://127.0.0.1:8000/solve-doubt", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
         },
         body: JSON.stringify({
-          student_id: "demo_user",
+          student_id: user ? user.uid : "demo_user",
+          token,
           question_text: userMessage.text,
+          conversation_id: conversationId,
         }),
       });
 
-      if (!response.ok) {
+      if (response.status === 404) {
+        // The conversation expired; the next question starts a new one
+        setConversationId(null);
+      } else if (!response.ok) {
         throw new Error("Failed to fetch response");
       }
 
       const data = await response.json();
+      if (data.conversation_id) {
+        setConversationId(data.conversation_id);
+      }
 
       const aiMessage = {
         role: "ai",
@@ -2,8 +2,10 @@
 
 import { useState, useRef, useEffect } from "react";
 import { MessageCircle, Send, X, Loader2, BookOpen, Sparkles } from "lucide-react";
+import { useAuth } from "../context/AuthContext";
 
 export default function AskManan() {
+  const { user } = useAuth();
   const [isOpen, setIsOpen] = useState(false);
   const [messages, setMessages] = useState([
     { role: 'ai', text: "Ready to assist. Query the Manan intelligence database.", sources: [] }
@@ -32,13 +34,16 @@ export default function AskManan() {
     setLoading(true);
 
     try {
+      // Usage, quotas and rate limits follow the verified ID token
+      const token = user ? await user.getIdToken() : null;
       const response = await fetch("http://127.0.0.1:8000/solve-doubt", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
         },
         body: JSON.stringify({
-          student_id: "demo_user",
+          student_id: user ? user.uid : "demo_user",
+          token,
           question_text: userMessage.text,
         }),
       });